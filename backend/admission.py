@@ -0,0 +1,210 @@
+"""
+Admission control for the upload endpoints.
+
+Every upload endpoint has a byte and an audio-duration limit (LIMITS; override with
+ADMISSION_LIMITS="/analyze/performance=300:60,/sessions/=120:30", path=seconds:megabytes).
+They are enforced while the request body streams in (AdmissionMiddleware), so an oversized
+upload is never spooled completely:
+
+- Content-Length above the byte limit: rejected before the body is read
+- a body growing past the byte limit (chunked upload, wrong header): rejected at that chunk
+- WAV and FLAC: the duration is read from the container header in the first kilobytes
+  and a too-long recording is rejected right there
+
+Other formats (MP3, Ogg, M4A/WebM) are checked by the endpoint's `admit` dependency from
+the spooled upload's header (no decoding), still before any analysis runs. Rejections are
+413 responses naming the limit.
+
+`admit` then estimates the job's worker time: audio seconds x the job's realtime factor,
+taken from the observed vocalcoach_realtime_factor once CALIBRATION_MIN uploads were measured
+(REALTIME_FACTORS before that), and waits for a worker slot from the scheduler (scheduler.py),
+which orders waiting jobs by priority class, user and this cost.
+"""
+import os
+from typing import NamedTuple
+
+import anyio
+from fastapi import HTTPException, Request
+from starlette.datastructures import UploadFile
+
+from . import instrumentation, scheduler, storage
+
+class Limit(NamedTuple):
+    max_seconds: float
+    max_bytes: int
+
+MB = 1024 * 1024
+# WAV (44.1 kHz stereo 16 bit) is ~10 MB per minute; compressed formats stay far below
+LIMITS = {
+    "/sessions/": Limit(180, 40 * MB),
+    "/analyze/performance": Limit(600, 120 * MB),
+    "/analyze/health": Limit(60, 15 * MB),
+    "/analyze/breath": Limit(60, 15 * MB),
+    "/analyze/range": Limit(120, 25 * MB),
+}
+MULTIPART_SLACK = 64 * 1024 # Form fields and part headers around the file
+SNIFF_BYTES = 64 * 1024 # Body prefix searched for a WAV / FLAC header
+
+# Worker seconds per second of audio (measured with benchmarks/analysis.py, 44.1 kHz input)
+# plus a fixed part for the AI feedback call
+REALTIME_FACTORS = {
+    "sessions.full": 0.45, "sessions.preview": 0.02, "performance": 0.45,
+    "health": 0.06, "breath": 0.001, "range": 0.4, "sessions.refine": 0.45, "batch": 0.4,
+}
+FIXED_SECONDS = {"sessions.full": 1.0, "sessions.refine": 1.0, "performance": 1.0, "health": 1.0}
+CALIBRATION_MIN = 20 # Observed uploads per job before the measured factor replaces the default
+COMPRESSED_BYTES_PER_SECOND = 16_000 # Duration guess for unreadable formats (128 kbit/s)
+
+def _parse_limits(spec: str) -> dict:
+    limits = dict(LIMITS)
+    for entry in filter(None, (e.strip() for e in spec.split(","))):
+        path, _, values = entry.partition("=")
+        seconds, _, megabytes = values.partition(":")
+        limits[path] = Limit(float(seconds), int(float(megabytes) * MB))
+    return limits
+
+LIMITS = _parse_limits(os.getenv("ADMISSION_LIMITS", ""))
+
+# --- Limits ---
+
+def too_large(path: str, size: int, limit: Limit) -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"Upload too large: {size / MB:.1f} MB exceeds the {limit.max_bytes / MB:.0f} MB limit of {path}."
+    )
+
+def too_long(path: str, seconds: float, limit: Limit) -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"Recording too long: {seconds:.0f} s exceeds the {limit.max_seconds:.0f} s limit of {path}."
+    )
+
+def header_duration(data: bytes):
+    """Duration of a WAV or FLAC file starting somewhere in data (from its header), else None."""
+    riff = data.find(b"RIFF")
+    while riff != -1:
+        if data[riff + 8:riff + 12] == b"WAVE":
+            return _wav_duration(data, riff)
+        riff = data.find(b"RIFF", riff + 4)
+    flac = data.find(b"fLaC")
+    if flac != -1:
+        return _flac_duration(data, flac)
+    return None
+
+def _wav_duration(data: bytes, start: int):
+    # Chunks after "RIFF<size>WAVE": "fmt " holds the byte rate, "data" the sample bytes
+    pos = start + 12
+    byte_rate = None
+    while pos + 8 <= len(data):
+        chunk_id = data[pos:pos + 4]
+        size = int.from_bytes(data[pos + 4:pos + 8], "little")
+        if chunk_id == b"fmt " and pos + 20 <= len(data):
+            byte_rate = int.from_bytes(data[pos + 16:pos + 20], "little")
+        elif chunk_id == b"data":
+            # Streaming writers leave the size at 0 / 0xFFFFFFFF
+            return size / byte_rate if byte_rate and size not in (0, 0xFFFFFFFF) else None
+        pos += 8 + size + (size & 1)
+    return None
+
+def _flac_duration(data: bytes, start: int):
+    # "fLaC", a 4 byte block header, then STREAMINFO (sample rate: 20 bits, total samples: 36 bits)
+    info = data[start + 8:start + 42]
+    if len(info) < 18:
+        return None
+    sample_rate = (info[10] << 12) | (info[11] << 4) | (info[12] >> 4)
+    total_samples = ((info[13] & 0x0F) << 32) | int.from_bytes(info[14:18], "big")
+    return total_samples / sample_rate if sample_rate and total_samples else None
+
+class AdmissionMiddleware:
+    """Enforces LIMITS on the request body as it streams in (see module docstring)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        limit = LIMITS.get(scope.get("path")) if scope["type"] == "http" and scope.get("method") == "POST" else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        path = scope["path"]
+        state = scope["admission"] = {"bytes": 0, "seconds": None}
+        headers = dict(scope.get("headers") or [])
+        content_length = int(headers.get(b"content-length", b"0") or 0)
+        head = bytearray()
+
+        async def limited_receive():
+            # Raised inside the app's body parsing, so the 413 passes through the exception handlers (and CORS)
+            if content_length > limit.max_bytes + MULTIPART_SLACK:
+                raise too_large(path, content_length, limit)
+            message = await receive()
+            if message["type"] != "http.request":
+                return message
+            body = message.get("body", b"")
+            state["bytes"] += len(body)
+            if state["bytes"] > limit.max_bytes + MULTIPART_SLACK:
+                raise too_large(path, state["bytes"], limit)
+            if state["seconds"] is None and len(head) < SNIFF_BYTES:
+                head.extend(body[:SNIFF_BYTES - len(head)])
+                state["seconds"] = header_duration(bytes(head))
+                if state["seconds"] is not None and state["seconds"] > limit.max_seconds:
+                    raise too_long(path, state["seconds"], limit)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+def probe_seconds(fileobj):
+    """Duration from the header of a spooled upload (soundfile: WAV/FLAC/Ogg/MP3), else None."""
+    duration = instrumentation.audio_duration(fileobj)
+    fileobj.seek(0)
+    return duration
+
+# --- Cost estimate ---
+
+def realtime_factor(job: str) -> float:
+    count, mean = instrumentation.REALTIME_FACTOR.mean(endpoint=job)
+    return mean if count >= CALIBRATION_MIN else REALTIME_FACTORS.get(job, 0.5)
+
+def estimate_cost(job: str, audio_seconds: float) -> float:
+    """Estimated worker seconds of one job (the scheduler's job size)."""
+    return FIXED_SECONDS.get(job, 0.0) + realtime_factor(job) * (audio_seconds or 0.0)
+
+def admit(path: str, job: str):
+    """
+    Dependency factory for an upload endpoint: duration check of the spooled upload, cost
+    estimate, worker slot. job: the track_processing name ("sessions" gets its tier appended).
+    Declare it with Depends(..., scope="function"): the slot is released when the endpoint
+    returns, before the response and its background tasks.
+    """
+    limit = LIMITS[path]
+
+    async def dependency(request: Request):
+        form = await request.form() # Already parsed for the endpoint, cached
+        state = request.scope.get("admission") or {}
+        seconds = state.get("seconds")
+        upload = next((value for value in form.values() if isinstance(value, UploadFile)), None)
+        if seconds is None and upload is None and form.get("local_filename"):
+            # /analyze/performance on a stored upload
+            local_path = await anyio.to_thread.run_sync(storage.find_local, form["local_filename"])
+            seconds = instrumentation.audio_duration(local_path) if local_path else None
+            if seconds is not None and seconds > limit.max_seconds:
+                raise too_long(path, seconds, limit)
+        elif seconds is None and upload is not None:
+            seconds = await anyio.to_thread.run_sync(probe_seconds, upload.file)
+            if seconds is None:
+                seconds = state.get("bytes", 0) / COMPRESSED_BYTES_PER_SECOND # Unreadable container: guess for the cost only
+            elif seconds > limit.max_seconds:
+                raise too_long(path, seconds, limit)
+
+        job_name = f"{job}.{form.get('tier', 'preview')}" if job == "sessions" else job
+        cost = estimate_cost(job_name, seconds)
+        request.state.audio_seconds = seconds
+        request.state.admission_cost = cost
+        if instrumentation.ENABLED:
+            instrumentation.ADMISSION_COST.observe(cost, job=job_name)
+
+        # Fairness key: the user when the form names one, else the client
+        user = form.get("user_id") or (request.client.host if request.client else None)
+        async with scheduler.slot(job_name, user, cost):
+            yield cost
+
+    return dependency
@@ -1,5 +1,6 @@
 import numpy as np
 import librosa
+from ..instrumentation import span
 
 def analyze_breath_stability(audio_path: str, difficulty: int = 1):
     """
@@ -20,7 +21,8 @@ def analyze_breath_stability(audio_path: str, difficulty: int = 1):
     """
     try:
         # Load audio (sr=None to preserve native sampling rate)
-        y, sr = librosa.load(audio_path, sr=None)
+        with span("breath.decode"):
+            y, sr = librosa.load(audio_path, sr=None)
         
         # Calculate duration
         duration = librosa.get_duration(y=y, sr=sr)
@@ -0,0 +1,138 @@
+import numpy as np
+import librosa
+
+from .pitch import score_alignment
+from ..instrumentation import span
+from .. import features
+
+# Preview analysis runs on a downsampled copy of the signal. 16 kHz still covers
+# the full vocal F0 range (fmax 1000 Hz) but cuts the work per frame by ~3x.
+PREVIEW_SR = 16000
+PREVIEW_FRAME = 1024
+PREVIEW_HOP = 320 # 20ms frames
+
+def analyze_preview(audio_path: str, target_pattern: dict = None, with_contour: bool = False):
+    """
+    Quick first-pass analysis for the "preview" tier.
+    Uses plain YIN (no pYIN/Viterbi) on a 16 kHz copy, RMS stability and a frame-based
+    jitter/shimmer approximation instead of Praat. Returns results in the same shape as
+    analyze_pitch / analyze_pitch_accuracy / analyze_health so callers can score and
+    render them like the full tier. The jitter/shimmer estimate is reported as
+    approx_jitter_percent / approx_shimmer_percent and not graded (overall: None).
+
+    Returns:
+        dict: {
+            "success": bool,
+            "duration_seconds": float,
+            "pitch": {...analyze_pitch result...},
+            "accuracy": {...analyze_pitch_accuracy result...} (only with target_pattern),
+            "health": {...analyze_health result...},
+            "contour": {...features.make_contour...} (only with with_contour)
+        }
+    """
+    try:
+        with span("preview.decode"):
+            y, sr = librosa.load(audio_path, sr=PREVIEW_SR, res_type="soxr_qq")
+        duration = len(y) / sr
+
+        # 1. Pitch (YIN, no voicing probabilities -> derive voicing from RMS gate)
+        with span("preview.yin"):
+            f0 = librosa.yin(y, fmin=60, fmax=1000, sr=sr, frame_length=PREVIEW_FRAME, hop_length=PREVIEW_HOP)
+            rms = librosa.feature.rms(y=y, frame_length=PREVIEW_FRAME, hop_length=PREVIEW_HOP)[0]
+        n = min(len(f0), len(rms))
+        f0, rms = f0[:n], rms[:n]
+
+        rms_db = librosa.amplitude_to_db(rms, ref=np.max)
+        # Same adaptive gate idea as breath.py: noise floor + 25% of dynamic range
+        noise_floor_db = np.percentile(rms_db, 10)
+        threshold_db = min(max(noise_floor_db + (0 - noise_floor_db) * 0.25, -70.0), -15.0)
+        voiced = rms_db > threshold_db
+
+        voiced_f0 = f0[voiced]
+        if len(voiced_f0) == 0:
+            return {
+                "success": False,
+                "error": "No pitch detected. Please try recording closer to the microphone or singing louder."
+            }
+
+        min_pitch = float(np.percentile(voiced_f0, 10))
+        max_pitch = float(np.percentile(voiced_f0, 90))
+        avg_pitch = float(np.mean(voiced_f0))
+        pitch_std = float(np.std(voiced_f0))
+        range_semitones = 12 * np.log2(max_pitch / min_pitch)
+
+        pitch_result = {
+            "success": True,
+            "metrics": {
+                "min_pitch_hz": round(min_pitch, 2),
+                "max_pitch_hz": round(max_pitch, 2),
+                "avg_pitch_hz": round(avg_pitch, 2),
+                "pitch_stability_std": round(pitch_std, 2),
+                "range_semitones": round(range_semitones, 1),
+                "vocal_range": f"{librosa.hz_to_note(min_pitch)} - {librosa.hz_to_note(max_pitch)}"
+            }
+        }
+
+        # 2. Approximate Jitter / Shimmer
+        # Praat measures cycle-to-cycle variation. We only have 20ms frames, so we measure
+        # frame-to-frame variation of the period/amplitude after removing the slow melodic
+        # trend (moving average), which would otherwise be counted as "jitter".
+        # Not comparable with Praat's values (a rough voice reads far lower, vibrato reads
+        # as jitter), so they get own keys and no traffic lights.
+        periods = 1.0 / voiced_f0
+        amps = rms[voiced]
+        jitter_percent = _relative_perturbation(periods) * 100
+        shimmer_percent = _relative_perturbation(amps) * 100
+        rms_stability_db = float(np.std(rms_db[voiced]))
+
+        health_result = {
+            "success": True,
+            "metrics": {
+                "approx_jitter_percent": float(jitter_percent),
+                "approx_shimmer_percent": float(shimmer_percent),
+                "rms_stability_db": rms_stability_db
+            },
+            "assessment": {
+                "jitter": {"status": None, "feedback": "Vorläufiger Wert, genaue Analyse läuft..."},
+                "shimmer": {"status": None, "feedback": "Vorläufiger Wert, genaue Analyse läuft..."},
+                "overall": None
+            },
+            "approximate": True
+        }
+
+        result = {
+            "success": True,
+            "duration_seconds": float(duration),
+            "pitch": pitch_result,
+            "health": health_result
+        }
+        if with_contour:
+            result["contour"] = features.make_contour(f0, voiced, rms, sr, PREVIEW_HOP, "yin")
+
+        # 3. Pattern Accuracy on the YIN contour (DTW on 20ms frames is cheap)
+        if target_pattern:
+            user_midi = librosa.hz_to_midi(f0)
+            user_midi[~voiced] = 0
+            try:
+                result["accuracy"] = score_alignment(user_midi, target_pattern, sr, PREVIEW_HOP)
+            except Exception as e:
+                result["accuracy"] = {"success": False, "error": str(e)}
+
+        return result
+
+    except Exception as e:
+        print(f"Preview Analysis Error: {e}")
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+def _relative_perturbation(values: np.ndarray, window: int = 5) -> float:
+    """Mean absolute deviation from a moving average, relative to the mean value."""
+    if len(values) < window + 1:
+        return 0.0
+    trend = np.convolve(values, np.ones(window) / window, mode="same")
+    # Ignore the edges where the moving average is padded with zeros
+    edge = window // 2
+    residual = (values - trend)[edge:-edge]
+    return float(np.mean(np.abs(np.diff(residual))) / np.mean(values))
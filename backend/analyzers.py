@@ -0,0 +1,46 @@
+"""
+Lazy facade over the heavy analysis, audio and AI modules.
+
+librosa/numba, parselmouth, fastdtw/scipy and google.generativeai cost seconds and
+hundreds of MB to import. API code calls them through this module, e.g.
+
+    from . import analyzers
+    analyzers.analyze_pitch(path)
+
+and the backing module is only imported on first use, so workers that never analyze
+audio (role "api", see roles.py) never load them.
+"""
+import importlib
+import importlib.util
+import sys
+
+# public name -> module that implements it (relative to the backend package)
+_REGISTRY = {
+    "analyze_pitch": ".analysis.pitch",
+    "analyze_pitch_accuracy": ".analysis.pitch",
+    "analyze_health": ".analysis.quality",
+    "analyze_breath_stability": ".analysis.breath",
+    "analyze_preview": ".analysis.preview",
+    "generate_feedback": ".intelligence.ai_wrapper",
+    "generate_performance_review": ".intelligence.ai_wrapper",
+}
+
+def __getattr__(name):
+    module_name = _REGISTRY.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    attr = getattr(importlib.import_module(module_name, __package__), name)
+    globals()[name] = attr # Cache: later lookups don't go through __getattr__ again
+    return attr
+
+def __dir__():
+    return sorted(list(globals()) + list(_REGISTRY))
+
+def preload():
+    """Imports every backing module now (analysis workers, pre-fork servers)."""
+    for name in _REGISTRY:
+        __getattr__(name)
+
+def loaded():
+    """Names of the heavy backing modules that are currently imported."""
+    return sorted({m for m in _REGISTRY.values() if importlib.util.resolve_name(m, __package__) in sys.modules})
@@ -0,0 +1,33 @@
+"""
+Lightweight note <-> frequency conversion (A4 = 440 Hz, 12-TET).
+Mirrors librosa.note_to_hz / librosa.hz_to_note (sharp spelling, e.g. "C♯4") without
+importing librosa, so metadata-only endpoints don't pull in the DSP stack.
+"""
+import math
+import re
+
+PITCH_CLASSES = ["C", "C♯", "D", "D♯", "E", "F", "F♯", "G", "G♯", "A", "A♯", "B"]
+_NOTE_OFFSETS = {"C": 0, "D": 2, "E": 4, "F": 5, "G": 7, "A": 9, "B": 11}
+_ACCIDENTALS = {"#": 1, "♯": 1, "b": -1, "♭": -1, "!": -1}
+_NOTE_RE = re.compile(r"^\s*(?P<note>[A-Ga-g])(?P<accidental>[#♯b♭!]*)(?P<octave>[+-]?\d+)?(?P<cents>[+-]\d+)?\s*$")
+
+def note_to_midi(note: str, round_midi: bool = True) -> float:
+    match = _NOTE_RE.match(note)
+    if not match:
+        raise ValueError(f"Improper note format: {note}")
+    pitch = _NOTE_OFFSETS[match.group("note").upper()]
+    offset = sum(_ACCIDENTALS[a] for a in match.group("accidental"))
+    octave = int(match.group("octave") or 0)
+    cents = int(match.group("cents") or 0)
+    midi = 12 * (octave + 1) + pitch + offset + cents * 0.01
+    return round(midi) if round_midi else midi
+
+def note_to_hz(note: str) -> float:
+    return 440.0 * (2.0 ** ((note_to_midi(note) - 69) / 12.0))
+
+def hz_to_midi(freq: float) -> float:
+    return 12 * (math.log2(freq) - math.log2(440.0)) + 69
+
+def hz_to_note(freq: float) -> str:
+    note_num = int(round(hz_to_midi(freq)))
+    return f"{PITCH_CLASSES[note_num % 12]}{note_num // 12 - 1}"
@@ -1,7 +1,7 @@
 import numpy as np
-from scipy.io.wavfile import write
 import os
-import librosa
+import threading
+from . import notes # librosa-compatible note math without importing librosa
 
 def generate_tone(frequency, duration, sample_rate=44100, amplitude=0.5):
     """Generates a sine wave tone."""
@@ -32,6 +32,55 @@ def generate_tone(frequency, duration, sample_rate=44100, amplitude=0.5):
         
     return tone * envelope
 
+def generate_voice(frequency, duration, sample_rate=44100, amplitude=0.5, jitter_percent=0.0, shimmer_percent=0.0,
+                   hnr_db=None, vibrato_rate=0.0, vibrato_cents=0.0, n_harmonics=12, seed=None):
+    """
+    Generates a synthetic sung vowel with known voice-quality parameters (for benchmarks/tests).
+
+    The source is built cycle by cycle: every glottal period is perturbed by random jitter,
+    every cycle amplitude by random shimmer (both calibrated to the "local" definition Praat
+    uses: mean absolute difference of consecutive cycles relative to the mean), with
+    sinusoidal vibrato on top. Harmonics roll off at 1/h. White noise is added at hnr_db.
+    """
+    rng = np.random.default_rng(seed)
+    n_samples = int(sample_rate * duration)
+    base_period = 1.0 / frequency
+
+    # Cycle periods: vibrato (evaluated at the nominal cycle start) and jitter.
+    # For i.i.d. normal noise E|x1 - x2| = 2*sigma/sqrt(pi), so sigma = local * sqrt(pi) / 2
+    n_cycles = int(duration / base_period * 1.1) + 2
+    nominal_starts = np.arange(n_cycles) * base_period
+    vibrato = vibrato_cents * np.sin(2 * np.pi * vibrato_rate * nominal_starts)
+    periods = base_period * 2 ** (-vibrato / 1200.0)
+    periods *= 1 + rng.normal(0, jitter_percent / 100 * np.sqrt(np.pi) / 2, n_cycles)
+    cycle_amps = 1 + rng.normal(0, shimmer_percent / 100 * np.sqrt(np.pi) / 2, n_cycles)
+
+    # Continuous phase in cycles: k + fraction of the current period
+    cycle_starts = np.concatenate([[0.0], np.cumsum(periods)])
+    t = np.arange(n_samples) / sample_rate
+    k = np.searchsorted(cycle_starts, t, side="right") - 1
+    phase = k + (t - cycle_starts[k]) / periods[k]
+
+    voice = np.zeros(n_samples)
+    for h in range(1, n_harmonics + 1):
+        if h * frequency * 1.05 >= sample_rate / 2:
+            break # Keep harmonics (incl. vibrato excursions) below Nyquist
+        voice += np.sin(2 * np.pi * h * phase) / h
+    voice *= cycle_amps[k]
+
+    if hnr_db is not None:
+        noise = rng.normal(0, 1, n_samples)
+        noise *= np.sqrt(np.mean(voice ** 2)) / 10 ** (hnr_db / 20) / np.sqrt(np.mean(noise ** 2))
+        voice += noise
+
+    # Short fades so the onset/offset don't click
+    fade = min(int(0.02 * sample_rate), n_samples // 2)
+    if fade > 0:
+        voice[:fade] *= np.linspace(0, 1, fade)
+        voice[-fade:] *= np.linspace(1, 0, fade)
+
+    return amplitude * voice / np.max(np.abs(voice))
+
 def generate_scale_audio(root_note, pattern, duration_per_note=0.8, sample_rate=44100, output_path=None, with_drone=True, generate_audio=True):
     """
     Generates an audio file for a scale and returns metadata.
@@ -47,7 +96,7 @@ def generate_scale_audio(root_note, pattern, duration_per_note=0.8, sample_rate=
         "sequence": list of dicts [{"note": str, "freq": float, "start_time": float, "duration": float}]
     }
     """
-    root_hz = librosa.note_to_hz(root_note)
+    root_hz = notes.note_to_hz(root_note)
     full_audio = np.array([])
     sequence_metadata = []
     
@@ -58,7 +107,7 @@ def generate_scale_audio(root_note, pattern, duration_per_note=0.8, sample_rate=
     for semitone in pattern:
         # f = f0 * 2^(n/12)
         freq = root_hz * (2 ** (semitone / 12.0))
-        note_name = librosa.hz_to_note(freq)
+        note_name = notes.hz_to_note(freq)
         
         # Add metadata
         sequence_metadata.append({
@@ -107,7 +156,12 @@ def generate_scale_audio(root_note, pattern, duration_per_note=0.8, sample_rate=
             audio_int16 = np.zeros(len(full_audio), dtype=np.int16)
             
         if output_path:
-            write(output_path, sample_rate, audio_int16)
+            from scipy.io.wavfile import write # Only needed when rendering files
+            # Write to a temp name and rename: concurrent requests (or other workers) must
+            # never serve a half-written cache file
+            tmp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            write(tmp_path, sample_rate, audio_int16)
+            os.replace(tmp_path, output_path)
             result["audio_path"] = output_path
         else:
             result["audio_data"] = audio_int16
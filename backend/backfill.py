@@ -0,0 +1,61 @@
+"""
+Backfills the typed Session metric columns (jitter_percent, shimmer_percent, hnr_db,
+pitch_accuracy, health_status) from metrics_json for sessions stored before migration 2.
+
+Walks the table in id order in small batches, one transaction per batch, so it can run
+next to the live app and be interrupted / restarted at any time (already filled rows are
+skipped; rows whose metrics_json holds no metrics at all, e.g. failed analyses, stay NULL and
+are simply looked at again).
+
+    python -m backend.backfill
+    python -m backend.backfill --batch-size 2000 --all   # recompute every row
+
+Preview sessions stored while their estimate still filled the health columns: --all clears
+those, then `python -m backend.learning --repair` takes them out of the rollups.
+"""
+import argparse
+import time
+
+from sqlalchemy import bindparam, update
+
+from . import database, models, migrations, pipeline
+
+PROMOTED = ("jitter_percent", "shimmer_percent", "hnr_db", "pitch_accuracy", "health_status")
+
+def backfill(engine=None, batch_size: int = 1000, recompute: bool = False) -> int:
+    """Fills the promoted columns batch by batch. Returns the number of updated sessions."""
+    engine = engine or database.engine
+    migrations.upgrade(engine)
+
+    sessions = models.Session.__table__
+    query = sessions.select().with_only_columns(sessions.c.id, sessions.c.metrics_json).where(sessions.c.metrics_json.isnot(None))
+    if not recompute:
+        query = query.where(*(sessions.c[name].is_(None) for name in PROMOTED))
+
+    updated = 0
+    last_id = 0
+    started = time.perf_counter()
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(query.where(sessions.c.id > last_id).order_by(sessions.c.id).limit(batch_size)).all()
+            if not rows:
+                break
+            conn.execute(
+                update(sessions).where(sessions.c.id == bindparam("session_id")).values({name: bindparam(name) for name in PROMOTED}),
+                [dict(pipeline.metric_columns(metrics_json), session_id=session_id) for session_id, metrics_json in rows]
+            )
+            last_id = rows[-1][0]
+            updated += len(rows)
+        print(f"  {updated:,} sessions backfilled (up to id {last_id}, {updated / (time.perf_counter() - started):,.0f}/s)", end="\r", flush=True)
+    print()
+    return updated
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill typed session metric columns from metrics_json.")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--all", action="store_true", help="Recompute rows that are already filled")
+    args = parser.parse_args()
+
+    migrations.upgrade(database.engine)
+    total = backfill(batch_size=args.batch_size, recompute=args.all)
+    print(f"Done: {total} sessions updated.")
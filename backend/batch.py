@@ -0,0 +1,150 @@
+"""
+Batch analysis for the user_uploads archive.
+
+Analyzes a directory or glob across a process pool and streams one NDJSON line per file.
+Progress is appended to a manifest (also NDJSON), so an interrupted run can be resumed:
+files whose content hash is already in the manifest are skipped.
+
+Usage:
+    python -m backend.batch backend/user_uploads
+    python -m backend.batch "backend/user_uploads/2024*.wav" --workers 4 --manifest progress.ndjson
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from . import analyzers
+
+UPLOAD_DIR = "backend/user_uploads"
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.m4a', '.flac', '.ogg') # flac / ogg: transcoded uploads (storage.py)
+DEFAULT_MANIFEST = os.path.join(UPLOAD_DIR, ".batch_manifest.ndjson")
+
+def collect_files(target: str):
+    """Expands a directory (recursively) or a glob pattern into a sorted list of audio files."""
+    if os.path.isdir(target):
+        pattern = os.path.join(target, "**", "*")
+    else:
+        pattern = target
+    files = [f for f in glob.glob(pattern, recursive=True) if os.path.isfile(f) and f.lower().endswith(AUDIO_EXTENSIONS)]
+    return sorted(files)
+
+def file_hash(path: str) -> str:
+    """SHA-256 of the file content (streamed, so large uploads are not read into memory)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def load_manifest(manifest_path: str) -> set:
+    """Returns the content hashes already analyzed according to the manifest."""
+    done = set()
+    if not manifest_path or not os.path.exists(manifest_path):
+        return done
+    with open(manifest_path) as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["sha256"])
+            except (ValueError, KeyError):
+                continue # Ignore a truncated last line from an interrupted run
+    return done
+
+def analyze_file(path: str) -> dict:
+    """
+    Runs the performance analysis (pitch + health, no AI) directly on the file.
+    Top-level function so it can be shipped to pool workers.
+    """
+    pitch_result = analyzers.analyze_pitch(path)
+    health_result = analyzers.analyze_health(path)
+
+    combined_metrics = {}
+    if pitch_result.get("success"):
+        combined_metrics.update(pitch_result.get("metrics", {}))
+    if health_result.get("success"):
+        combined_metrics.update(health_result.get("metrics", {}))
+        combined_metrics["health_status"] = health_result.get("assessment", {}).get("overall", "Unknown")
+
+    errors = [r.get("error") for r in (pitch_result, health_result) if not r.get("success")]
+    return {
+        "success": pitch_result.get("success", False) or health_result.get("success", False),
+        "metrics": combined_metrics,
+        "errors": errors
+    }
+
+def run_batch(files, workers: int = None, manifest_path: str = DEFAULT_MANIFEST, acquire_slot=None):
+    """
+    Analyzes files across a process pool and yields one result dict per file as soon as it
+    finishes (completion order). Already analyzed content (by hash) is yielded as "skipped".
+    acquire_slot(path), if given, blocks until the file may start and returns the function
+    releasing its slot (the API's scheduler); it is called when the file's analysis finishes.
+    """
+    done = load_manifest(manifest_path)
+    manifest = None
+    if manifest_path:
+        os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+        manifest = open(manifest_path, "a")
+
+    workers = workers or os.cpu_count() or 1
+    pending = {}
+    queue = iter(files)
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            while True:
+                # Keep a bounded number of jobs in flight so huge archives don't pile up futures
+                while len(pending) < workers * 2:
+                    path = next(queue, None)
+                    if path is None:
+                        break
+                    digest = file_hash(path)
+                    if digest in done:
+                        yield {"file": path, "sha256": digest, "status": "skipped"}
+                        continue
+                    done.add(digest) # Duplicate content later in the same run is skipped too
+                    release = acquire_slot(path) if acquire_slot else None
+                    future = pool.submit(analyze_file, path)
+                    if release:
+                        # Released on completion, not when this generator gets to the result
+                        future.add_done_callback(lambda _, release=release: release())
+                    pending[future] = (path, digest)
+
+                if not pending:
+                    break
+
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    path, digest = pending.pop(future)
+                    try:
+                        record = {"file": path, "sha256": digest, "status": "analyzed", **future.result()}
+                    except Exception as e:
+                        record = {"file": path, "sha256": digest, "status": "failed", "success": False, "errors": [str(e)]}
+
+                    # Failed files are not recorded, so a resumed run retries them
+                    if manifest and record["status"] == "analyzed":
+                        manifest.write(json.dumps(record) + "\n")
+                        manifest.flush()
+                    yield record
+    finally:
+        if manifest:
+            manifest.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch-analyze audio files and stream NDJSON results.")
+    parser.add_argument("target", nargs="?", default=UPLOAD_DIR, help="Directory or glob pattern (default: backend/user_uploads)")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size (default: CPU count)")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST, help="Progress manifest for resuming")
+    parser.add_argument("--no-manifest", action="store_true", help="Analyze everything, don't read or write a manifest")
+    args = parser.parse_args(argv)
+
+    files = collect_files(args.target)
+    manifest_path = None if args.no_manifest else args.manifest
+    for record in run_batch(files, args.workers, manifest_path):
+        sys.stdout.write(json.dumps(record) + "\n")
+        sys.stdout.flush()
+
+if __name__ == "__main__":
+    main()
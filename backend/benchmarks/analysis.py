@@ -0,0 +1,298 @@
+"""
+Reproducible benchmark for the analysis pipeline.
+
+Builds a synthetic voice corpus with backend/audio/synth.generate_voice (known F0, jitter,
+shimmer, noise and vibrato; seeded, so every run analyzes identical audio), then times and
+memory-profiles each analyzer and the full POST /sessions/ flow on every file.
+
+Results are written as JSON; pass a previous result as --baseline to flag regressions
+(exit code 1), or --update-baseline to store this run as the new baseline.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.analysis --quick
+    python -m backend.benchmarks.analysis --durations 2 10 30 60 300 --repeat 3
+    python -m backend.benchmarks.analysis --update-baseline
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+# Benchmarks measure the local pipeline only: never call the real Gemini API
+os.environ["GEMINI_API_KEY"] = ""
+
+from ..audio.synth import generate_voice
+
+SAMPLE_RATE = 22050
+F0 = 220.0 # A3
+SEED = 1234
+
+PROFILES = {
+    "clean": {"jitter_percent": 0.4, "shimmer_percent": 2.0, "hnr_db": 25.0, "vibrato_rate": 0.0, "vibrato_cents": 0.0},
+    "vibrato": {"jitter_percent": 0.6, "shimmer_percent": 2.5, "hnr_db": 22.0, "vibrato_rate": 5.5, "vibrato_cents": 60.0},
+    "rough": {"jitter_percent": 2.0, "shimmer_percent": 6.0, "hnr_db": 10.0, "vibrato_rate": 0.0, "vibrato_cents": 0.0},
+}
+DEFAULT_DURATIONS = (2, 10, 30, 60, 300)
+QUICK_DURATIONS = (2, 10)
+
+# Melodic material for analyze_pitch_accuracy: the pattern is repeated to fill the duration
+SCALE = [0, 2, 4, 5, 7, 5, 4, 2]
+NOTE_DURATION = 0.5
+SILENCE_DURATION = 0.05 # Matches the gaps the DTW target curve expects
+
+TARGETS = ("analyze_pitch", "analyze_pitch_accuracy", "analyze_health", "analyze_breath_stability", "sessions")
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+DEFAULT_OUTPUT = os.path.join(RESULTS_DIR, "analysis.json")
+DEFAULT_BASELINE = os.path.join(RESULTS_DIR, "analysis_baseline.json")
+
+# --- Corpus ---
+
+def build_corpus(corpus_dir: str, durations, profiles):
+    """Writes (or reuses) one sustained and one melodic file per profile/duration."""
+    from scipy.io.wavfile import write
+
+    os.makedirs(corpus_dir, exist_ok=True)
+    cases = []
+    for profile in profiles:
+        params = PROFILES[profile]
+        for duration in durations:
+            name = f"{profile}_{duration}s"
+            sustained_path = os.path.join(corpus_dir, f"{name}_sustained.wav")
+            melodic_path = os.path.join(corpus_dir, f"{name}_melodic.wav")
+
+            if not os.path.exists(sustained_path):
+                y = generate_voice(F0, duration, SAMPLE_RATE, seed=SEED, **params)
+                write(sustained_path, SAMPLE_RATE, np.int16(y * 32767))
+
+            n_notes = max(1, int(duration / (NOTE_DURATION + SILENCE_DURATION)))
+            intervals = (SCALE * (n_notes // len(SCALE) + 1))[:n_notes]
+            if not os.path.exists(melodic_path):
+                gap = np.zeros(int(SAMPLE_RATE * SILENCE_DURATION))
+                notes = []
+                for i, semitone in enumerate(intervals):
+                    freq = F0 * 2 ** (semitone / 12.0)
+                    notes.append(generate_voice(freq, NOTE_DURATION, SAMPLE_RATE, seed=SEED + i, **params))
+                    notes.append(gap)
+                write(melodic_path, SAMPLE_RATE, np.int16(np.concatenate(notes) * 32767))
+
+            cases.append({
+                "name": name,
+                "profile": profile,
+                "duration": float(duration),
+                "params": params,
+                "sustained": sustained_path,
+                "melodic": melodic_path,
+                "pattern": {"intervals": intervals, "duration": NOTE_DURATION, "root": "A3"}
+            })
+    return cases
+
+# --- Targets ---
+
+class SessionsFlow:
+    """Drives POST /sessions/ (tier=full) in-process against a throwaway SQLite database."""
+
+    def __init__(self):
+        # Transcoding runs as a background task, which TestClient would count into the request
+        os.environ.setdefault("STORAGE_TRANSCODE", "0")
+        from fastapi.testclient import TestClient
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from .. import main, models, database, migrations
+
+        self._tmp = tempfile.mkdtemp(prefix="vocalcoach_bench_")
+        engine = create_engine(f"sqlite:///{os.path.join(self._tmp, 'bench.db')}", connect_args={"check_same_thread": False})
+        migrations.upgrade(engine)
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        db = self.SessionLocal()
+        db.add(models.User(id=1, nickname="BenchSinger", voice_type="Tenor"))
+        db.add(models.Exercise(id=1, name="Sustained Vowel", category="Bench", difficulty=1, physiological_target="Bench"))
+        db.commit()
+        db.close()
+
+        # Rebinding the app's session factory covers get_db and the write path (database.run_write)
+        database.SessionLocal.configure(bind=engine)
+        self.client = TestClient(main.app)
+        self.models = models
+
+    def __call__(self, path: str):
+        with open(path, "rb") as f:
+            response = self.client.post(
+                "/sessions/",
+                data={"user_id": 1, "exercise_id": 1, "tier": "full"},
+                files={"file": (os.path.basename(path), f, "audio/wav")}
+            )
+        # Uploads are stored permanently by the endpoint: remove them again
+        db = self.SessionLocal()
+        for s in db.query(self.models.Session).all():
+            if s.audio_url and os.path.exists(s.audio_url):
+                os.remove(s.audio_url)
+        db.close()
+        return {"success": response.status_code == 200}
+
+def make_targets(selected):
+    from .. import analyzers
+
+    targets = {}
+    if "analyze_pitch" in selected:
+        targets["analyze_pitch"] = lambda case: analyzers.analyze_pitch(case["sustained"])
+    if "analyze_pitch_accuracy" in selected:
+        targets["analyze_pitch_accuracy"] = lambda case: analyzers.analyze_pitch_accuracy(case["melodic"], case["pattern"])
+    if "analyze_health" in selected:
+        targets["analyze_health"] = lambda case: analyzers.analyze_health(case["sustained"])
+    if "analyze_breath_stability" in selected:
+        targets["analyze_breath_stability"] = lambda case: analyzers.analyze_breath_stability(case["sustained"])
+    if "sessions" in selected:
+        flow = SessionsFlow()
+        targets["sessions"] = lambda case: flow(case["sustained"])
+    return targets
+
+# --- Measurement ---
+
+def measure(fn, case, repeat: int) -> dict:
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(case)
+        timings.append(time.perf_counter() - started)
+
+    # Separate pass for memory: tracemalloc slows execution, so it must not skew the timings.
+    # Traces Python and NumPy allocations (not Praat's C++ heap).
+    tracemalloc.start()
+    fn(case)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    median = statistics.median(timings)
+    return {
+        "median_s": round(median, 4),
+        "min_s": round(min(timings), 4),
+        "runs": repeat,
+        "peak_mb": round(peak / 1024 / 1024, 2),
+        "audio_s": case["duration"],
+        "realtime_factor": round(median / case["duration"], 4),
+        "success": bool(result.get("success")) if isinstance(result, dict) else None,
+        "measured": _measured(result)
+    }
+
+def _measured(result):
+    """Keeps the headline metrics so accuracy drift shows up next to timing drift."""
+    if not isinstance(result, dict):
+        return None
+    metrics = result.get("metrics") or {}
+    keys = ("avg_pitch_hz", "jitter_percent", "shimmer_percent", "hnr_db", "std_amplitude_db")
+    measured = {k: round(float(metrics[k]), 3) for k in keys if k in metrics}
+    if "accuracy_score" in result:
+        measured["accuracy_score"] = result["accuracy_score"]
+    if "std_amplitude_db" in result:
+        measured["std_amplitude_db"] = round(result["std_amplitude_db"], 3)
+    return measured or None
+
+def run(durations, profiles, selected, repeat: int, corpus_dir: str) -> dict:
+    from .. import warmup
+
+    cases = build_corpus(corpus_dir, durations, profiles)
+    warmup.warm_up() # JIT/Praat init must not end up in the first measurement
+    targets = make_targets(selected)
+
+    results = {}
+    for name, fn in targets.items():
+        for case in cases:
+            key = f"{name}/{case['name']}"
+            results[key] = measure(fn, case, repeat)
+            r = results[key]
+            print(f"{key:<45} {r['median_s']:>9.3f}s  {r['peak_mb']:>8.1f} MB  rtf {r['realtime_factor']:.3f}", file=sys.stderr)
+    return {"meta": _meta(durations, profiles, repeat), "results": results}
+
+def _meta(durations, profiles, repeat):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    import librosa
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "librosa": librosa.__version__,
+        "sample_rate": SAMPLE_RATE,
+        "durations": list(durations),
+        "profiles": list(profiles),
+        "repeat": repeat
+    }
+
+# --- Baseline comparison ---
+
+def compare(current: dict, baseline: dict, tolerance: float, min_delta_s: float = 0.02, min_delta_mb: float = 1.0):
+    """Returns a list of regression descriptions (time or memory above baseline * (1 + tolerance))."""
+    regressions = []
+    for key, now in current["results"].items():
+        before = baseline.get("results", {}).get(key)
+        if not before:
+            continue
+        if now["median_s"] > before["median_s"] * (1 + tolerance) and now["median_s"] - before["median_s"] > min_delta_s:
+            regressions.append(f"{key}: time {before['median_s']:.3f}s -> {now['median_s']:.3f}s ({now['median_s'] / before['median_s'] - 1:+.0%})")
+        if now["peak_mb"] > before["peak_mb"] * (1 + tolerance) and now["peak_mb"] - before["peak_mb"] > min_delta_mb:
+            regressions.append(f"{key}: memory {before['peak_mb']:.1f}MB -> {now['peak_mb']:.1f}MB ({now['peak_mb'] / before['peak_mb'] - 1:+.0%})")
+        if before.get("success") and not now.get("success"):
+            regressions.append(f"{key}: analysis no longer succeeds")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the analysis pipeline on a synthetic voice corpus.")
+    parser.add_argument("--durations", nargs="+", type=float, default=None, help="Seconds per corpus file (default: 2 10 30 60 300)")
+    parser.add_argument("--profiles", nargs="+", choices=sorted(PROFILES), default=sorted(PROFILES))
+    parser.add_argument("--targets", nargs="+", choices=TARGETS, default=list(TARGETS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--quick", action="store_true", help="Short files only, single run (smoke test)")
+    parser.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), "vocalcoach_bench_corpus"))
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Compare against this result file if it exists")
+    parser.add_argument("--update-baseline", action="store_true", help="Store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown / memory growth (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    durations = args.durations or (QUICK_DURATIONS if args.quick else DEFAULT_DURATIONS)
+    durations = [int(d) if float(d).is_integer() else d for d in durations]
+    repeat = 1 if args.quick else args.repeat
+
+    current = run(durations, args.profiles, args.targets, repeat, args.corpus_dir)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(current, f, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(current, f, indent=2)
+        print(f"Baseline updated: {args.baseline}", file=sys.stderr)
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(current, baseline, args.tolerance)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) vs. {args.baseline}:", file=sys.stderr)
+            for r in regressions:
+                print(f"  - {r}", file=sys.stderr)
+            return 1
+        print(f"No regressions vs. {args.baseline} (tolerance {args.tolerance:.0%}).", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
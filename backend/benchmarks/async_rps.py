@@ -0,0 +1,164 @@
+"""
+Requests per second of the read endpoints served from the async database session.
+
+Starts the API (benchmarks/load.py Server: temp working dir, fake LLM), fills its database
+with sessions for the trends charts, then drives closed-loop readers against
+
+    GET /users/{id}   GET /exercises/   GET /exercises/{id}/pattern   GET /stats/trends
+
+twice: reads alone, and reads while singers keep POST /sessions/ busy (the analyses occupy
+the threadpool; sync endpoints queue behind them, async ones do not).
+
+--baseline-ref runs the same measurement against another git revision (checked out into a
+temporary worktree), e.g. the commit before the async endpoints, for a before/after table.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.async_rps --baseline-ref HEAD~1
+    python -m backend.benchmarks.async_rps --threadpool 4 --concurrency 32 --duration 20 --output results/async_rps.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import httpx
+from sqlalchemy import MetaData, create_engine
+
+from .load import REPO_ROOT, SESSION_UPLOAD_MIX, Server, _stats, build_uploads, pick_upload
+
+READ_ENDPOINTS = ["GET /users/{id}", "GET /exercises/", "GET /exercises/{id}/pattern", "GET /stats/trends"]
+EXERCISE_IDS = list(range(1, 14))
+
+def fill_sessions(db_path: str, user_ids, per_user: int, seed_value: int = 5):
+    """Inserts synthetic sessions straight into the server's SQLite file (whatever columns the revision has)."""
+    engine = create_engine(f"sqlite:///{db_path}")
+    metadata = MetaData()
+    metadata.reflect(bind=engine, only=["sessions"])
+    sessions = metadata.tables["sessions"]
+    rng = random.Random(seed_value)
+    start = datetime.utcnow() - timedelta(days=per_user)
+    rows = []
+    for user_id in user_ids:
+        for i in range(per_user):
+            jitter = rng.uniform(0.3, 1.6)
+            row = {
+                "user_id": user_id, "exercise_id": rng.choice(EXERCISE_IDS), "score": rng.randint(40, 100),
+                "created_at": start + timedelta(days=i, minutes=rng.randint(0, 600)),
+                "metrics_json": {"tier": "full", "xp_earned": 10, "health": {"jitter_percent": jitter}},
+                "jitter_percent": jitter, "health_status": "green"
+            }
+            rows.append({k: v for k, v in row.items() if k in sessions.c})
+    with engine.begin() as conn:
+        conn.execute(sessions.insert(), rows)
+    engine.dispose()
+
+async def read_request(client: httpx.AsyncClient, endpoint: str, user_id: int):
+    if endpoint == "GET /users/{id}":
+        return await client.get(f"/users/{user_id}")
+    if endpoint == "GET /exercises/":
+        return await client.get("/exercises/")
+    if endpoint == "GET /exercises/{id}/pattern":
+        return await client.get(f"/exercises/{random.choice(EXERCISE_IDS)}/pattern", params={"user_id": user_id})
+    return await client.get("/stats/trends", params={"user_id": user_id, "limit": 100})
+
+async def run_reads(url: str, user_ids, concurrency: int, duration: float, singers: int, uploads) -> dict:
+    samples = {endpoint: [] for endpoint in READ_ENDPOINTS}
+    limits = httpx.Limits(max_connections=concurrency + singers, max_keepalive_connections=concurrency + singers)
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+        deadline = time.perf_counter() + duration
+
+        async def reader(worker: int):
+            endpoints = READ_ENDPOINTS[worker % len(READ_ENDPOINTS):] + READ_ENDPOINTS[:worker % len(READ_ENDPOINTS)]
+            i = 0
+            while time.perf_counter() < deadline:
+                endpoint = endpoints[i % len(endpoints)]
+                i += 1
+                started = time.perf_counter()
+                try:
+                    response = await read_request(client, endpoint, random.choice(user_ids))
+                    error = f"HTTP {response.status_code}" if response.status_code >= 400 else None
+                except httpx.HTTPError as e:
+                    error = type(e).__name__
+                samples[endpoint].append((time.perf_counter() - started, error))
+
+        async def singer():
+            while time.perf_counter() < deadline:
+                _, audio = pick_upload(uploads, SESSION_UPLOAD_MIX)
+                try:
+                    await client.post(
+                        "/sessions/",
+                        data={"user_id": random.choice(user_ids), "exercise_id": random.choice(EXERCISE_IDS), "tier": "preview"},
+                        files={"file": ("take.wav", audio, "audio/wav")}
+                    )
+                except httpx.HTTPError:
+                    pass
+
+        started = time.perf_counter()
+        await asyncio.gather(*(reader(i) for i in range(concurrency)), *(singer() for _ in range(singers)))
+        elapsed = time.perf_counter() - started
+
+    report = {endpoint: _stats(entries, elapsed) for endpoint, entries in samples.items()}
+    report["TOTAL"] = _stats([e for entries in samples.values() for e in entries], elapsed)
+    return report
+
+def measure(label: str, repo_root: str, args, uploads) -> dict:
+    server = Server(workers=1, threadpool=args.threadpool, llm_latency_ms=0, extra_env={}, repo_root=repo_root)
+    try:
+        server.start()
+        with httpx.Client(base_url=server.url) as client:
+            user_ids = [
+                client.post("/users/", json={"nickname": f"rps_singer_{i}", "voice_type": "Tenor"}).json()["id"]
+                for i in range(args.users)
+            ]
+        fill_sessions(os.path.join(server.tmp, "vocal_coach.db"), user_ids, args.sessions_per_user)
+        results = {}
+        for singers in (0, args.singers):
+            scenario = "reads only" if singers == 0 else f"reads + {singers} singers posting sessions"
+            results[scenario] = asyncio.run(run_reads(server.url, user_ids, args.concurrency, args.duration, singers, uploads))
+            print_table(f"{label}: {scenario}", results[scenario])
+        return results
+    finally:
+        server.stop()
+
+def print_table(title: str, report: dict):
+    print(f"\n== {title}")
+    print(f"{'endpoint':<30} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for endpoint, r in report.items():
+        if not r["requests"]:
+            continue
+        print(f"{endpoint:<30} {r['throughput_rps']:>8.1f} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['error_rate']:>7.1%}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Requests/s of the async read endpoints (optionally against a baseline revision).")
+    parser.add_argument("--concurrency", type=int, default=32, help="Concurrent readers")
+    parser.add_argument("--singers", type=int, default=8, help="Concurrent session uploads in the mixed scenario")
+    parser.add_argument("--threadpool", type=int, default=8, help="VOCALCOACH_THREADPOOL of the server")
+    parser.add_argument("--duration", type=float, default=15, help="Seconds per scenario")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--sessions-per-user", type=int, default=300)
+    parser.add_argument("--baseline-ref", help="Also measure this git revision (e.g. HEAD~1)")
+    parser.add_argument("--output", help="Write the reports as JSON")
+    args = parser.parse_args(argv)
+
+    uploads = build_uploads(SESSION_UPLOAD_MIX)
+    reports = {}
+    if args.baseline_ref:
+        worktree = tempfile.mkdtemp(prefix="vocalcoach_baseline_")
+        subprocess.run(["git", "worktree", "add", "--detach", worktree, args.baseline_ref], cwd=REPO_ROOT, check=True, capture_output=True)
+        try:
+            reports[f"baseline ({args.baseline_ref})"] = measure(f"baseline ({args.baseline_ref})", worktree, args, uploads)
+        finally:
+            subprocess.run(["git", "worktree", "remove", "--force", worktree], cwd=REPO_ROOT, check=False, capture_output=True)
+    reports["current"] = measure("current", REPO_ROOT, args, uploads)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "reports": reports}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
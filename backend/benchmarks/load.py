@@ -0,0 +1,293 @@
+"""
+End-to-end load test for capacity planning.
+
+Starts the API with uvicorn (isolated temp working dir: own SQLite DB and upload dir), with
+the in-process fake Gemini backend (backend/intelligence/fake_llm.py) at a configurable
+latency, then drives a realistic request mix from concurrent virtual singers:
+
+    POST /sessions/                 short exercise takes (3-20 s), mostly preview tier
+    POST /analyze/performance       longer performance uploads (30-60 s)
+    GET  /exercises/{id}/audio      exercise playback
+    GET  /stats/trends              dashboard charts
+
+Every (uvicorn workers x threadpool size) combination is measured separately and reported
+as throughput, p50/p95/p99 latency and error rate per endpoint.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.load --workers 1 2 4 --threadpool 8 40 --concurrency 16 --duration 60
+    python -m backend.benchmarks.load --llm-latency-ms 2000 --server-env VOCALCOACH_ROLE=all
+    python -m backend.benchmarks.load --url http://localhost:8000   # existing server, no sweep
+"""
+import argparse
+import asyncio
+import io
+import itertools
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import numpy as np
+
+from ..audio.synth import generate_voice
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SAMPLE_RATE = 22050
+
+# endpoint -> relative weight in the request mix
+SCENARIO_WEIGHTS = {
+    "POST /sessions/": 4,
+    "POST /analyze/performance": 1,
+    "GET /exercises/{id}/audio": 3,
+    "GET /stats/trends": 3,
+}
+# (seconds, probability) of uploaded recordings
+SESSION_UPLOAD_MIX = [(3, 0.5), (8, 0.35), (20, 0.15)]
+PERFORMANCE_UPLOAD_MIX = [(30, 0.7), (60, 0.3)]
+EXERCISE_IDS = list(range(1, 14))
+VOICE_TYPES = ["Sopran", "Mezzo-Sopran", "Alt", "Tenor", "Bariton", "Bass"]
+
+# --- Test data ---
+
+def build_uploads(mix, variants: int = 2):
+    """Pre-renders WAV bytes per duration (a clean and a rough take each)."""
+    from scipy.io.wavfile import write
+
+    uploads = {}
+    for seconds, _ in mix:
+        takes = []
+        for i in range(variants):
+            rough = i % 2 == 1
+            y = generate_voice(
+                random.choice([130.8, 196.0, 261.6, 329.6]), seconds, SAMPLE_RATE,
+                jitter_percent=1.8 if rough else 0.5, shimmer_percent=5.5 if rough else 2.0,
+                hnr_db=12 if rough else 24, vibrato_rate=5.5, vibrato_cents=40, seed=seconds * 10 + i
+            )
+            buffer = io.BytesIO()
+            write(buffer, SAMPLE_RATE, np.int16(y * 32767))
+            takes.append(buffer.getvalue())
+        uploads[seconds] = takes
+    return uploads
+
+def pick_upload(uploads, mix):
+    seconds = random.choices([s for s, _ in mix], weights=[p for _, p in mix])[0]
+    return seconds, random.choice(uploads[seconds])
+
+# --- Server under test ---
+
+class Server:
+    """uvicorn in a temp working dir: DB and user_uploads land there, static files are linked."""
+
+    def __init__(self, workers: int, threadpool: int, llm_latency_ms: float, extra_env: dict, worker_healthcheck: int = 60,
+                 repo_root: str = REPO_ROOT):
+        self.workers = workers
+        self.worker_healthcheck = worker_healthcheck
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.tmp = tempfile.mkdtemp(prefix="vocalcoach_load_")
+        # "backend" is a namespace package, so tmp/backend (static only) and the real
+        # backend/ are merged on import; relative paths in the app resolve inside tmp.
+        os.makedirs(os.path.join(self.tmp, "backend"))
+        os.symlink(os.path.join(repo_root, "backend", "static"), os.path.join(self.tmp, "backend", "static"))
+
+        self.env = dict(
+            os.environ,
+            PYTHONPATH=os.pathsep.join(filter(None, [repo_root, os.environ.get("PYTHONPATH")])),
+            PYTHONWARNINGS="ignore",
+            GEMINI_BACKEND="fake",
+            FAKE_LLM_LATENCY_MS=str(llm_latency_ms),
+            VOCALCOACH_THREADPOOL=str(threadpool),
+            **extra_env
+        )
+        self.proc = None
+
+    def command(self) -> list:
+        return [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1", "--port", str(self.port),
+                "--workers", str(self.workers), "--log-level", "warning",
+                # Praat/pYIN hold the GIL for seconds; with the default 5 s healthcheck the uvicorn
+                # supervisor kills busy workers mid-request (seen as RemoteProtocolError here)
+                "--timeout-worker-healthcheck", str(self.worker_healthcheck)]
+
+    def start(self, timeout: float = 300):
+        subprocess.run([sys.executable, "-m", "backend.seed"], cwd=self.tmp, env=self.env, check=True, capture_output=True)
+        self.proc = subprocess.Popen(self.command(), cwd=self.tmp, env=self.env)
+        # /ready is per worker: require a run of consecutive 200s so (most likely) every worker is warm
+        deadline = time.time() + timeout
+        streak = 0
+        while streak < self.workers * 4:
+            if time.time() > deadline or self.proc.poll() is not None:
+                self.stop()
+                raise RuntimeError(f"Server did not become ready (workers={self.workers})")
+            try:
+                streak = streak + 1 if httpx.get(f"{self.url}/ready", timeout=2).status_code == 200 else 0
+            except httpx.HTTPError:
+                streak = 0
+            time.sleep(0.1)
+
+    def stop(self):
+        if self.proc and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+# --- Load generation ---
+
+async def create_users(client: httpx.AsyncClient, count: int):
+    user_ids = []
+    for i in range(count):
+        response = await client.post("/users/", json={"nickname": f"load_singer_{i}", "voice_type": random.choice(VOICE_TYPES)})
+        response.raise_for_status()
+        user_ids.append(response.json()["id"])
+    return user_ids
+
+async def one_request(client, scenario, user_id, session_uploads, performance_uploads, full_tier_ratio):
+    if scenario == "POST /sessions/":
+        _, audio = pick_upload(session_uploads, SESSION_UPLOAD_MIX)
+        tier = "full" if random.random() < full_tier_ratio else "preview"
+        response = await client.post(
+            "/sessions/",
+            data={"user_id": user_id, "exercise_id": random.choice(EXERCISE_IDS), "tier": tier},
+            files={"file": ("take.wav", audio, "audio/wav")}
+        )
+    elif scenario == "POST /analyze/performance":
+        _, audio = pick_upload(performance_uploads, PERFORMANCE_UPLOAD_MIX)
+        response = await client.post("/analyze/performance", files={"file": ("performance.wav", audio, "audio/wav")})
+    elif scenario == "GET /exercises/{id}/audio":
+        response = await client.get(f"/exercises/{random.choice(EXERCISE_IDS)}/audio", params={"user_id": user_id})
+    else:
+        response = await client.get("/stats/trends", params={"user_id": user_id})
+
+    if response.status_code >= 400:
+        return f"HTTP {response.status_code}"
+    # Analysis endpoints report failures in the body with HTTP 200
+    if response.headers.get("content-type", "").startswith("application/json"):
+        body = response.json()
+        if isinstance(body, dict) and body.get("success") is False:
+            return f"success=false: {str(body.get('error'))[:60]}"
+    return None
+
+async def run_load(url: str, concurrency: int, duration: float, users: int, full_tier_ratio: float, uploads):
+    session_uploads, performance_uploads = uploads
+    scenarios = list(SCENARIO_WEIGHTS)
+    weights = [SCENARIO_WEIGHTS[s] for s in scenarios]
+    samples = {s: [] for s in scenarios} # scenario -> [(latency_s, error or None)]
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, timeout=600, limits=limits) as client:
+        user_ids = await create_users(client, users)
+        deadline = time.perf_counter() + duration
+
+        async def singer():
+            while time.perf_counter() < deadline:
+                scenario = random.choices(scenarios, weights=weights)[0]
+                started = time.perf_counter()
+                try:
+                    error = await one_request(client, scenario, random.choice(user_ids), session_uploads, performance_uploads, full_tier_ratio)
+                except httpx.HTTPError as e:
+                    error = type(e).__name__
+                samples[scenario].append((time.perf_counter() - started, error))
+
+        started = time.perf_counter()
+        await asyncio.gather(*(singer() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return summarize(samples, elapsed)
+
+def summarize(samples, elapsed: float) -> dict:
+    report = {}
+    all_samples = []
+    for scenario, entries in samples.items():
+        all_samples.extend(entries)
+        report[scenario] = _stats(entries, elapsed)
+    report["TOTAL"] = _stats(all_samples, elapsed)
+    return report
+
+def _stats(entries, elapsed: float) -> dict:
+    if not entries:
+        return {"requests": 0, "throughput_rps": 0.0, "p50_ms": None, "p95_ms": None, "p99_ms": None, "error_rate": None, "errors": {}}
+    latencies = np.array([e[0] for e in entries]) * 1000
+    errors = {}
+    for _, error in entries:
+        if error:
+            errors[error] = errors.get(error, 0) + 1
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "requests": len(entries),
+        "throughput_rps": round(len(entries) / elapsed, 2),
+        "p50_ms": round(float(p50), 1),
+        "p95_ms": round(float(p95), 1),
+        "p99_ms": round(float(p99), 1),
+        "error_rate": round(sum(errors.values()) / len(entries), 4),
+        "errors": errors
+    }
+
+def print_report(label: str, report: dict):
+    print(f"\n== {label}")
+    print(f"{'endpoint':<28} {'req':>6} {'req/s':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for endpoint, r in report.items():
+        if not r["requests"]:
+            print(f"{endpoint:<28} {0:>6}")
+            continue
+        print(f"{endpoint:<28} {r['requests']:>6} {r['throughput_rps']:>7.2f} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f} {r['error_rate']:>7.1%}")
+        if endpoint != "TOTAL":
+            for error, count in sorted(r["errors"].items(), key=lambda item: -item[1]):
+                print(f"    {count:>5} x {error}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the API with a fake LLM backend.")
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 2], help="uvicorn worker counts to sweep")
+    parser.add_argument("--threadpool", nargs="+", type=int, default=[40], help="Threadpool sizes to sweep (VOCALCOACH_THREADPOOL)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent virtual singers")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds of load per configuration")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--full-tier-ratio", type=float, default=0.2, help="Share of sessions sent with tier=full")
+    parser.add_argument("--llm-latency-ms", type=float, default=800)
+    parser.add_argument("--worker-healthcheck", type=int, default=60, help="uvicorn --timeout-worker-healthcheck (seconds)")
+    parser.add_argument("--server-env", action="append", default=[], metavar="KEY=VALUE", help="Extra env for the server (repeatable)")
+    parser.add_argument("--url", help="Test an already running server instead (no sweep)")
+    parser.add_argument("--output", help="Write all reports as JSON")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    uploads = (build_uploads(SESSION_UPLOAD_MIX), build_uploads(PERFORMANCE_UPLOAD_MIX))
+    extra_env = dict(kv.split("=", 1) for kv in args.server_env)
+    results = []
+
+    if args.url:
+        report = asyncio.run(run_load(args.url, args.concurrency, args.duration, args.users, args.full_tier_ratio, uploads))
+        print_report(args.url, report)
+        results.append({"url": args.url, "concurrency": args.concurrency, "report": report})
+    else:
+        for workers, threadpool in itertools.product(args.workers, args.threadpool):
+            label = f"workers={workers} threadpool={threadpool} concurrency={args.concurrency} llm={args.llm_latency_ms:.0f}ms"
+            server = Server(workers, threadpool, args.llm_latency_ms, extra_env, args.worker_healthcheck)
+            try:
+                server.start()
+                report = asyncio.run(run_load(server.url, args.concurrency, args.duration, args.users, args.full_tier_ratio, uploads))
+            finally:
+                server.stop()
+            print_report(label, report)
+            results.append({"workers": workers, "threadpool": threadpool, "concurrency": args.concurrency,
+                            "llm_latency_ms": args.llm_latency_ms, "server_env": extra_env, "report": report})
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
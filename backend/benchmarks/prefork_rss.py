@@ -0,0 +1,119 @@
+"""
+Memory per worker: `uvicorn --workers N` (every worker starts cold) against the pre-forking
+server (`python -m backend.serve --workers N`, preload and warm-up in the parent).
+
+Both run in a temp working dir as in load.py, warm-up on. Once /ready answers, the worker
+processes are read from /proc/<pid>/smaps_rollup:
+
+    RSS  resident pages, shared ones counted again in every process (what `ps` / `top` show)
+    PSS  proportional: shared pages divided by the processes mapping them. Sums to real use.
+    USS  private pages only, what a worker adds to the host
+
+The figures are measured again after a few session uploads (--requests), because serving
+writes to some shared pages and so copies them.
+
+Usage (from the repository root; Linux only):
+    python -m backend.benchmarks.prefork_rss --workers 4
+    python -m backend.benchmarks.prefork_rss --workers 2 --requests 0
+"""
+import argparse
+import os
+import random
+import sys
+
+import httpx
+
+from .load import SESSION_UPLOAD_MIX, Server, build_uploads, pick_upload
+
+class PreforkServer(Server):
+    def command(self) -> list:
+        return [sys.executable, "-m", "backend.serve", "--host", "127.0.0.1", "--port", str(self.port),
+                "--workers", str(self.workers), "--log-level", "warning"]
+
+def _children(pid: int) -> list:
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                cmdline = f.read().replace(b"\0", b" ").decode(errors="replace")
+        except OSError:
+            continue
+        # Fields after the parenthesized command name: state, ppid, ...
+        if int(stat.rsplit(")", 1)[1].split()[1]) == pid and "resource_tracker" not in cmdline:
+            children.append(int(entry))
+    return sorted(children)
+
+def memory_of(pid: int) -> dict:
+    """RSS / PSS / USS in MiB from smaps_rollup."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {
+        "rss": fields.get("Rss", 0.0),
+        "pss": fields.get("Pss", 0.0),
+        "uss": fields.get("Private_Clean", 0.0) + fields.get("Private_Dirty", 0.0),
+    }
+
+def measure(server: Server) -> dict:
+    workers = _children(server.proc.pid)
+    per_worker = [memory_of(pid) for pid in workers]
+    parent = memory_of(server.proc.pid)
+    total = {key: parent[key] + sum(w[key] for w in per_worker) for key in ("rss", "pss", "uss")}
+    mean = {key: sum(w[key] for w in per_worker) / max(1, len(per_worker)) for key in ("rss", "pss", "uss")}
+    return {"workers": len(workers), "parent": parent, "mean": mean, "total": total}
+
+def exercise(server: Server, requests: int, uploads):
+    """A few preview sessions, so every worker (most likely) served something."""
+    with httpx.Client(base_url=server.url, timeout=120) as client:
+        user_id = client.post("/users/", json={"nickname": f"rss_check_{random.randint(0, 10**9)}", "voice_type": "Tenor"}).json()["id"]
+        for i in range(requests):
+            _, audio = pick_upload(uploads, SESSION_UPLOAD_MIX)
+            client.post("/sessions/", data={"user_id": user_id, "exercise_id": random.randint(1, 13)},
+                        files={"file": (f"take{i}.wav", audio, "audio/wav")}).raise_for_status()
+
+def print_row(label: str, phase: str, m: dict):
+    mean, total = m["mean"], m["total"]
+    print(f"{label:<8} {phase:<13} {m['workers']:>7} {mean['rss']:>9.0f} {mean['pss']:>9.0f} {mean['uss']:>9.0f}"
+          f" {total['pss']:>10.0f} {m['parent']['pss']:>10.0f}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-worker memory: cold uvicorn workers vs. the pre-forking server.")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=8, help="Session uploads before the second measurement (0: skip)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        raise SystemExit("Needs Linux /proc/<pid>/smaps_rollup.")
+    random.seed(args.seed)
+    uploads = build_uploads(SESSION_UPLOAD_MIX) if args.requests else None
+    env = {"VOCALCOACH_WARMUP": "1"}
+
+    results = {}
+    print(f"{'server':<8} {'phase':<13} {'workers':>7} {'RSS/wkr':>9} {'PSS/wkr':>9} {'USS/wkr':>9} {'PSS total':>10} {'PSS parent':>10}  (MiB)")
+    for label, cls in (("cold", Server), ("prefork", PreforkServer)):
+        server = cls(args.workers, 40, 0, env)
+        try:
+            server.start()
+            results[label] = measure(server)
+            print_row(label, "ready", results[label])
+            if args.requests:
+                exercise(server, args.requests, uploads)
+                print_row(label, "after load", measure(server))
+        finally:
+            server.stop()
+
+    cold, prefork = results["cold"]["mean"], results["prefork"]["mean"]
+    print(f"\nPrivate memory per worker (USS): {cold['uss']:.0f} -> {prefork['uss']:.0f} MiB "
+          f"({100 * (1 - prefork['uss'] / cold['uss']):.0f}% less); "
+          f"total PSS: {results['cold']['total']['pss']:.0f} -> {results['prefork']['total']['pss']:.0f} MiB")
+
+if __name__ == "__main__":
+    main()
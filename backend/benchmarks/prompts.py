@@ -0,0 +1,154 @@
+"""
+Prompt size and retrieval latency of the AI feedback prompts.
+
+Builds the exercise feedback and performance review prompts for a grid of sessions (every
+exercise x voice type x metric profile) twice: as before (indented JSON dump of the metrics
+plus fixed get_feedback_context lines) and as sent now (compacted, the top-k knowledge base
+snippets within RETRIEVAL_TOKEN_BUDGET). Reports the estimated prompt tokens, the retrieved
+context size and the retrieval latency.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.prompts
+    RETRIEVAL_TOKEN_BUDGET=120 python -m backend.benchmarks.prompts --repeat 200
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from ..intelligence import ai_wrapper, retrieval
+from ..intelligence.knowledge import KNOWLEDGE_BASE, get_feedback_context
+
+# Metric profiles: healthy, rough (jitter), breathy (shimmer / HNR)
+PROFILES = {
+    "healthy": {"jitter_percent": 0.41, "shimmer_percent": 2.2, "hnr_db": 24.6},
+    "rough": {"jitter_percent": 1.82, "shimmer_percent": 3.4, "hnr_db": 19.1},
+    "breathy": {"jitter_percent": 0.93, "shimmer_percent": 6.3, "hnr_db": 10.4},
+}
+PITCH_METRICS = {"min_pitch_hz": 196.03, "max_pitch_hz": 393.71, "avg_pitch_hz": 262.38, "pitch_stability_std": 1.83,
+                 "range_semitones": 12.1, "vocal_range": "G3 - G4"}
+
+# The prompts as they were built before (ai_wrapper), for comparison
+def legacy_feedback_prompt(exercise_name: str, metrics: dict, user_context: dict) -> str:
+    scientific_context = []
+    if "jitter_percent" in metrics:
+        scientific_context.append(get_feedback_context("jitter_local", metrics["jitter_percent"]))
+    if "shimmer_percent" in metrics:
+        scientific_context.append(get_feedback_context("shimmer_local", metrics["shimmer_percent"]))
+    if "hnr_db" in metrics:
+        scientific_context.append(get_feedback_context("hnr", metrics["hnr_db"]))
+    context_str = "\n".join(scientific_context)
+    history_str = f"""
+            Verlauf (Letzte {user_context['history_count']} Sessions):
+            - Durchschnitt Score: {user_context['history_avg_score']}
+            - Trend heute: stabil
+            """
+    return f"""
+        Du bist ein professioneller, aber motivierender Vocal Coach (VocalCoach AI).
+        Dein Schüler (Level {user_context.get('level', 1)}, {user_context.get('voice_type', 'Unbekannt')}) hat gerade die Übung '{exercise_name}' gemacht.
+
+        Messdaten der Aufnahme:
+        {json.dumps(metrics, indent=2)}
+
+        {history_str}
+
+        Wissenschaftlicher Hintergrund (zur internen Analyse):
+        {context_str}
+
+        Aufgabe:
+        Gib kurzes, prägnantes und motivierendes Feedback (max 3 Sätze).
+        1. Erwähne kurz das Ergebnis (Lob oder sanfte Korrektur).
+        2. Gib einen konkreten physikalischen Tipp zur Verbesserung basierend auf den Werten (z.B. bei hohem Jitter -> 'Denk an ein inneres Lächeln' oder 'weniger Druck').
+        Nutze Metaphern aus dem Gesangsunterricht.
+        Sei du per Du. Nutze Emojis passend.
+        """
+
+def legacy_performance_prompt(metrics: dict, user_context: dict) -> str:
+    health_context = [f"Vocal Health Status: {metrics['health_status']}",
+                      f"Jitter: {metrics['jitter_percent']}% (Zittrigkeit/Rauigkeit)",
+                      f"Pitch Stability (StdDev): {metrics['pitch_stability_std']} (Niedriger ist stabiler)"]
+    context_str = "\n".join(health_context)
+    return f"""
+        Du bist 'VocalCoach AI', ein erfahrener, analytischer aber sehr empathischer Gesangslehrer.
+        Dein Schüler (Level {user_context.get('level', 1)}, {user_context.get('voice_type', 'Unbekannt')}) hat eine Performance (Song/Arie) aufgenommen.
+
+        Technische Analyse der Aufnahme:
+        {json.dumps(metrics, indent=2)}
+
+        Kontext & Interpretation:
+        {context_str}
+
+        Deine Aufgabe:
+        Schreibe ein konstruktives Feedback (ca. 4-5 Sätze).
+        1. **Gesamteindruck:** Wie war die Performance technisch? (Pitch Range, Stabilität).
+        2. **Vocal Health:** Interpretiere die Ampel/Jitter Werte. Wenn "Gelb" oder "Rot": Warne sanft vor Überanstrengung oder Pressen.
+        3. **Coaching Tipp:** Gib EINEN konkreten Tipp für das nächste Mal (z.B. Atemstütze, Vokalausgleich, Entspannung).
+
+        Tone of Voice:
+        - Professionell aber locker ("Du").
+        - Nutze Metaphern (z.B. "Stell dir vor...", "Wie ein...").
+        - Sei motivierend!
+        """
+
+def sessions():
+    """(kind, exercise name, metrics, user context) for the whole grid."""
+    exercises = [e["name"] for level in KNOWLEDGE_BASE["exercises"].values() for e in level]
+    for voice_type in KNOWLEDGE_BASE["voice_classification"]["fache"]:
+        user_context = {"level": 3, "voice_type": voice_type, "streak": 4, "history_avg_score": 72.4, "history_count": 5}
+        for profile in PROFILES.values():
+            metrics = dict(profile, **PITCH_METRICS)
+            for name in exercises:
+                yield "feedback", name, dict(metrics, score=78), user_context
+            yield "performance", None, dict(metrics, health_status="yellow"), user_context
+
+def _summary(values) -> str:
+    values = np.asarray(values, dtype=float)
+    return f"mean {values.mean():7.0f}  p95 {np.percentile(values, 95):7.0f}"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prompt size and retrieval latency, before/after the retrieval index.")
+    parser.add_argument("--repeat", type=int, default=50, help="Timed retrieval passes over all sessions")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    retrieval.Index(retrieval.build_snippets())
+    build_ms = (time.perf_counter() - started) * 1000
+
+    sizes = {kind: {"before": [], "after": [], "context": []} for kind in ("feedback", "performance")}
+    for kind, name, metrics, user_context in sessions():
+        if kind == "feedback":
+            before, after = legacy_feedback_prompt(name, metrics, user_context), ai_wrapper.feedback_prompt(name, metrics, user_context)
+        else:
+            before, after = legacy_performance_prompt(metrics, user_context), ai_wrapper.performance_prompt(metrics, user_context)
+        after = ai_wrapper.compact_prompt(after) # As sent
+        sizes[kind]["before"].append(retrieval.estimate_tokens(before))
+        sizes[kind]["after"].append(retrieval.estimate_tokens(after))
+        context = retrieval.context_for(name or "Performance", metrics, user_context)
+        sizes[kind]["context"].append(retrieval.estimate_tokens(context))
+
+    latencies = []
+    grid = list(sessions())
+    for _ in range(args.repeat):
+        for _, name, metrics, user_context in grid:
+            started = time.perf_counter()
+            retrieval.retrieve(name or "Performance", metrics, user_context) # Query building included
+            latencies.append((time.perf_counter() - started) * 1e6)
+
+    print(f"Index: {len(retrieval.INDEX.snippets)} snippets, {len(retrieval.INDEX.vocabulary)} terms, built in {build_ms:.1f} ms; "
+          f"budget {retrieval.TOKEN_BUDGET} tokens, top {retrieval.TOP_K}")
+    for kind, s in sizes.items():
+        print(f"{kind:<12} prompts: {len(s['before'])}")
+        print(f"  before    est. tokens {_summary(s['before'])}")
+        print(f"  after     est. tokens {_summary(s['after'])}   ({100 * (np.mean(s['after']) / np.mean(s['before']) - 1):+.0f}%)")
+        print(f"  retrieved est. tokens {_summary(s['context'])}   max {max(s['context'])}")
+    latencies = np.array(latencies)
+    print(f"Retrieval latency: p50 {np.percentile(latencies, 50):.0f} us, p95 {np.percentile(latencies, 95):.0f} us, "
+          f"p99 {np.percentile(latencies, 99):.0f} us ({len(latencies)} queries)")
+    over_budget = sum(c > retrieval.TOKEN_BUDGET for s in sizes.values() for c in s["context"])
+    if over_budget:
+        print(f"FAIL {over_budget} retrieved contexts over the token budget")
+    raise SystemExit(1 if over_budget else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Query benchmark for session trends and the nickname login lookup.
+
+Seeds a throwaway SQLite database with many users and millions of sessions (skewed: a few
+heavy users, a long tail of light ones), then runs the real query code paths
+(the /stats/trends queries and the POST /users/ endpoint) for
+random users. The statements are measured twice: without the session indexes from the
+migrations and with them. For every statement the SQLite query plan is printed, followed by p50/p95/p99
+latencies.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.queries --sessions 2000000 --users 20000
+    python -m backend.benchmarks.queries --db /tmp/sessions.db   # keep/reuse the seeded DB
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# Query benchmarks never need the DSP stack or the real Gemini API
+os.environ["GEMINI_API_KEY"] = ""
+os.environ.setdefault("VOCALCOACH_WARMUP", "0")
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+
+from .. import models, migrations, schemas, trends
+
+SESSION_INDEXES = ("ix_sessions_user_history", "ix_sessions_user_created_at", "ix_sessions_user_trends", "ix_sessions_user_health")
+METRICS_TEMPLATE = (
+    '{{"tier": "full", "xp_earned": {xp}, '
+    '"health": {{"jitter_percent": {jitter:.3f}, "shimmer_percent": {shimmer:.3f}, "hnr_db": {hnr:.2f}}}, '
+    '"pitch": {{"min_pitch_hz": 196.0, "max_pitch_hz": 392.0, "avg_pitch_hz": 261.6, "pitch_stability_std": 3.2, '
+    '"range_semitones": 12.0, "vocal_range": "G3 - G4"}}, '
+    '"assessment": {{"jitter": {{"status": "green", "feedback": "Stabil"}}, "overall": "green"}}}}'
+)
+
+# --- Seeding ---
+
+def seed(db_path: str, n_users: int, n_sessions: int, seed_value: int = 7):
+    engine = create_engine(f"sqlite:///{db_path}")
+    migrations.upgrade(engine)
+    engine.dispose()
+
+    rng = np.random.default_rng(seed_value)
+    con = sqlite3.connect(db_path)
+    # Bulk load without the session indexes, they are (re)built afterwards
+    for name in SESSION_INDEXES:
+        con.execute(f"DROP INDEX IF EXISTS {name}")
+    con.execute("PRAGMA synchronous = OFF")
+    con.execute("PRAGMA journal_mode = MEMORY")
+
+    con.executemany(
+        "INSERT INTO users (id, nickname, voice_type, xp, level, current_streak, badges, settings_genre) VALUES (?, ?, ?, 0, 1, 0, '[]', 'Pop')",
+        ((i, f"singer_{i}", "Tenor") for i in range(1, n_users + 1))
+    )
+
+    start = datetime(2024, 1, 1)
+    step = timedelta(days=2 * 365) / n_sessions
+    chunk = 200_000
+    for offset in range(0, n_sessions, chunk):
+        size = min(chunk, n_sessions - offset)
+        # u**3 skews sessions towards low user ids (power users)
+        user_ids = (rng.random(size) ** 3 * n_users).astype(int) + 1
+        exercise_ids = rng.integers(1, 14, size)
+        scores = rng.integers(20, 101, size)
+        jitters = rng.gamma(2.0, 0.4, size)
+        rows = (
+            (
+                offset + i + 1, int(user_ids[i]), int(exercise_ids[i]), int(scores[i]),
+                f"backend/user_uploads/take_{offset + i}.wav",
+                METRICS_TEMPLATE.format(xp=int(scores[i]) // 2, jitter=jitters[i], shimmer=jitters[i] * 3, hnr=20 - jitters[i]),
+                json.dumps("Gut gemacht!"),
+                float(jitters[i]), float(jitters[i] * 3), float(20 - jitters[i]), "green" if jitters[i] < 1.04 else "red",
+                (start + step * (offset + i)).strftime("%Y-%m-%d %H:%M:%S.%f")
+            )
+            for i in range(size)
+        )
+        con.executemany(
+            "INSERT INTO sessions (id, user_id, exercise_id, score, audio_url, metrics_json, ai_feedback, "
+            "jitter_percent, shimmer_percent, hnr_db, health_status, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        con.commit()
+        print(f"  seeded {offset + size:,}/{n_sessions:,} sessions", end="\r", flush=True)
+    print()
+    con.close()
+
+def set_indexes(engine, enabled: bool):
+    """Drops the session indexes, or re-applies the migrations to (re)create them."""
+    with engine.begin() as conn:
+        if enabled:
+            conn.execute(text("DELETE FROM schema_migrations"))
+        else:
+            for name in SESSION_INDEXES:
+                conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    if enabled:
+        migrations.upgrade(engine)
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+
+# --- Measurement ---
+
+class StatementLog:
+    """Collects the SQL the ORM emits, so plans are explained for the real statements."""
+
+    def __init__(self, engine):
+        self.statements = []
+        event.listen(engine, "before_cursor_execute", self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append((statement, parameters))
+
+def query_cases(main):
+    """name -> callable(db, user) exercising the production code path."""
+    return {
+        "trends (newest page)": lambda db, user: trends.session_rows(db, user.id),
+        "trends (weekly buckets)": lambda db, user: trends.bucket_rows(db, user.id, "week"),
+        "login (nickname lookup)": lambda db, user: main.create_user(schemas.UserCreate(nickname=user.nickname), db=db),
+    }
+
+def explain(engine, log: StatementLog, call, db, user):
+    log.statements.clear()
+    call(db, user)
+    plans = []
+    with engine.connect() as conn:
+        for statement, parameters in log.statements:
+            if not statement.lstrip().upper().startswith("SELECT"):
+                continue
+            rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", tuple(parameters)).all()
+            plans.append((" ".join(statement.split())[:160], [row[-1] for row in rows]))
+    return plans
+
+def measure(engine, SessionLocal, log, cases, users, samples: int, label: str):
+    print(f"\n=== {label}")
+    results = {}
+    for name, call in cases.items():
+        db = SessionLocal()
+        try:
+            for statement, plan in explain(engine, log, call, db, users[0]):
+                print(f"\n{name}\n  SQL:  {statement}")
+                for step in plan:
+                    print(f"  PLAN: {step}")
+            timings = []
+            for user in random.sample(users, min(samples, len(users))):
+                started = time.perf_counter()
+                call(db, user)
+                timings.append((time.perf_counter() - started) * 1000)
+                db.expire_all()
+        finally:
+            db.close()
+        p50, p95, p99 = np.percentile(timings, [50, 95, 99])
+        results[name] = {"p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3), "p99_ms": round(float(p99), 3)}
+        print(f"  latency: p50 {p50:.2f} ms  p95 {p95:.2f} ms  p99 {p99:.2f} ms  (n={len(timings)})")
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark session trends queries with and without indexes.")
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--sessions", type=int, default=2_000_000)
+    parser.add_argument("--samples", type=int, default=50, help="Random users measured per query")
+    parser.add_argument("--db", help="SQLite file to seed/reuse (default: temp file, deleted afterwards)")
+    args = parser.parse_args(argv)
+
+    random.seed(42)
+    db_path = args.db or os.path.join(tempfile.mkdtemp(prefix="vocalcoach_queries_"), "queries.db")
+    if not os.path.exists(db_path):
+        print(f"Seeding {args.users:,} users / {args.sessions:,} sessions into {db_path}")
+        started = time.perf_counter()
+        seed(db_path, args.users, args.sessions)
+        print(f"Seeded in {time.perf_counter() - started:.1f} s ({os.path.getsize(db_path) / 1e6:.0f} MB)")
+
+    from .. import main as app_main # endpoint functions are called directly, not over HTTP
+
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    log = StatementLog(engine)
+    cases = query_cases(app_main)
+
+    db = SessionLocal()
+    # Mix of heavy (low id) and light users; users[0] (heaviest) is used for the plans
+    users = [db.get(models.User, 1)] + db.query(models.User).filter(models.User.id > 1).all()
+    db.expunge_all()
+    db.close()
+
+    set_indexes(engine, enabled=False)
+    before = measure(engine, SessionLocal, log, cases, users, args.samples, "without session indexes")
+    set_indexes(engine, enabled=True)
+    after = measure(engine, SessionLocal, log, cases, users, args.samples, "with session indexes")
+
+    print(f"\n{'query':<28} {'p50 before':>11} {'p50 after':>10} {'p95 before':>11} {'p95 after':>10}")
+    for name in cases:
+        b, a = before[name], after[name]
+        print(f"{name:<28} {b['p50_ms']:>9.2f}ms {a['p50_ms']:>8.2f}ms {b['p95_ms']:>9.2f}ms {a['p95_ms']:>8.2f}ms")
+
+    if not args.db:
+        engine.dispose()
+        os.remove(db_path)
+        os.rmdir(os.path.dirname(db_path))
+
+if __name__ == "__main__":
+    main()
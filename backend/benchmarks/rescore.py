@@ -0,0 +1,97 @@
+"""
+Throughput of the bulk re-scoring job (rescore.py).
+
+Seeds a throwaway SQLite database with synthetic sessions (pattern and standard exercises,
+stored pitch/rhythm features, health lights), changes the scoring weights in-process as a
+scoring update would, and times `rescore.rescore` for a few chunk sizes. Every run starts
+from the same seeded file, so the numbers are comparable.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.rescore --sessions 1000000 --users 5000
+"""
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Only the scoring code runs, no DSP stack
+os.environ.setdefault("VOCALCOACH_WARMUP", "0")
+
+from sqlalchemy.orm import sessionmaker
+
+from .. import database, migrations, models, rescore, scoring
+
+def seed(path: str, sessions: int, users: int, seed_value: int = 7):
+    engine = database.make_engine(f"sqlite:///{path}")
+    migrations.upgrade(engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    db.add_all(
+        models.Exercise(id=i, name=f"bench{i}", category="Bench", difficulty=1 + i % 3, pattern={"intervals": [0, 2, 4]} if i % 2 else None)
+        for i in range(1, 13)
+    )
+    db.add_all(models.User(id=i, nickname=f"bench{i}", xp=0, level=1, current_streak=0) for i in range(1, users + 1))
+    db.commit()
+    db.close()
+
+    rng = random.Random(seed_value)
+    start = datetime.utcnow() - timedelta(days=365)
+    table = models.Session.__table__
+    for offset in range(0, sessions, 50_000):
+        rows = []
+        for i in range(offset, min(offset + 50_000, sessions)):
+            exercise_id = rng.randint(1, 12)
+            if exercise_id % 2:
+                pitch = {"pitch_score": round(rng.uniform(20, 100), 1), "rhythm_score": round(rng.uniform(20, 100), 1)}
+            else:
+                pitch = {"pitch_stability_std": round(rng.uniform(0.5, 4), 2)}
+            rows.append({
+                "user_id": rng.randint(1, users), "exercise_id": exercise_id, "score": 60, "jitter_percent": 1.0,
+                "created_at": start + timedelta(seconds=i * 20),
+                "metrics_json": {"tier": "full", "xp_earned": 40, "health": {"jitter_percent": 1.0}, "pitch": pitch,
+                                 "assessment": {"overall": rng.choice(["green", "yellow", "red"])}}
+            })
+        with engine.begin() as conn:
+            conn.execute(table.insert(), rows)
+    engine.dispose()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the bulk re-scoring job.")
+    parser.add_argument("--sessions", type=int, default=500_000)
+    parser.add_argument("--users", type=int, default=2_000)
+    parser.add_argument("--batch-sizes", default="1000,5000,20000")
+    args = parser.parse_args(argv)
+
+    tmp_dir = tempfile.mkdtemp(prefix="vocalcoach_rescore_")
+    seeded = os.path.join(tmp_dir, "seeded.db")
+    try:
+        started = time.perf_counter()
+        seed(seeded, args.sessions, args.users)
+        print(f"Seeded {args.sessions:,} sessions / {args.users:,} users in {time.perf_counter() - started:.1f}s")
+
+        # A scoring update: new weights, new version
+        scoring.PITCH_WEIGHT, scoring.RHYTHM_WEIGHT, scoring.HEALTH_RED_PENALTY = 0.6, 0.4, 15
+        results = []
+        for batch_size in (int(b) for b in args.batch_sizes.split(",")):
+            path = os.path.join(tmp_dir, f"run_{batch_size}.db")
+            shutil.copy(seeded, path)
+            engine = database.make_engine(f"sqlite:///{path}")
+            started = time.perf_counter()
+            counters = rescore.rescore(sessionmaker(autoflush=False, bind=engine), batch_size=batch_size, version=scoring.SCORING_VERSION + 1)
+            elapsed = time.perf_counter() - started
+            engine.dispose()
+            os.remove(path)
+            results.append((batch_size, elapsed, counters))
+
+        print(f"\n{'batch':>8} {'seconds':>9} {'sessions/s':>11} {'changed':>9} {'per 1M':>8}")
+        for batch_size, elapsed, counters in results:
+            rate = counters["sessions"] / elapsed
+            print(f"{batch_size:>8} {elapsed:>9.1f} {rate:>11,.0f} {counters['scores_changed']:>9,} {1_000_000 / rate:>7.0f}s")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
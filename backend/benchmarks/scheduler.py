@@ -0,0 +1,90 @@
+"""
+Queue waits per priority class: scheduler.py against plain first-come-first-served.
+
+Simulates a mixed workload on a few worker slots (no audio, jobs sleep for their cost scaled
+down by --time-scale): singers sending short live exercises, a few sessions, one user
+uploading a stack of long performances at once, and a batch run. Prints the p50 / p95 /
+max wait of each class, and of the bursting user next to the other performance uploads,
+for both disciplines.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.scheduler --workers 4 --singers 40
+"""
+import argparse
+import asyncio
+import random
+
+import numpy as np
+
+from .. import scheduler
+
+def workload(singers: int, seed_value: int = 11):
+    """(arrival seconds, job name, user, cost seconds) sorted by arrival."""
+    rng = random.Random(seed_value)
+    jobs = []
+    for singer in range(singers):
+        t = rng.uniform(0, 5)
+        while t < 60:
+            jobs.append((t, "sessions.preview", f"singer{singer}", rng.uniform(0.1, 0.4)))
+            if rng.random() < 0.15:
+                jobs.append((t + 0.5, "sessions.full", f"singer{singer}", rng.uniform(1.5, 4)))
+            t += rng.uniform(4, 12)
+    # One user uploads ten songs at once, a few others one each
+    jobs += [(10 + i * 0.1, "performance", "burst", rng.uniform(40, 90)) for i in range(10)]
+    jobs += [(rng.uniform(0, 60), "performance", f"perf{i}", rng.uniform(20, 60)) for i in range(4)]
+    jobs += [(2 + i * 0.05, "batch", "batch", rng.uniform(5, 20)) for i in range(30)]
+    return sorted(jobs)
+
+async def simulate(jobs, workers: int, time_scale: float, fair: bool):
+    sched = scheduler.Scheduler(workers=workers, max_long_jobs=max(1, workers // 2))
+    fifo = asyncio.Semaphore(workers)
+    waits = []
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+
+    async def one(arrival, job_name, user, cost):
+        await asyncio.sleep(max(0.0, start + arrival * time_scale - loop.time()))
+        queued = loop.time()
+        if fair:
+            job = await sched.acquire(job_name, user, cost)
+        else:
+            await fifo.acquire()
+        waits.append((job_name, user, (loop.time() - queued) / time_scale))
+        await asyncio.sleep(cost * time_scale)
+        if fair:
+            sched.release(job)
+        else:
+            fifo.release()
+
+    await asyncio.gather(*(one(*job) for job in jobs))
+    return waits
+
+def summarize(waits):
+    groups = {}
+    for job_name, user, wait in waits:
+        groups.setdefault(scheduler.PRIORITY_OF[job_name], []).append(wait)
+        if job_name == "performance":
+            groups.setdefault("burst user" if user == "burst" else "other perf", []).append(wait)
+    return {name: np.percentile(values, [50, 95, 100]) for name, values in groups.items()}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate queue waits with and without the analysis scheduler.")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--singers", type=int, default=40)
+    parser.add_argument("--time-scale", type=float, default=0.01, help="Wall seconds per simulated second")
+    args = parser.parse_args(argv)
+
+    jobs = workload(args.singers)
+    print(f"{len(jobs)} jobs, {sum(j[3] for j in jobs):,.0f} worker seconds on {args.workers} workers")
+    results = {name: summarize(asyncio.run(simulate(jobs, args.workers, args.time_scale, fair)))
+               for name, fair in (("fifo", False), ("scheduler", True))}
+
+    print(f"\n{'class':<12} {'discipline':<10} {'p50 wait':>9} {'p95 wait':>9} {'max wait':>9}")
+    for group in (*scheduler.PRIORITIES, "burst user", "other perf"):
+        for name, summary in results.items():
+            if group in summary:
+                p50, p95, worst = summary[group]
+                print(f"{group:<12} {name:<10} {p50:>8.1f}s {p95:>8.1f}s {worst:>8.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+SQLite concurrency benchmark for the session write path.
+
+Writer threads play request threads finishing an analysis: each loop runs the real write step
+(pipeline.persist_session: session row, streak, XP, learning rollups) through either one
+transaction per write or the group-commit WriteBatcher. Reader threads hit the /stats/trends
+query at the same time. Every configuration starts from a fresh database file.
+
+Reported per configuration: committed writes/s, write and read latency percentiles and
+"database is locked" errors (writers that gave up after the busy timeout).
+
+Usage (from the repository root):
+    python -m backend.benchmarks.sqlite_concurrency
+    python -m backend.benchmarks.sqlite_concurrency --writers 32 --readers 8 --duration 20 --output results/sqlite.json
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+os.environ["GEMINI_API_KEY"] = ""
+os.environ.setdefault("VOCALCOACH_WARMUP", "0")
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from .. import database, migrations, models, pipeline, trends
+
+# (label, journal_mode, synchronous, batching)
+CONFIGS = [
+    ("rollback journal, synchronous=full", "delete", "full", False),
+    ("wal, synchronous=full", "wal", "full", False),
+    ("wal, synchronous=normal", "wal", "normal", False),
+    ("wal, synchronous=normal, batched", "wal", "normal", True),
+]
+
+def fake_analysis(rng: random.Random) -> dict:
+    jitter = rng.uniform(0.3, 1.6)
+    return {
+        "score": rng.randint(40, 100),
+        "health_result": {
+            "metrics": {"jitter_percent": jitter, "shimmer_percent": rng.uniform(2, 6), "hnr_db": rng.uniform(12, 25)},
+            "assessment": {"overall": "green" if jitter < 1.04 else "yellow"}
+        },
+        "pitch_result": {"metrics": {"accuracy_score": rng.uniform(50, 100)}}
+    }
+
+def prepare(db_path: str, users: int):
+    engine = database.make_engine(f"sqlite:///{db_path}")
+    migrations.upgrade(engine)
+    db = sessionmaker(bind=engine)()
+    db.add_all(models.Exercise(id=i, name=f"bench{i}", category="Bench", difficulty=1 + i % 3) for i in range(1, 13))
+    db.add_all(models.User(nickname=f"bench{i}", voice_type="Tenor", xp=0, level=1, current_streak=0) for i in range(users))
+    db.commit()
+    user_ids = [u.id for u in db.query(models.User.id)]
+    exercises = db.query(models.Exercise).all()
+    db.close() # Exercises stay readable detached
+    engine.dispose()
+    return user_ids, exercises
+
+def run_config(label: str, journal_mode: str, synchronous: str, batching: bool, args) -> dict:
+    fd, db_path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        user_ids, exercises = prepare(db_path, args.users)
+        engine = database.make_engine(
+            f"sqlite:///{db_path}", journal_mode=journal_mode, synchronous=synchronous,
+            busy_timeout_ms=args.busy_timeout_ms, pool_size=args.writers + args.readers, max_overflow=0
+        )
+        factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        batcher = database.WriteBatcher(factory, args.batch_max, args.batch_wait_ms) if batching else None
+
+        write_latency, read_latency = [], []
+        errors = {"locked": 0, "other": 0}
+        lock = threading.Lock()
+        stop_at = time.perf_counter() + args.duration
+
+        def writer(worker: int):
+            rng = random.Random(worker)
+            while time.perf_counter() < stop_at:
+                user_id, exercise, analysis = rng.choice(user_ids), rng.choice(exercises), fake_analysis(rng)
+                job = lambda db: pipeline.persist_session(db, user_id, exercise, analysis, pipeline.TIER_FULL, "bench.wav")
+                started = time.perf_counter()
+                try:
+                    batcher.submit(job) if batcher else database.write(job, factory)
+                except OperationalError as e:
+                    with lock:
+                        errors["locked" if "locked" in str(e) else "other"] += 1
+                    continue
+                except Exception:
+                    with lock:
+                        errors["other"] += 1
+                    continue
+                with lock:
+                    write_latency.append(time.perf_counter() - started)
+
+        def reader(worker: int):
+            rng = random.Random(1000 + worker)
+            while time.perf_counter() < stop_at:
+                started = time.perf_counter()
+                db = factory()
+                try:
+                    trends.session_rows(db, rng.choice(user_ids), limit=100)
+                except OperationalError:
+                    with lock:
+                        errors["locked"] += 1
+                    continue
+                finally:
+                    db.close()
+                with lock:
+                    read_latency.append(time.perf_counter() - started)
+
+        threads = [threading.Thread(target=writer, args=(i,)) for i in range(args.writers)]
+        threads += [threading.Thread(target=reader, args=(i,)) for i in range(args.readers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        report = {
+            "config": label,
+            "writes_per_s": round(len(write_latency) / elapsed, 1),
+            "write_ms": _percentiles(write_latency),
+            "reads_per_s": round(len(read_latency) / elapsed, 1),
+            "read_ms": _percentiles(read_latency),
+            "errors": errors
+        }
+        if batcher:
+            report["avg_batch"] = round(batcher.jobs / max(batcher.batches, 1), 1)
+        engine.dispose()
+        return report
+    finally:
+        for suffix in ("", "-wal", "-shm", "-journal"):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+
+def _percentiles(samples) -> dict:
+    if not samples:
+        return {"p50": None, "p95": None, "p99": None}
+    values = np.array(samples) * 1000
+    return {f"p{p}": round(float(np.percentile(values, p)), 2) for p in (50, 95, 99)}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare SQLite journal/sync/batching settings under concurrent session writes.")
+    parser.add_argument("--writers", type=int, default=16, help="Concurrent writer threads")
+    parser.add_argument("--readers", type=int, default=4, help="Concurrent trends readers")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=10, help="Seconds per configuration")
+    parser.add_argument("--busy-timeout-ms", type=int, default=5000)
+    parser.add_argument("--batch-max", type=int, default=database.DB_WRITE_BATCH_MAX)
+    parser.add_argument("--batch-wait-ms", type=float, default=database.DB_WRITE_BATCH_WAIT_MS)
+    parser.add_argument("--output", help="Write the reports as JSON")
+    args = parser.parse_args(argv)
+
+    reports = []
+    for label, journal_mode, synchronous, batching in CONFIGS:
+        report = run_config(label, journal_mode, synchronous, batching, args)
+        reports.append(report)
+        batch = f"  avg batch {report['avg_batch']}" if "avg_batch" in report else ""
+        print(f"{label:<38} writes {report['writes_per_s']:>7}/s  p50 {report['write_ms']['p50']} ms  p99 {report['write_ms']['p99']} ms  "
+              f"| reads {report['reads_per_s']:>7}/s  p99 {report['read_ms']['p99']} ms  | errors {report['errors']}{batch}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"args": vars(args), "reports": reports}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
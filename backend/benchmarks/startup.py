@@ -0,0 +1,79 @@
+"""
+Import-time and RSS benchmark per worker role (see backend/roles.py).
+
+Each measurement runs in a fresh interpreter: it imports backend.main with the given
+VOCALCOACH_ROLE and reports the wall time of the import, the resident set size after it,
+and which heavy modules got loaded. Warm-up is disabled so only import cost is measured.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.startup
+    python -m backend.benchmarks.startup --runs 5 --roles api analysis --json startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ["numpy", "scipy", "librosa", "numba", "parselmouth", "fastdtw", "google.generativeai"]
+
+_PROBE = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import backend.main
+import_seconds = time.perf_counter() - t0
+
+rss_kb = None
+try:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                rss_kb = int(line.split()[1])
+except OSError:
+    import resource
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss # Peak, KB on Linux / bytes on macOS
+
+heavy = [m for m in %(heavy)r if m in sys.modules]
+print(json.dumps({"import_seconds": import_seconds, "rss_mb": rss_kb / 1024, "heavy_modules": heavy}))
+"""
+
+def measure(role: str) -> dict:
+    env = dict(os.environ, VOCALCOACH_ROLE=role, VOCALCOACH_WARMUP="0", PYTHONWARNINGS="ignore")
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE % {"heavy": HEAVY_MODULES}],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def run(roles, runs: int) -> dict:
+    results = {}
+    for role in roles:
+        samples = [measure(role) for _ in range(runs)]
+        results[role] = {
+            "import_seconds_median": round(statistics.median(s["import_seconds"] for s in samples), 3),
+            "rss_mb_median": round(statistics.median(s["rss_mb"] for s in samples), 1),
+            "heavy_modules": samples[-1]["heavy_modules"],
+            "runs": runs
+        }
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure import time and RSS per worker role.")
+    parser.add_argument("--roles", nargs="+", default=["api", "all", "analysis"])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--json", dest="json_path", help="Also write results to this file")
+    args = parser.parse_args(argv)
+
+    results = run(args.roles, args.runs)
+
+    print(f"{'role':<10} {'import (s)':>10} {'RSS (MB)':>10}  heavy modules loaded")
+    for role, r in results.items():
+        print(f"{role:<10} {r['import_seconds_median']:>10.3f} {r['rss_mb_median']:>10.1f}  {', '.join(r['heavy_modules']) or '-'}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Bulk classification of stored metric values: one vectorized thresholds call per metric
+against the per-value if/elif chains it replaced (analyze_health's traffic light).
+
+Checks that both agree on every value, the cut points included, then reports values/s.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.thresholds --values 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from ..intelligence import thresholds
+
+# The chains as they were in analysis/quality.py
+def _jitter(value):
+    return "green" if value <= 1.04 else "yellow" if value <= 1.50 else "red"
+
+def _shimmer(value):
+    return "green" if value <= 3.81 else "yellow" if value <= 5.00 else "red"
+
+def _hnr(value):
+    return "green" if value >= 20.0 else "yellow" if value >= 12.0 else "red"
+
+# metric -> (chain, value range, cut points)
+METRICS = {
+    "jitter_percent": (_jitter, (0.0, 3.0), [1.04, 1.50]),
+    "shimmer_percent": (_shimmer, (0.0, 8.0), [3.81, 5.00]),
+    "hnr_db": (_hnr, (0.0, 35.0), [12.0, 20.0, 24.0, 25.0]),
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Vectorized threshold classification vs. per-value if/elif chains.")
+    parser.add_argument("--values", type=int, default=1_000_000, help="Values per metric")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    ok = True
+    print(f"{'metric':<16} {'values':>9} {'if/elif s':>10} {'vector s':>9} {'speedup':>8}")
+    for metric, (chain, (low, high), cuts) in METRICS.items():
+        values = np.concatenate([rng.uniform(low, high, args.values), cuts])
+
+        started = time.perf_counter()
+        expected = [chain(value) for value in values.tolist()]
+        loop_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        lights = thresholds.traffic_light(metric, values)
+        vector_seconds = time.perf_counter() - started
+
+        mismatches = int(np.count_nonzero(lights != np.array(expected, dtype=object)))
+        print(f"{metric:<16} {len(values):>9} {loop_seconds:>10.3f} {vector_seconds:>9.3f} {loop_seconds / vector_seconds:>7.1f}x"
+              + (f"  FAIL {mismatches} mismatches" if mismatches else ""))
+        ok = ok and not mismatches
+    raise SystemExit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+Several analysis workers on one shared queue, locally.
+
+Starts the API (uvicorn, JOB_QUEUE=db, temp working dir as in load.py) and N worker
+processes (`python -m backend.worker`) once the preview sessions are uploaded, and times
+until every session was refined by a worker (worker start-up included). With --kill, one
+worker is SIGKILLed while it holds a job (runs with two or more workers): the job must
+come back after the lease (JOB_LEASE_SECONDS) and be finished by another worker.
+
+Checks per run: every session reached tier "full", every job is done, XP of each user
+matches its sessions. Reports the refinement throughput and how the jobs were spread.
+
+Usage (from the repository root):
+    python -m backend.benchmarks.workers --workers 1 2 4 --sessions 24
+    python -m backend.benchmarks.workers --workers 3 --kill --lease 10
+"""
+import argparse
+import asyncio
+import os
+import random
+import signal
+import sqlite3
+import subprocess
+import sys
+import time
+
+import httpx
+
+from .load import SESSION_UPLOAD_MIX, Server, build_uploads, pick_upload
+
+async def upload_sessions(url: str, count: int, users: int, uploads) -> list:
+    async with httpx.AsyncClient(base_url=url, timeout=120) as client:
+        user_ids = []
+        for i in range(users):
+            response = await client.post("/users/", json={"nickname": f"worker_check_{i}_{random.randint(0, 10**9)}", "voice_type": "Tenor"})
+            user_ids.append(response.json()["id"])
+
+        async def one(i: int):
+            _, audio = pick_upload(uploads, SESSION_UPLOAD_MIX)
+            response = await client.post("/sessions/", data={"user_id": user_ids[i % users], "exercise_id": random.randint(1, 13)},
+                                         files={"file": (f"take{i}.wav", audio, "audio/wav")})
+            response.raise_for_status()
+            return response.json()["session_id"]
+
+        session_ids = []
+        for start in range(0, count, 4): # A few uploads at a time
+            session_ids += await asyncio.gather(*(one(i) for i in range(start, min(start + 4, count))))
+        return session_ids
+
+def unrefined(url: str, session_ids) -> list:
+    with httpx.Client(base_url=url, timeout=30) as client:
+        return [i for i in session_ids if client.get(f"/sessions/{i}").json()["tier"] != "full"]
+
+def running_job_of(path: str, worker_id: str) -> bool:
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT 1 FROM jobs WHERE status = 'running' AND locked_by = ?", (worker_id,)).fetchone() is not None
+    finally:
+        conn.close()
+
+def check_database(path: str) -> dict:
+    conn = sqlite3.connect(path)
+    try:
+        statuses = dict(conn.execute("SELECT status, count(*) FROM jobs GROUP BY status").fetchall())
+        per_worker = dict(conn.execute("SELECT locked_by, count(*) FROM jobs WHERE status = 'done' GROUP BY locked_by").fetchall())
+        retried = conn.execute("SELECT count(*) FROM jobs WHERE attempts > 1").fetchone()[0]
+        xp_mismatches = conn.execute(
+            "SELECT count(*) FROM users u WHERE u.xp != (SELECT coalesce(sum(json_extract(s.metrics_json, '$.xp_earned')), 0) "
+            "FROM sessions s WHERE s.user_id = u.id)"
+        ).fetchone()[0]
+    finally:
+        conn.close()
+    return {"statuses": statuses, "per_worker": per_worker, "retried": retried, "xp_mismatches": xp_mismatches}
+
+def run(workers: int, args) -> dict:
+    env = {"JOB_QUEUE": "db", "JOB_LEASE_SECONDS": str(args.lease), "JOB_POLL_SECONDS": "0.2"}
+    server = Server(1, 40, args.llm_latency_ms, env)
+    procs = []
+    try:
+        server.start()
+        db_path = os.path.join(server.tmp, "vocal_coach.db")
+        session_ids = asyncio.run(upload_sessions(server.url, args.sessions, args.users, args.uploads))
+
+        started = time.perf_counter()
+        procs = [
+            subprocess.Popen([sys.executable, "-m", "backend.worker", "--id", f"worker{i}"], cwd=server.tmp, env=server.env,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            for i in range(workers)
+        ]
+        killed = False
+        pending = session_ids
+        while pending and time.perf_counter() - started < args.timeout:
+            if args.kill and workers > 1 and not killed and running_job_of(db_path, "worker0"):
+                procs[0].send_signal(signal.SIGKILL) # Mid-job, no chance to release its lease
+                killed = True
+            time.sleep(0.2)
+            pending = unrefined(server.url, session_ids)
+        elapsed = time.perf_counter() - started
+
+        result = check_database(db_path)
+        result.update(workers=workers, sessions=len(session_ids), unrefined=len(pending), elapsed=elapsed, killed=killed)
+        return result
+    finally:
+        for proc in procs:
+            if proc.poll() is None:
+                proc.terminate()
+        for proc in procs:
+            try:
+                proc.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        server.stop()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run several analysis workers against one shared job queue.")
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4], help="Worker process counts to run")
+    parser.add_argument("--sessions", type=int, default=24, help="Preview sessions uploaded per run")
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--llm-latency-ms", type=float, default=200)
+    parser.add_argument("--kill", action="store_true", help="SIGKILL one worker while it runs a job (runs with 2+ workers)")
+    parser.add_argument("--lease", type=float, default=10, help="JOB_LEASE_SECONDS of the run")
+    parser.add_argument("--timeout", type=float, default=600, help="Give up waiting for the refinements after this")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    args.uploads = build_uploads(SESSION_UPLOAD_MIX)
+    ok = True
+    print(f"{'workers':>7} {'sessions':>8} {'seconds':>8} {'refined/s':>9} {'retried':>7}  jobs per worker")
+    for workers in args.workers:
+        r = run(workers, args)
+        spread = ", ".join(f"{w}: {n}" for w, n in sorted(r["per_worker"].items()))
+        print(f"{workers:>7} {r['sessions']:>8} {r['elapsed']:>8.1f} {r['sessions'] / r['elapsed']:>9.2f} {r['retried']:>7}  {spread}"
+              + ("  (worker0 killed)" if r["killed"] else ""))
+        problems = []
+        if r["unrefined"]:
+            problems.append(f"{r['unrefined']} sessions not refined")
+        if set(r["statuses"]) - {"done"}:
+            problems.append(f"jobs not done: {r['statuses']}")
+        if r["xp_mismatches"]:
+            problems.append(f"{r['xp_mismatches']} users with XP != sum of their sessions")
+        for problem in problems:
+            print(f"        FAIL {problem}")
+        ok = ok and not problems
+    raise SystemExit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+In-process exercise catalog.
+
+Exercises only change when they are (re)seeded, so each API process keeps an immutable
+snapshot: every exercise entry of the /exercises/ listing (plus the default page) and every
+pattern note sequence (one per root note a voice type can map to) are serialized to JSON once,
+with a strong ETag per payload. Other listing pages are joined from the serialized entries
+per request and not stored, so nothing writes to a snapshot after it is built (pre-forked
+workers keep sharing its pages, see serve.py).
+Requests are answered from memory, and clients sending a matching If-None-Match get a 304.
+
+Invalidation: every exercise change bumps the single catalog_version row (bump_version,
+called by seed.py and by any code that edits exercises). API processes check that row every
+CATALOG_REFRESH_SECONDS (poller in main.py's lifespan) and swap in a fresh snapshot when it
+moved, so all workers and nodes converge within that interval.
+"""
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from typing import NamedTuple
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from . import database, models, schemas
+from .audio.synth import generate_scale_audio
+from .intelligence.knowledge import KNOWLEDGE_BASE
+
+REFRESH_SECONDS = float(os.getenv("CATALOG_REFRESH_SECONDS", "5"))
+DEFAULT_ROOT = "C4"
+DEFAULT_PAGE = (0, 100) # GET /exercises/ without skip / limit
+
+class Payload(NamedTuple):
+    body: bytes
+    etag: str
+
+def to_json(data) -> bytes:
+    # Same separators as FastAPI's JSONResponse, so the bytes match what the endpoint used to send
+    return json.dumps(jsonable_encoder(data), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+def body_payload(body: bytes) -> Payload:
+    return Payload(body, f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+
+def to_payload(data) -> Payload:
+    return body_payload(to_json(data))
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match uses the weak comparison: W/"x" matches "x"; "*" matches anything."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+def root_for_voice_type(voice_type: str) -> str:
+    fache = KNOWLEDGE_BASE["voice_classification"]["fache"]
+    return fache.get(voice_type, {}).get("default_root", DEFAULT_ROOT) if voice_type else DEFAULT_ROOT
+
+def all_roots() -> list:
+    fache = KNOWLEDGE_BASE["voice_classification"]["fache"]
+    return sorted({DEFAULT_ROOT} | {f.get("default_root", DEFAULT_ROOT) for f in fache.values()})
+
+def exercise_entry(exercise: models.Exercise) -> dict:
+    """Exercise in the schemas.Exercise shape, with the audio URL the frontend plays."""
+    entry = schemas.Exercise.model_validate(exercise).model_dump()
+    # Pattern exercises are rendered per voice type on demand, the others are static files
+    if exercise.pattern:
+        entry["instructions_audio_url"] = f"http://localhost:8000/exercises/{exercise.id}/audio"
+    elif not exercise.instructions_audio_url:
+        filename = f"{exercise.id}_{exercise.name.replace(' ', '_').lower()}.mp3"
+        entry["instructions_audio_url"] = f"http://localhost:8000/static/exercises/{filename}"
+    return entry
+
+def pattern_sequence(pattern: dict, root_note: str) -> dict:
+    return generate_scale_audio(
+        root_note=root_note,
+        pattern=pattern.get("intervals", []),
+        duration_per_note=pattern.get("duration", 0.8),
+        output_path=None,
+        with_drone=False,
+        generate_audio=False
+    )
+
+class Catalog:
+    """Snapshot of all exercises at one catalog version. Not modified after construction."""
+
+    def __init__(self, version: int, exercises: list, patterns: dict):
+        self.version = version
+        self.exercises = tuple(exercises)
+        self.by_id = {e["id"]: e for e in self.exercises}
+        self._patterns = patterns # (exercise_id, root) -> Payload
+        self._empty_pattern = to_payload({"sequence": []})
+        self._entries = tuple(to_json(e) for e in self.exercises) # A listing page is "[" + joined entries + "]"
+        self._default_listing = self._page(*DEFAULT_PAGE)
+
+    def _page(self, skip: int, limit: int) -> Payload:
+        return body_payload(b"[" + b",".join(self._entries[skip:skip + limit]) + b"]")
+
+    def listing(self, skip: int = 0, limit: int = 100) -> Payload:
+        key = (max(skip, 0), max(limit, 0))
+        return self._default_listing if key == DEFAULT_PAGE else self._page(*key)
+
+    def pattern(self, exercise_id: int, root_note: str) -> Payload:
+        """Note sequence for the Piano Roll; exercises without a pattern have an empty one."""
+        return self._patterns.get((exercise_id, root_note), self._empty_pattern)
+
+def build(db: Session) -> Catalog:
+    version = current_version(db)
+    exercises = db.query(models.Exercise).order_by(models.Exercise.id).all()
+    roots = all_roots()
+    patterns = {}
+    for exercise in exercises:
+        if exercise.pattern:
+            for root in roots:
+                patterns[(exercise.id, root)] = to_payload(pattern_sequence(exercise.pattern, root))
+    return Catalog(version, [exercise_entry(e) for e in exercises], patterns)
+
+def current_version(db: Session) -> int:
+    row = db.get(models.CatalogVersion, 1)
+    return row.version if row else 0
+
+def bump_version(db: Session):
+    """Marks the exercises as changed (commits). Call after every exercise write."""
+    bumped = db.execute(
+        update(models.CatalogVersion)
+        .where(models.CatalogVersion.id == 1)
+        .values(version=models.CatalogVersion.version + 1, updated_at=datetime.utcnow())
+    ).rowcount
+    if not bumped:
+        db.add(models.CatalogVersion(id=1, version=1, updated_at=datetime.utcnow()))
+    db.commit()
+    invalidate()
+
+# --- Process-wide snapshot ---
+
+_catalog = None
+_lock = threading.Lock()
+
+def get() -> Catalog:
+    """The current snapshot (built on first use if the lifespan did not load it)."""
+    catalog = _catalog
+    if catalog is None:
+        with _lock:
+            if _catalog is None:
+                reload()
+            catalog = _catalog
+    return catalog
+
+def reload():
+    global _catalog
+    db = database.SessionLocal()
+    try:
+        _catalog = build(db)
+    finally:
+        db.close()
+
+def invalidate():
+    global _catalog
+    _catalog = None
+
+def refresh_if_changed() -> bool:
+    """Rebuilds the snapshot when catalog_version moved. Returns True if it did."""
+    catalog = _catalog
+    db = database.SessionLocal()
+    try:
+        if catalog is not None and current_version(db) == catalog.version:
+            return False
+    finally:
+        db.close()
+    with _lock:
+        reload()
+    return True
@@ -1,12 +1,107 @@
-from sqlalchemy import create_engine
+"""
+Database engine, sessions and the write path.
+
+DATABASE_URL selects the backend (default: the local SQLite file). For several API nodes
+sharing one database use PostgreSQL, e.g. postgresql://user:pass@db:5432/vocalcoach
+(driver: psycopg2). The schema is created and upgraded by migrations.upgrade().
+
+Two session flavours share the URL and the settings below:
+- SessionLocal / get_db: synchronous, used by writes, background jobs and scripts (seed.py ...)
+- AsyncSessionLocal() / get_async_db: async (aiosqlite / asyncpg) for read-heavy endpoints,
+  which then run on the event loop instead of occupying a threadpool slot. The async engine
+  is created on first use, so scripts never import the async drivers.
+
+SQLite tuning (env, applied to every new connection):
+    SQLITE_JOURNAL_MODE      wal (default) lets readers run while a write is in progress
+    SQLITE_SYNCHRONOUS       normal (default): with WAL only the checkpoint fsyncs; a power
+                             loss may drop the last commits but never corrupts the file
+    SQLITE_BUSY_TIMEOUT_MS   how long a writer waits for the lock before "database is locked"
+
+Connection pool (both backends, per process):
+    DB_POOL_SIZE / DB_MAX_OVERFLOW / DB_POOL_TIMEOUT
+
+Write batching (group commit), off by default:
+    DB_WRITE_BATCHING=1      run_write() jobs from all threads are coalesced into shared
+                             transactions: one lock acquisition and one commit for up to
+                             DB_WRITE_BATCH_MAX jobs collected within DB_WRITE_BATCH_WAIT_MS
+"""
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./vocal_coach.db"
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./vocal_coach.db")
+# Heroku-style URLs use the scheme SQLAlchemy dropped in 1.4
+if SQLALCHEMY_DATABASE_URL.startswith("postgres://"):
+    SQLALCHEMY_DATABASE_URL = "postgresql://" + SQLALCHEMY_DATABASE_URL[len("postgres://"):]
+
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "wal")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "normal")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "30000"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_WRITE_BATCHING = os.getenv("DB_WRITE_BATCHING", "0") == "1"
+DB_WRITE_BATCH_MAX = int(os.getenv("DB_WRITE_BATCH_MAX", "32"))
+DB_WRITE_BATCH_WAIT_MS = float(os.getenv("DB_WRITE_BATCH_WAIT_MS", "2"))
+
+# sync driver -> async driver for the same database
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+# URLs without a driver: the one in requirements.txt (SQLAlchemy 2.1 defaults to psycopg 3)
+SYNC_DRIVERS = {"postgresql": "postgresql+psycopg2"}
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+def make_engine(url: str = SQLALCHEMY_DATABASE_URL, journal_mode: str = SQLITE_JOURNAL_MODE,
+                synchronous: str = SQLITE_SYNCHRONOUS, busy_timeout_ms: int = SQLITE_BUSY_TIMEOUT_MS,
+                pool_size: int = DB_POOL_SIZE, max_overflow: int = DB_MAX_OVERFLOW, pool_timeout: float = DB_POOL_TIMEOUT):
+    """Creates an engine; for SQLite files the PRAGMAs above are set on every connection."""
+    scheme, _, rest = url.partition("://")
+    url = f"{SYNC_DRIVERS.get(scheme, scheme)}://{rest}"
+    if not url.startswith("sqlite"):
+        # pre_ping: connections dropped by the server (restart, idle timeout) are replaced transparently
+        return create_engine(url, pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout, pool_pre_ping=True)
+
+    engine = create_engine(
+        url,
+        # pysqlite's timeout is SQLite's busy handler: wait for the write lock instead of failing
+        connect_args={"check_same_thread": False, "timeout": busy_timeout_ms / 1000},
+        pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout
+    )
+    _set_sqlite_pragmas(engine, journal_mode, synchronous)
+    return engine
+
+def make_async_engine(url: str = SQLALCHEMY_DATABASE_URL, journal_mode: str = SQLITE_JOURNAL_MODE,
+                      synchronous: str = SQLITE_SYNCHRONOUS, busy_timeout_ms: int = SQLITE_BUSY_TIMEOUT_MS,
+                      pool_size: int = DB_POOL_SIZE, max_overflow: int = DB_MAX_OVERFLOW, pool_timeout: float = DB_POOL_TIMEOUT):
+    """Async counterpart of make_engine (same database, same tuning)."""
+    scheme, _, rest = url.partition("://")
+    async_url = f"{ASYNC_DRIVERS.get(scheme.split('+')[0], scheme)}://{rest}"
+    if not url.startswith("sqlite"):
+        return create_async_engine(async_url, pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout, pool_pre_ping=True)
+
+    engine = create_async_engine(
+        async_url,
+        connect_args={"timeout": busy_timeout_ms / 1000},
+        pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout
+    )
+    _set_sqlite_pragmas(engine.sync_engine, journal_mode, synchronous)
+    return engine
+
+def _set_sqlite_pragmas(engine, journal_mode: str, synchronous: str):
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if journal_mode:
+            cursor.execute(f"PRAGMA journal_mode = {journal_mode}")
+        if synchronous:
+            cursor.execute(f"PRAGMA synchronous = {synchronous}")
+        cursor.close()
+
+engine = make_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -17,3 +112,99 @@ def get_db():
         yield db
     finally:
         db.close()
+
+_async_session_factory = None
+
+def AsyncSessionLocal():
+    """New AsyncSession (the async engine is created on the first call)."""
+    global _async_session_factory
+    if _async_session_factory is None:
+        # expire_on_commit=False: attributes stay readable after commit without an implicit (sync) reload
+        _async_session_factory = async_sessionmaker(make_async_engine(), expire_on_commit=False, autoflush=False)
+    return _async_session_factory()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# --- Write path ---
+
+def write(fn, session_factory=None):
+    """Runs fn(db) in its own transaction and commits. Returns fn's result."""
+    db = (session_factory or SessionLocal)()
+    try:
+        result = fn(db)
+        db.commit()
+        return result
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+class WriteBatcher:
+    """
+    Group commit: a single writer thread runs queued jobs back to back in one transaction.
+    Jobs must flush their own changes (later jobs in the batch query the same session) and
+    return plain values, not ORM objects. If any job in a batch fails, the batch is rolled
+    back and every job is retried in its own transaction, so one bad job only fails itself.
+    """
+
+    def __init__(self, session_factory, max_batch: int = DB_WRITE_BATCH_MAX, max_wait_ms: float = DB_WRITE_BATCH_WAIT_MS):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.jobs = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="db-write-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, fn):
+        """Queues fn(db) and blocks until its batch is committed. Returns fn's result."""
+        future = Future()
+        self._queue.put((fn, future))
+        return future.result()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        try:
+            # Whatever is already waiting joins immediately; then linger briefly for more
+            while len(batch) < self.max_batch:
+                batch.append(self._queue.get(timeout=self.max_wait) if self.max_wait > 0 else self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            db = self.session_factory()
+            try:
+                results = [fn(db) for fn, _ in batch]
+                db.commit()
+            except Exception:
+                db.rollback()
+                results = None
+            finally:
+                db.close()
+
+            if results is None:
+                for fn, future in batch:
+                    try:
+                        future.set_result(write(fn, self.session_factory))
+                    except Exception as e:
+                        future.set_exception(e)
+            else:
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            self.batches += 1
+            self.jobs += len(batch)
+
+write_batcher = WriteBatcher(SessionLocal) if DB_WRITE_BATCHING else None
+
+def run_write(fn):
+    """Entry point for request-path writes: batched when DB_WRITE_BATCHING=1, else one transaction."""
+    if write_batcher is not None:
+        return write_batcher.submit(fn)
+    return write(fn)
@@ -0,0 +1,149 @@
+"""
+In-process stand-in for a Redis server, enabled with JOB_QUEUE=redis REDIS_URL=fake://.
+
+Lets the Redis job queue (jobs.RedisQueue) run without a server, e.g. an API process with
+worker threads in local development. State lives in this process only, so separate worker
+processes need a real Redis-compatible server. Mimics the redis-py client methods that
+jobs.py uses (with decode_responses=True: values come back as str).
+"""
+import threading
+
+class FakeRedis:
+    _shared = None
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def shared(cls):
+        if cls._shared is None:
+            cls._shared = cls()
+        return cls._shared
+
+    def _get(self, key, factory):
+        value = self._data.get(key)
+        if value is None:
+            value = self._data[key] = factory()
+        return value
+
+    # --- Strings / keys ---
+
+    def incr(self, key) -> int:
+        with self._lock:
+            self._data[key] = int(self._data.get(key, 0)) + 1
+            return self._data[key]
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            return str(value) if isinstance(value, (str, int)) else None
+
+    def set(self, key, value, ex=None) -> bool:
+        with self._lock:
+            self._data[key] = str(value) # ex: kept until the process ends, like expire()
+            return True
+
+    def exists(self, *keys) -> int:
+        with self._lock:
+            return sum(key in self._data for key in keys)
+
+    def expire(self, key, seconds) -> bool:
+        return key in self._data # Kept until the process ends
+
+    def delete(self, *keys) -> int:
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
+
+    # --- Hashes ---
+
+    def hset(self, key, field=None, value=None, mapping=None) -> int:
+        with self._lock:
+            fields = self._get(key, dict)
+            items = dict(mapping or {})
+            if field is not None:
+                items[field] = value
+            added = len(set(items) - set(fields))
+            fields.update({k: str(v) for k, v in items.items()})
+            return added
+
+    def hget(self, key, field):
+        with self._lock:
+            return self._data.get(key, {}).get(field)
+
+    def hgetall(self, key) -> dict:
+        with self._lock:
+            return dict(self._data.get(key, {}))
+
+    def hincrby(self, key, field, amount: int = 1) -> int:
+        with self._lock:
+            fields = self._get(key, dict)
+            fields[field] = str(int(fields.get(field, 0)) + amount)
+            return int(fields[field])
+
+    # --- Lists ---
+
+    def lpush(self, key, *values) -> int:
+        with self._lock:
+            items = self._get(key, list)
+            for value in values:
+                items.insert(0, str(value))
+            return len(items)
+
+    def rpoplpush(self, source, destination):
+        with self._lock:
+            items = self._data.get(source)
+            if not items:
+                return None
+            value = items.pop()
+            self._get(destination, list).insert(0, value)
+            return value
+
+    def lrem(self, key, count: int, value) -> int:
+        # count 0 = remove all occurrences (the only form jobs.py uses)
+        with self._lock:
+            items = self._data.get(key, [])
+            kept = [item for item in items if item != str(value)]
+            removed = len(items) - len(kept)
+            if key in self._data:
+                self._data[key] = kept
+            return removed
+
+    def llen(self, key) -> int:
+        with self._lock:
+            return len(self._data.get(key, []))
+
+    def lrange(self, key, start: int, end: int) -> list:
+        with self._lock:
+            items = self._data.get(key, [])
+            return list(items[start:] if end == -1 else items[start:end + 1])
+
+    # --- Sorted sets ---
+
+    def zadd(self, key, mapping: dict, nx: bool = False) -> int:
+        with self._lock:
+            scores = self._get(key, dict)
+            added = 0
+            for member, score in mapping.items():
+                member = str(member)
+                if member not in scores:
+                    added += 1
+                elif nx:
+                    continue
+                scores[member] = float(score)
+            return added
+
+    def zrem(self, key, *members) -> int:
+        with self._lock:
+            scores = self._data.get(key, {})
+            return sum(scores.pop(str(member), None) is not None for member in members)
+
+    def zrangebyscore(self, key, low, high) -> list:
+        low, high = float(low), float(high) # Accepts "-inf" / "+inf" like Redis
+        with self._lock:
+            scores = self._data.get(key, {})
+            return [member for member, score in sorted(scores.items(), key=lambda item: item[1]) if low <= score <= high]
+
+    def zcard(self, key) -> int:
+        with self._lock:
+            return len(self._data.get(key, {}))
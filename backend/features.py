@@ -0,0 +1,114 @@
+"""
+Compact per-session pitch contours.
+
+The analysis already computes a frame-wise f0 track; instead of throwing it away, each
+session keeps it (storage.contour_path: <session id>.contour.npz) so the piano roll replay, take
+comparisons and re-scoring don't have to decode the audio and run pYIN again.
+
+Stored arrays (np.savez_compressed):
+    f0_hz      float16   f0 per frame, 0 where unvoiced (relative precision ~0.05 % = 1 cent)
+    voiced     uint8     voicing mask, bit-packed (np.packbits)
+    rms        uint8     frame loudness in dBFS, 0.5 dB steps from RMS_FLOOR_DB (0 = silence)
+    meta       int32     [FORMAT_VERSION, sample rate, hop length, frames]
+    source     str       "pyin" (full tier) or "yin" (preview)
+
+A 20 s take at 44.1 kHz / hop 512 (1.7k frames) is a few kB, against ~1.7 MB of WAV.
+"""
+import io
+import os
+import warnings
+
+import numpy as np
+
+FORMAT_VERSION = 1
+RMS_FLOOR_DB = -80.0
+RMS_STEP_DB = 0.5
+SUFFIX = ".contour.npz"
+
+def contour_path_for(audio_path: str) -> str:
+    """Where contours were stored before they were keyed by session (next to the upload)."""
+    return os.path.splitext(audio_path)[0] + SUFFIX
+
+def make_contour(f0_hz: np.ndarray, voiced: np.ndarray, rms: np.ndarray, sr: int, hop_length: int, source: str) -> dict:
+    """In-memory contour as produced by the analyzers (rms as linear amplitude)."""
+    n = min(len(f0_hz), len(voiced), len(rms))
+    voiced = np.asarray(voiced[:n], dtype=bool)
+    f0 = np.where(voiced, np.nan_to_num(np.asarray(f0_hz[:n], dtype=float)), 0.0)
+    with np.errstate(divide="ignore"):
+        rms_db = 20 * np.log10(np.maximum(np.asarray(rms[:n], dtype=float), 1e-12))
+    return {"f0_hz": f0, "voiced": voiced, "rms_db": rms_db, "sr": int(sr), "hop_length": int(hop_length), "source": source}
+
+def encode(contour: dict) -> bytes:
+    """The compact file's content."""
+    n = len(contour["f0_hz"])
+    rms_db = np.clip(contour["rms_db"], RMS_FLOOR_DB, 0.0)
+    buffer = io.BytesIO()
+    np.savez_compressed(
+        buffer,
+        f0_hz=np.asarray(contour["f0_hz"], dtype=np.float16),
+        voiced=np.packbits(np.asarray(contour["voiced"], dtype=bool)),
+        rms=np.round((rms_db - RMS_FLOOR_DB) / RMS_STEP_DB).astype(np.uint8),
+        meta=np.array([FORMAT_VERSION, contour["sr"], contour["hop_length"], n], dtype=np.int32),
+        source=np.array(contour["source"])
+    )
+    return buffer.getvalue()
+
+def write(path: str, data: bytes):
+    """Writes an encoded contour (atomically: the refinement job may overwrite the preview's file)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def save(path: str, contour: dict):
+    write(path, encode(contour))
+
+def load(path: str) -> dict:
+    """Reads a stored contour. f0_hz is NaN where unvoiced."""
+    with np.load(path) as data:
+        version, sr, hop_length, n = (int(v) for v in data["meta"])
+        voiced = np.unpackbits(data["voiced"], count=n).astype(bool)
+        f0 = data["f0_hz"].astype(np.float32)
+        rms_db = data["rms"].astype(np.float32) * RMS_STEP_DB + RMS_FLOOR_DB
+        source = str(data["source"])
+    f0[~voiced] = np.nan
+    return {
+        "f0_hz": f0, "voiced": voiced, "rms_db": rms_db, "sr": sr, "hop_length": hop_length,
+        "frame_seconds": hop_length / sr, "source": source
+    }
+
+def downsample(contour: dict, max_points: int) -> dict:
+    """
+    Merges consecutive frames so at most max_points remain: f0 = median of the voiced frames
+    (keeps note steps sharp), voiced = majority, rms = loudest frame.
+    """
+    n = len(contour["f0_hz"])
+    factor = -(-n // max_points) # ceil
+    if factor <= 1:
+        return contour
+    pad = (-n) % factor
+    f0 = np.pad(contour["f0_hz"], (0, pad), constant_values=np.nan).reshape(-1, factor)
+    voiced = np.pad(contour["voiced"], (0, pad)).reshape(-1, factor)
+    rms_db = np.pad(contour["rms_db"], (0, pad), constant_values=RMS_FLOOR_DB).reshape(-1, factor)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning) # All-NaN bins (silence) stay NaN
+        f0_bins = np.nanmedian(f0, axis=1)
+    return dict(
+        contour,
+        f0_hz=f0_bins,
+        voiced=voiced.mean(axis=1) >= 0.5,
+        rms_db=rms_db.max(axis=1),
+        frame_seconds=contour["frame_seconds"] * factor
+    )
+
+def to_json(contour: dict) -> dict:
+    """Columnar JSON: point i starts at i * frame_seconds; f0_hz is null where unvoiced."""
+    return {
+        "source": contour["source"],
+        "frame_seconds": round(contour["frame_seconds"], 6),
+        "points": len(contour["f0_hz"]),
+        "f0_hz": [None if np.isnan(v) else v for v in np.round(contour["f0_hz"].astype(float), 2).tolist()],
+        "voiced": contour["voiced"].astype(int).tolist(),
+        "rms_db": np.round(contour["rms_db"].astype(float), 1).tolist()
+    }
@@ -3,6 +3,10 @@ import math
 from sqlalchemy.orm import Session
 from . import models
 
+BASE_XP = 50
+STREAK_BONUS_PER_DAY = 5
+STREAK_BONUS_MAX = 50
+
 def calculate_xp(session_score: int, difficulty: int, current_streak: int) -> int:
     """
     Calculates XP for a completed exercise session.
@@ -10,11 +14,11 @@ def calculate_xp(session_score: int, difficulty: int, current_streak: int) -> in
     if session_score is None:
         return 0
         
-    base_xp = 50
+    base_xp = BASE_XP
     score_multiplier = session_score / 100.0
     
     # Cap streak bonus at 50
-    streak_bonus = min(current_streak * 5, 50)
+    streak_bonus = min(current_streak * STREAK_BONUS_PER_DAY, STREAK_BONUS_MAX)
     
     # Formula from tech_plan
     total_xp = (base_xp * score_multiplier * difficulty) + streak_bonus
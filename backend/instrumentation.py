@@ -0,0 +1,190 @@
+"""
+Lightweight timing instrumentation.
+
+    from .instrumentation import span
+    with span("pitch.pyin"):
+        f0, voiced_flag, _ = librosa.pyin(...)
+
+Spans feed per-stage histograms that GET /metrics exposes in Prometheus text format.
+Requests sent with "X-Debug-Timings: 1" additionally get their per-stage breakdown back
+in a Server-Timing response header.
+
+VOCALCOACH_METRICS=0 turns collection off: span() then returns a shared no-op context
+manager (one ContextVar lookup per span), unless the request asked for debug timings.
+Metrics are per process; with several workers, scrape each one (or aggregate upstream).
+"""
+import bisect
+import contextlib
+import contextvars
+import os
+import threading
+import time
+
+ENABLED = os.getenv("VOCALCOACH_METRICS", "1") != "0"
+DEBUG_HEADER = "X-Debug-Timings"
+
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+AUDIO_BUCKETS = (1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+FACTOR_BUCKETS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0)
+
+REGISTRY = []
+
+class Histogram:
+    """Prometheus-style cumulative histogram with a fixed label set."""
+
+    def __init__(self, name: str, help_text: str, buckets, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.label_names = tuple(label_names)
+        self._series = {} # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.label_names)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def mean(self, **labels):
+        """(count, mean) of one label set's observations."""
+        key = tuple(str(labels.get(n, "")) for n in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            count = sum(series[:-1]) if series else 0
+            return count, (series[-1] / count if count else 0.0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        for key, series in items:
+            labels = [f'{n}="{_escape(v)}"' for n, v in zip(self.label_names, key)]
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_labels = ",".join(labels + [f'le="{le}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+            suffix = f"{{{','.join(labels)}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {series[-1]}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+class Gauge:
+    """Prometheus-style gauge (current value) with a fixed label set."""
+
+    def __init__(self, name: str, help_text: str, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {} # label values -> value
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            labels = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(self.label_names, key))
+            lines.append(f"{self.name}{{{labels}}} {value}" if labels else f"{self.name} {value}")
+        return lines
+
+STAGE_SECONDS = Histogram("vocalcoach_stage_seconds", "Time spent per pipeline stage.", STAGE_BUCKETS, ("stage",))
+REQUEST_SECONDS = Histogram("vocalcoach_request_seconds", "HTTP request latency by route.", STAGE_BUCKETS, ("method", "route", "status"))
+AUDIO_SECONDS = Histogram("vocalcoach_audio_duration_seconds", "Duration of analyzed audio.", AUDIO_BUCKETS, ("endpoint",))
+PROCESSING_SECONDS = Histogram("vocalcoach_processing_seconds", "Analysis wall time per upload.", STAGE_BUCKETS, ("endpoint",))
+REALTIME_FACTOR = Histogram("vocalcoach_realtime_factor", "Processing seconds per second of audio.", FACTOR_BUCKETS, ("endpoint",))
+ADMISSION_COST = Histogram("vocalcoach_admission_cost_seconds", "Estimated worker seconds per admitted upload.", STAGE_BUCKETS, ("job",))
+SCHEDULER_WAIT = Histogram("vocalcoach_scheduler_wait_seconds", "Queue wait for an analysis worker.", STAGE_BUCKETS, ("priority",))
+SCHEDULER_QUEUED = Gauge("vocalcoach_scheduler_queue_depth", "Analysis jobs waiting for a worker.", ("priority",))
+SCHEDULER_RUNNING = Gauge("vocalcoach_scheduler_running", "Analysis jobs holding a worker.", ("priority",))
+
+# Per-request list of (stage, seconds) while a debug trace is active
+_trace = contextvars.ContextVar("vocalcoach_trace", default=None)
+_NOOP = contextlib.nullcontext()
+
+class _Span:
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        if ENABLED:
+            STAGE_SECONDS.observe(elapsed, stage=self.stage)
+        trace = _trace.get()
+        if trace is not None:
+            trace.append((self.stage, elapsed))
+        return False
+
+def span(stage: str):
+    """Times the enclosed block as pipeline stage `stage` (dotted, e.g. "health.praat")."""
+    if not ENABLED and _trace.get() is None:
+        return _NOOP
+    return _Span(stage)
+
+def start_trace():
+    """Starts collecting spans for the current request context. Returns the span list."""
+    trace = []
+    _trace.set(trace)
+    return trace
+
+def server_timing(trace, total_seconds: float) -> str:
+    """Formats a trace as a Server-Timing header value (durations in ms)."""
+    entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in trace]
+    entries.append(f"total;dur={total_seconds * 1000:.1f}")
+    return ", ".join(entries)
+
+@contextlib.contextmanager
+def track_processing(endpoint: str, audio_path: str):
+    """Records audio duration vs. processing time for one analyzed upload."""
+    if not ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        PROCESSING_SECONDS.observe(elapsed, endpoint=endpoint)
+        duration = audio_duration(audio_path)
+        if duration:
+            AUDIO_SECONDS.observe(duration, endpoint=endpoint)
+            REALTIME_FACTOR.observe(elapsed / duration, endpoint=endpoint)
+
+def audio_duration(audio_path):
+    """Duration from the file header (no decoding). None if the format isn't readable. Path or file object."""
+    try:
+        import soundfile
+        return soundfile.info(audio_path).duration
+    except Exception:
+        return None
+
+def render_prometheus() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
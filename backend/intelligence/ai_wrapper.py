@@ -1,44 +1,63 @@
 import os
 import google.generativeai as genai
 from dotenv import load_dotenv
-import json
-from .knowledge import get_feedback_context
+from . import retrieval, thresholds
+from ..instrumentation import span
 
 load_dotenv()
 
 API_KEY = os.getenv("GEMINI_API_KEY")
 MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-1.5-flash")
+LLM_BACKEND = os.getenv("GEMINI_BACKEND", "google") # "fake" -> in-process stand-in (load tests)
 
 if API_KEY:
     genai.configure(api_key=API_KEY)
 
-def generate_performance_review(metrics: dict, user_context: dict):
+def _llm_available():
+    return bool(API_KEY) or LLM_BACKEND == "fake"
+
+def _model():
+    if LLM_BACKEND == "fake":
+        from .fake_llm import FakeGenerativeModel
+        return FakeGenerativeModel(MODEL_NAME)
+    return genai.GenerativeModel(MODEL_NAME)
+
+def compact_prompt(text: str) -> str:
+    """Strips the source-code indentation and repeated blank lines (tokens the model doesn't need)."""
+    lines = [line.strip() for line in text.strip().splitlines()]
+    return "\n".join(line for i, line in enumerate(lines) if line or (i and lines[i - 1]))
+
+def format_metrics(metrics: dict) -> str:
     """
-    Generates a detailed performance review using the configured Gemini model.
+    Compact "key: value" lines for the prompt (floats rounded, unlike a JSON dump), with the
+    knowledge base range of each health metric: "- jitter_percent: 1.2 (warning)".
     """
-    if not API_KEY:
-        return "AI Feedback unavailable: No API Key configured."
-        
-    try:
-        model = genai.GenerativeModel(MODEL_NAME)
-        
-        # Build Scientific Context
-        health_context = []
-        if "health_status" in metrics:
-            health_context.append(f"Vocal Health Status: {metrics['health_status']}")
-        if "jitter_percent" in metrics:
-             health_context.append(f"Jitter: {metrics['jitter_percent']}% (Zittrigkeit/Rauigkeit)")
-        if "pitch_stability_std" in metrics:
-            health_context.append(f"Pitch Stability (StdDev): {metrics['pitch_stability_std']} (Niedriger ist stabiler)")
-            
-        context_str = "\n".join(health_context)
-
-        prompt = f"""
+    lines = []
+    for key, value in metrics.items():
+        line = f"- {key}: {round(value, 2) if isinstance(value, float) else value}"
+        if key in thresholds.ALIASES and isinstance(value, (int, float)):
+            line += f" ({thresholds.classify(key, value)})"
+        lines.append(line)
+    return "\n".join(lines)
+
+def performance_prompt(metrics: dict, user_context: dict) -> str:
+    # Build Scientific Context (health status and jitter with its range are in the metrics list)
+    health_context = []
+    if "pitch_stability_std" in metrics:
+        health_context.append(f"Pitch Stability (StdDev): {metrics['pitch_stability_std']} (Niedriger ist stabiler)")
+    # Relevant knowledge base entries (voice type, problem metrics) within the token budget
+    knowledge = retrieval.context_for("Performance", metrics, user_context)
+    if knowledge:
+        health_context.append(knowledge)
+
+    context_str = "\n".join(health_context)
+
+    return f"""
         Du bist 'VocalCoach AI', ein erfahrener, analytischer aber sehr empathischer Gesangslehrer.
         Dein Schüler (Level {user_context.get('level', 1)}, {user_context.get('voice_type', 'Unbekannt')}) hat eine Performance (Song/Arie) aufgenommen.
         
         Technische Analyse der Aufnahme:
-        {json.dumps(metrics, indent=2)}
+        {format_metrics(metrics)}
         
         Kontext & Interpretation:
         {context_str}
@@ -54,62 +73,52 @@ def generate_performance_review(metrics: dict, user_context: dict):
         - Nutze Metaphern (z.B. "Stell dir vor...", "Wie ein...").
         - Sei motivierend!
         """
-        
-        response = model.generate_content(prompt)
-        return response.text.strip()
-        
-    except Exception as e:
-        print(f"Gemini Error ({MODEL_NAME}): {e}")
-        return f"Ups! Mein AI-Gehirn ({MODEL_NAME}) hat gerade Schluckauf. Aber technisch sah das interessant aus!"
 
-def generate_feedback(exercise_name: str, metrics: dict, user_context: dict):
+def generate_performance_review(metrics: dict, user_context: dict):
     """
-    Generates personalized feedback for exercises.
-    
-    Args:
-        exercise_name: Name of the exercise (e.g., "Lip Trills")
-        metrics: Dictionary of metrics (e.g., {"jitter_percent": 1.2, "shimmer_percent": 2.5, "score": 80})
-        user_context: Dictionary of user context (e.g., {"level": 2, "voice_type": "Bariton", "streak": 5})
-        
-    Returns:
-        str: AI generated feedback text.
+    Generates a detailed performance review using the configured Gemini model.
     """
-    if not API_KEY:
-        return "AI Feedback unavailable: No API Key configured in backend/.env."
+    if not _llm_available():
+        return "AI Feedback unavailable: No API Key configured."
         
     try:
-        model = genai.GenerativeModel(MODEL_NAME)
-        
-        # Build Context from Knowledge Base
-        scientific_context = []
-        if "jitter_percent" in metrics:
-            scientific_context.append(get_feedback_context("jitter_local", metrics["jitter_percent"]))
-        if "hnr_db" in metrics:
-            scientific_context.append(get_feedback_context("hnr", metrics["hnr_db"]))
-            
-        context_str = "\n".join(scientific_context)
+        model = _model()
+        prompt = compact_prompt(performance_prompt(metrics, user_context))
         
-        # Build History Context
-        history_str = ""
-        if "history_avg_score" in user_context:
-            trend = "stabil"
-            if metrics.get("score", 0) > user_context['history_avg_score']:
-                trend = "verbessert 📈"
-            elif metrics.get("score", 0) < user_context['history_avg_score']:
-                trend = "leicht verschlechtert"
-                
-            history_str = f"""
-            Verlauf (Letzte {user_context['history_count']} Sessions):
-            - Durchschnitt Score: {user_context['history_avg_score']}
-            - Trend heute: {trend}
-            """
+        with span("ai.gemini"):
+            response = model.generate_content(prompt)
+        return response.text.strip()
         
-        prompt = f"""
+    except Exception as e:
+        print(f"Gemini Error ({MODEL_NAME}): {e}")
+        return f"Ups! Mein AI-Gehirn ({MODEL_NAME}) hat gerade Schluckauf. Aber technisch sah das interessant aus!"
+
+def feedback_prompt(exercise_name: str, metrics: dict, user_context: dict) -> str:
+    # Build Context from Knowledge Base: the entries relevant to this exercise, voice type and
+    # problem metrics, within the token budget (retrieval.py)
+    context_str = retrieval.context_for(exercise_name, metrics, user_context)
+
+    # Build History Context
+    history_str = ""
+    if "history_avg_score" in user_context:
+        trend = "stabil"
+        if metrics.get("score", 0) > user_context['history_avg_score']:
+            trend = "verbessert 📈"
+        elif metrics.get("score", 0) < user_context['history_avg_score']:
+            trend = "leicht verschlechtert"
+
+        history_str = f"""
+        Verlauf (Letzte {user_context['history_count']} Sessions):
+        - Durchschnitt Score: {user_context['history_avg_score']}
+        - Trend heute: {trend}
+        """
+
+    return f"""
         Du bist ein professioneller, aber motivierender Vocal Coach (VocalCoach AI).
         Dein Schüler (Level {user_context.get('level', 1)}, {user_context.get('voice_type', 'Unbekannt')}) hat gerade die Übung '{exercise_name}' gemacht.
         
         Messdaten der Aufnahme:
-        {json.dumps(metrics, indent=2)}
+        {format_metrics(metrics)}
         
         {history_str}
         
@@ -123,8 +132,28 @@ def generate_feedback(exercise_name: str, metrics: dict, user_context: dict):
         Nutze Metaphern aus dem Gesangsunterricht.
         Sei du per Du. Nutze Emojis passend.
         """
+
+def generate_feedback(exercise_name: str, metrics: dict, user_context: dict):
+    """
+    Generates personalized feedback for exercises.
+    
+    Args:
+        exercise_name: Name of the exercise (e.g., "Lip Trills")
+        metrics: Dictionary of metrics (e.g., {"jitter_percent": 1.2, "shimmer_percent": 2.5, "score": 80})
+        user_context: Dictionary of user context (e.g., {"level": 2, "voice_type": "Bariton", "streak": 5})
+        
+    Returns:
+        str: AI generated feedback text.
+    """
+    if not _llm_available():
+        return "AI Feedback unavailable: No API Key configured in backend/.env."
+        
+    try:
+        model = _model()
+        prompt = compact_prompt(feedback_prompt(exercise_name, metrics, user_context))
         
-        response = model.generate_content(prompt)
+        with span("ai.gemini"):
+            response = model.generate_content(prompt)
         return response.text.strip()
         
     except Exception as e:
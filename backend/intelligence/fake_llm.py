@@ -0,0 +1,32 @@
+"""
+In-process stand-in for the Gemini API, enabled with GEMINI_BACKEND=fake.
+
+Used by load tests so capacity numbers don't depend on (or pay for) the real API.
+Mimics the parts of google.generativeai.GenerativeModel that ai_wrapper uses.
+
+    FAKE_LLM_LATENCY_MS   mean response latency (default 800)
+    FAKE_LLM_JITTER_MS    +/- uniform jitter around the mean (default 200)
+    FAKE_LLM_ERROR_RATE   fraction of calls that raise, 0.0-1.0 (default 0)
+"""
+import os
+import random
+import time
+
+LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "800"))
+JITTER_MS = float(os.getenv("FAKE_LLM_JITTER_MS", "200"))
+ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+class FakeGenerativeModel:
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    def generate_content(self, prompt: str):
+        latency = max(0.0, LATENCY_MS + random.uniform(-JITTER_MS, JITTER_MS)) / 1000
+        time.sleep(latency) # Like the real client: blocks the calling thread
+        if random.random() < ERROR_RATE:
+            raise RuntimeError("Fake LLM: simulated upstream error")
+        return FakeResponse(f"Gut gemacht! Bleib dran! 🎤 (fake {self.model_name}, {len(prompt)} Zeichen Prompt, {latency * 1000:.0f} ms)")
@@ -46,6 +46,7 @@ KNOWLEDGE_BASE = {
             "thresholds": {
                 "excellent": {"min": 25.0, "label": "Sehr Resonant"},
                 "acceptable": {"min": 20.0, "max": 24.0, "label": "Normal"},
+                "warning": {"min": 12.0, "max": 20.0, "label": "Grauzone (luftig/behaucht)"},
                 "pathological": {"max": 12.0, "label": "Pathologisch/Extrem Behaucht"}
             },
             "context": "Werte unter 20dB gelten als klinische Grenze für Heiserkeit. Im Jazz/Pop kann 15-18dB stilistisch gewollt sein (Breathy Voice)."
@@ -241,28 +242,20 @@ KNOWLEDGE_BASE = {
     }
 }
 
-def get_feedback_context(metric_name, value):
+def get_feedback_context(metric_name, value, style=None):
     """
     Returns a RAG-ready context string for the AI based on a metric value.
     Example: get_feedback_context("jitter_local", 1.8)
+    Works for every metric in vocal_health_metrics (vibrato: rate in Hz, style "classic"/"pop").
     """
+    from . import thresholds # Compiled from KNOWLEDGE_BASE (imports this module)
+
     metric = KNOWLEDGE_BASE["vocal_health_metrics"].get(metric_name)
     if not metric:
         return ""
-    
-    thresholds = metric["thresholds"]
-    status = "unknown"
-    
-    # Simple logic to determine status (adjust for specific metrics)
-    if metric_name == "jitter_local":
-        if value <= thresholds["healthy"]["max"]: status = "healthy"
-        elif value <= thresholds["warning"]["max"]: status = "warning"
-        else: status = "pathological"
-        
-    elif metric_name == "hnr":
-        if value >= thresholds["excellent"]["min"]: status = "excellent"
-        elif value >= thresholds["acceptable"]["min"]: status = "acceptable"
-        else: status = "pathological"
-        
+
+    status = thresholds.classify(metric_name, value, style)
+    context = metric.get("context", metric["description"])
+
     # Construct explanation
-    return f"Gemessener {metric_name}: {value}{metric['unit']}. Das ist im Bereich '{status}'. Kontext: {metric['context']}"
+    return f"Gemessener {metric_name}: {value}{metric['unit']}. Das ist im Bereich '{status}'. Kontext: {context}"
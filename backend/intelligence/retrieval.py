@@ -0,0 +1,188 @@
+"""
+Retrieval index over the knowledge base for compact, targeted AI prompts.
+
+Every KNOWLEDGE_BASE entry becomes one short snippet: each vocal health metric (with its
+bands), the vibrato norms, the MPT norms, each voice type (range, passaggios) and each
+exercise. The snippets are indexed with TF-IDF (plain numpy, no extra dependency). The index
+is built once on import, never per request (in the pre-forking server: once in the parent).
+
+Per session, retrieve() takes the snippet of the singer's voice type (range, passaggios)
+and those of the metrics outside the green range (red first), then fills up with the
+snippets that best match the exercise (query_for), at most TOP_K within TOKEN_BUDGET.
+A token is estimated at ~4 characters (rule of thumb for the Gemini/GPT tokenizers).
+
+    RETRIEVAL_TOKEN_BUDGET   max estimated tokens of retrieved context per prompt (default 160)
+    RETRIEVAL_TOP_K          max snippets per prompt (default 3)
+
+    snippets = retrieval.retrieve("Lip Trills", metrics, {"voice_type": "Tenor"})
+"""
+import math
+import os
+import re
+
+import numpy as np
+
+from . import thresholds
+from .knowledge import KNOWLEDGE_BASE
+
+TOKEN_BUDGET = int(os.getenv("RETRIEVAL_TOKEN_BUDGET", "160"))
+TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "3"))
+MIN_RELATIVE_SCORE = 0.25 # Snippets scoring below this fraction of the best match are noise
+
+_TOKEN = re.compile(r"[a-zäöüß0-9_]+") # Metric keys (jitter_local) stay one term
+# Filler words in the snippets (German) and queries; everything else is a term
+STOPWORDS = {
+    "der", "die", "das", "den", "dem", "des", "ein", "eine", "einen", "und", "oder", "in", "im", "an", "auf",
+    "aus", "bei", "mit", "von", "vom", "zu", "zum", "zur", "für", "ist", "sind", "nach", "vor", "wie", "z", "b",
+    "nicht", "kein", "muss", "kann", "sehr", "hier", "the", "of", "and",
+    "vocal", "check", # In every endpoint's exercise name ("Vocal Health Check"), not a topic
+}
+
+def tokenize(text: str) -> list:
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS and len(token) > 1]
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / 4)
+
+def _format_number(value) -> str:
+    return f"{value:g}"
+
+def _bands(bands: dict, unit: str) -> str:
+    parts = []
+    for name, band in bands.items():
+        if "min" in band and "max" in band:
+            span = f"{_format_number(band['min'])}-{_format_number(band['max'])}"
+        elif "min" in band:
+            span = f">={_format_number(band['min'])}"
+        else:
+            span = f"<={_format_number(band['max'])}"
+        parts.append(f"{band.get('label', name)} {span}{unit}")
+    return ", ".join(parts)
+
+def build_snippets(kb: dict = KNOWLEDGE_BASE) -> list:
+    """One snippet per knowledge base entry: {"id", "text", "keys", "tokens"}. keys: extra index terms, not shown."""
+    snippets = []
+
+    def add(snippet_id: str, text: str, keys: str = ""):
+        # +1: the "- " and line break of the rendered line (context_for)
+        snippets.append({"id": snippet_id, "text": text, "keys": keys, "tokens": estimate_tokens(text) + 1})
+
+    aliases = {}
+    for alias, metric in thresholds.ALIASES.items():
+        aliases.setdefault(metric, []).append(alias)
+    for metric, spec in kb["vocal_health_metrics"].items():
+        # The description only where there is no context note (which says more in the same space)
+        keys = " ".join([metric] + aliases.get(metric, []) + ([spec["description"]] if spec.get("context") else []))
+        about = spec.get("context") or spec["description"]
+        if "thresholds" in spec:
+            text = f"{metric} ({spec['unit']}): {_bands(spec['thresholds'], spec['unit'])}. {about}"
+        else:
+            norms = ", ".join(f"{style} {_format_number(n['min'])}-{_format_number(n['max'])} Hz" for style, n in spec["norms"].items())
+            text = f"{metric} ({spec['unit']}): Normen {norms}; {_bands(spec['errors'], ' Hz')}. {about}"
+        add(f"metric:{metric}", text, keys)
+
+    mpt = kb["mpt_norms"]
+    groups = "; ".join(
+        f"{group.replace('adult_', '')}: " + ", ".join(f"{level} >= {_format_number(n['min'])} s" for level, n in levels.items())
+        for group, levels in mpt.items() if isinstance(levels, dict)
+    )
+    add("mpt_norms", f"{mpt['description']} {groups}; pathologisch < {_format_number(mpt['pathology_limit'])} s.",
+        "mpt atem breath phonation time tonhaltedauer")
+
+    for fach, spec in kb["voice_classification"]["fache"].items():
+        passaggios = ", ".join(f"{name} {value}" for name, value in spec["passaggios"].items())
+        add(f"voice:{fach}", f"Stimmfach {fach}: Umfang {spec['range_hz'][0]}-{spec['range_hz'][1]} Hz, Passaggi {passaggios}.")
+
+    for level, exercises in kb["exercises"].items():
+        for exercise in exercises:
+            add(f"exercise:{exercise['id']}",
+                f"Übung '{exercise['name']}' ({exercise['category']}): {exercise['target']}. {exercise['execution']} "
+                f"Erwartet: {exercise['expected_metrics']}", f"übung exercise {level}")
+    return snippets
+
+class Index:
+    """TF-IDF (sublinear tf, smoothed idf, L2-normalized rows) over the snippets."""
+
+    def __init__(self, snippets: list):
+        self.snippets = snippets
+        self.by_id = {s["id"]: s for s in snippets}
+        documents = [tokenize(f"{s['text']} {s['keys']}") for s in snippets]
+        self.vocabulary = {term: i for i, term in enumerate(sorted({t for doc in documents for t in doc}))}
+
+        counts = np.zeros((len(documents), len(self.vocabulary)), dtype=np.float32)
+        for row, doc in enumerate(documents):
+            for term in doc:
+                counts[row, self.vocabulary[term]] += 1
+        document_frequency = np.count_nonzero(counts, axis=0)
+        self.idf = (np.log((1 + len(documents)) / (1 + document_frequency)) + 1).astype(np.float32)
+        weights = np.where(counts > 0, 1 + np.log(np.maximum(counts, 1)), 0) * self.idf
+        self.matrix = weights / np.maximum(np.linalg.norm(weights, axis=1, keepdims=True), 1e-12)
+
+    def scores(self, query: str) -> np.ndarray:
+        vector = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for term in tokenize(query):
+            index = self.vocabulary.get(term)
+            if index is not None:
+                vector[index] += 1
+        vector = np.where(vector > 0, 1 + np.log(np.maximum(vector, 1)), 0) * self.idf
+        return self.matrix @ vector # Cosine up to the query norm (same for every snippet)
+
+    def search(self, query: str, k: int = TOP_K, budget: int = TOKEN_BUDGET, required: tuple = ()) -> list:
+        """
+        Best-scoring snippets, at most k, together within the token budget.
+        required: snippet ids taken first, in order (as far as they fit).
+        """
+        chosen, used = [], 0
+        for snippet_id in required:
+            snippet = self.by_id.get(snippet_id)
+            if snippet and len(chosen) < k and used + snippet["tokens"] <= budget:
+                chosen.append(snippet)
+                used += snippet["tokens"]
+
+        scores = self.scores(query)
+        cutoff = max(float(scores.max(initial=0)) * MIN_RELATIVE_SCORE, 1e-6)
+        for row in np.argsort(-scores, kind="stable"):
+            if scores[row] < cutoff or len(chosen) >= k:
+                break
+            snippet = self.snippets[row]
+            if snippet in chosen or snippet["id"].startswith("voice:"):
+                continue # Only the singer's own voice type (required) is relevant
+            if used + snippet["tokens"] > budget:
+                continue # A smaller, lower-ranked snippet may still fit
+            chosen.append(snippet)
+            used += snippet["tokens"]
+        return chosen
+
+INDEX = Index(build_snippets())
+
+def _problems(metrics: dict) -> list:
+    """Knowledge base metrics outside the green range, red ones first."""
+    problems = []
+    for key, value in metrics.items():
+        if key in thresholds.ALIASES and isinstance(value, (int, float)):
+            light = thresholds.traffic_light(key, value)
+            if light in ("yellow", "red"):
+                problems.append((light != "red", thresholds.ALIASES[key]))
+    return [metric for _, metric in sorted(problems)]
+
+def query_for(exercise_name: str, metrics: dict) -> str:
+    """
+    Query text for one session: the exercise, and the first word of each problem metric
+    (finds the exercises that train it: shimmer_local -> "Konstanter Shimmer").
+    """
+    return " ".join([exercise_name or ""] + [metric.split("_")[0] for metric in _problems(metrics)])
+
+def required_for(metrics: dict, user_context: dict) -> list:
+    """Snippets every prompt of this session gets: the voice type, then the problem metrics."""
+    voice_type = user_context.get("voice_type")
+    return ([f"voice:{voice_type}"] if voice_type else []) + [f"metric:{metric}" for metric in _problems(metrics)]
+
+def top_snippets(query: str, required=(), k: int = TOP_K, budget: int = TOKEN_BUDGET) -> list:
+    return INDEX.search(query, k, budget, required=required)
+
+def retrieve(exercise_name: str, metrics: dict, user_context: dict, k: int = TOP_K, budget: int = TOKEN_BUDGET) -> list:
+    return top_snippets(query_for(exercise_name, metrics), required_for(metrics, user_context), k, budget)
+
+def context_for(exercise_name: str, metrics: dict, user_context: dict, k: int = TOP_K, budget: int = TOKEN_BUDGET) -> str:
+    """Retrieved knowledge for the prompt, one snippet per line."""
+    return "\n".join(f"- {s['text']}" for s in retrieve(exercise_name, metrics, user_context, k, budget))
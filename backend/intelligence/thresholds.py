@@ -0,0 +1,135 @@
+"""
+Threshold engine compiled from KNOWLEDGE_BASE["vocal_health_metrics"].
+
+On import, every metric's bands (its "thresholds", or for vibrato the style norm plus the
+"errors") are turned into sorted cut points. classify() then finds the band of a value with
+one np.searchsorted call. It takes a single value or a whole NumPy array, so trend analytics
+and re-scoring jobs can classify millions of stored values at once.
+
+- A band covers [min, max]. A value exactly on a cut point goes to the better band (as in the
+  if/elif chains this replaces: jitter <= 1.04 is healthy, HNR >= 25 is excellent).
+- A gap between two threshold bands goes to the worse one (HNR 24-25 dB: acceptable).
+  A gap between vibrato bands is "outside_norm".
+- NaN or None gives "unknown".
+
+    thresholds.classify("jitter_local", 1.2)                 # "warning"
+    thresholds.traffic_light("hnr_db", np.array([26, 15]))  # ["green", "yellow"]
+    thresholds.classify("vibrato", rates, style="pop")       # "norm" / "wobble" / "tremolo" / "outside_norm"
+
+Metric names are the knowledge base keys, or the keys the analyzers store them under (ALIASES).
+"""
+import numpy as np
+
+from .knowledge import KNOWLEDGE_BASE
+
+UNKNOWN = "unknown"
+OUTSIDE_NORM = "outside_norm"
+NORM = "norm"
+
+# Band -> (severity, traffic light). A lower severity is better.
+BANDS = {
+    "excellent": (0, "green"),
+    "healthy": (0, "green"),
+    NORM: (0, "green"),
+    "acceptable": (1, "green"),
+    "warning": (2, "yellow"),
+    OUTSIDE_NORM: (2, "yellow"),
+    "pathological": (3, "red"),
+    "wobble": (3, "red"),
+    "tremolo": (3, "red"),
+}
+LIGHTS = ("green", "yellow", "red") # Best first; worst() picks the last one present
+
+# Keys the analyzers store metrics under (analyze_health, trends) -> knowledge base metric
+ALIASES = {
+    "jitter_percent": "jitter_local",
+    "shimmer_percent": "shimmer_local",
+    "hnr_db": "hnr",
+    "vibrato_rate": "vibrato",
+}
+
+class Thresholds:
+    """One metric's bands as sorted cut points."""
+
+    def __init__(self, bands: list, gap: str = None):
+        """bands: [(name, min or None, max or None)]. gap: name for uncovered ranges (default: the worse neighbour)."""
+        bands = sorted(((name, -np.inf if lo is None else lo, np.inf if hi is None else hi) for name, lo, hi in bands),
+                       key=lambda band: (band[1], band[2]))
+        names, edges = [], []
+        for name, lo, hi in bands:
+            if names and lo > edges[-1]:
+                # Gap up to this band
+                names.append(gap or max(names[-1], name, key=lambda n: BANDS[n][0]))
+                edges.append(lo)
+            if names and hi <= edges[-1]:
+                continue # Fully covered by the bands before
+            names.append(name)
+            edges.append(hi)
+        edges.pop() # The last band is open-ended (or ends at +inf)
+
+        self.edges = np.array(edges, dtype=float)
+        self.names = np.array(names + [UNKNOWN], dtype=object)
+        self.lights = np.array([BANDS[name][1] for name in names] + [None], dtype=object)
+        # A value on edge i belongs to band i+1 if that band is the better one
+        self.upper_wins = np.array([BANDS[names[i + 1]][0] < BANDS[names[i]][0] for i in range(len(edges))], dtype=bool)
+
+    def indices(self, values: np.ndarray) -> np.ndarray:
+        """Band index per value (len(names) - 1 = unknown)."""
+        index = np.searchsorted(self.edges, values, side="left")
+        if len(self.edges):
+            on_edge = self.edges[np.minimum(index, len(self.edges) - 1)] == values
+            index = index + (on_edge & self.upper_wins[np.minimum(index, len(self.edges) - 1)])
+        return np.where(np.isnan(values), len(self.names) - 1, index)
+
+    def classify(self, values):
+        return self.names[self.indices(values)]
+
+def _compile(metrics: dict) -> dict:
+    """(metric, style) -> Thresholds. style is None except for the vibrato norms."""
+    compiled = {}
+    for metric, spec in metrics.items():
+        if "thresholds" in spec:
+            bands = [(name, band.get("min"), band.get("max")) for name, band in spec["thresholds"].items()]
+            compiled[(metric, None)] = Thresholds(bands)
+        if "norms" in spec:
+            errors = [(name, band.get("min"), band.get("max")) for name, band in spec.get("errors", {}).items()]
+            for style, norm in spec["norms"].items():
+                compiled[(metric, style)] = Thresholds(errors + [(NORM, norm.get("min"), norm.get("max"))], gap=OUTSIDE_NORM)
+    return compiled
+
+COMPILED = _compile(KNOWLEDGE_BASE["vocal_health_metrics"])
+STYLES = sorted({style for _, style in COMPILED if style})
+DEFAULT_STYLE = "classic"
+
+def _lookup(metric: str, style: str = None) -> Thresholds:
+    metric = ALIASES.get(metric, metric)
+    compiled = COMPILED.get((metric, None)) or COMPILED.get((metric, style or DEFAULT_STYLE))
+    if compiled is None:
+        raise KeyError(f"No thresholds for metric '{metric}'" + (f" (style '{style}')" if style else ""))
+    return compiled
+
+def _as_array(values):
+    # None (missing metric) -> NaN -> "unknown"
+    return np.asarray(values if np.ndim(values) else (np.nan if values is None else values), dtype=float)
+
+def classify(metric: str, values, style: str = None):
+    """Band name per value: a str for a scalar, an object array for an array."""
+    return _lookup(metric, style).classify(_as_array(values))
+
+def traffic_light(metric: str, values, style: str = None):
+    """"green" / "yellow" / "red" per value (None for unknown)."""
+    compiled = _lookup(metric, style)
+    return compiled.lights[compiled.indices(_as_array(values))]
+
+def worst(lights):
+    """Overall traffic light: red if any is red, else yellow if any is yellow, else green (None ignored)."""
+    present = [light for light in lights if light in LIGHTS]
+    return max(present, key=LIGHTS.index) if present else None
+
+def label(metric: str, band: str) -> str:
+    """The knowledge base label of a band (the band name itself if it has none)."""
+    spec = KNOWLEDGE_BASE["vocal_health_metrics"][ALIASES.get(metric, metric)]
+    for group in ("thresholds", "errors"):
+        if band in spec.get(group, {}):
+            return spec[group][band].get("label", band)
+    return band
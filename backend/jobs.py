@@ -0,0 +1,290 @@
+"""
+Shared durable queue for background analysis jobs (JOB_QUEUE).
+
+- "inline" (default): no queue, the API process runs background work itself (BackgroundTasks).
+- "db": the jobs table in the app database. Any number of worker processes, on any host
+  that reaches the database, claim jobs with one atomic UPDATE (FOR UPDATE SKIP LOCKED on
+  PostgreSQL, the single writer on SQLite).
+- "redis": lists in a Redis-compatible server (REDIS_URL, needs the `redis` package).
+  REDIS_URL=fake:// uses an in-process stand-in (fake_redis.py; API and workers in one process).
+
+Workers (`python -m backend.worker`) run the jobs and write results to the session record.
+A claimed job holds a lease (LEASE_SECONDS, extended by the worker's heartbeat). Jobs whose
+worker died are requeued once the lease expires. A failing job is retried after a growing
+delay, up to MAX_ATTEMPTS times, then marked failed (fail() and recover() report that, so the
+worker can record it on the session: worker.FAILURE_HANDLERS).
+
+    job_id = jobs.enqueue("sessions.refine", {"session_id": 42})
+    jobs.enqueue_in(db, "sessions.refine", {"session_id": 42})  # JOB_QUEUE=db: in db's transaction
+"""
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, delete, func, select, update
+
+from . import database, models, scheduler
+
+BACKEND = os.getenv("JOB_QUEUE", "inline").lower()
+ENABLED = BACKEND != "inline"
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+RETRY_SECONDS = 30 # Delay before retry n: RETRY_SECONDS * n
+KEEP_DAYS = 7 # Finished jobs are purged after this
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+def _priority(kind: str) -> int:
+    return scheduler.PRIORITIES.index(scheduler.PRIORITY_OF.get(kind, scheduler.BATCH))
+
+class DatabaseQueue:
+    """Jobs table in the app database."""
+
+    def __init__(self, session_factory=None):
+        self.session_factory = session_factory
+
+    def _write(self, fn):
+        return database.write(fn, self.session_factory)
+
+    def add(self, db, kind: str, payload: dict) -> int:
+        """Adds the job in the caller's transaction: it is queued when (and only if) that commits."""
+        job = models.Job(kind=kind, payload=payload, priority=_priority(kind), status=QUEUED, available_at=datetime.utcnow())
+        db.add(job)
+        db.flush()
+        return job.id
+
+    def enqueue(self, kind: str, payload: dict, key: str = None) -> int:
+        # key: unused, a job row is added with the row it belongs to (enqueue_in)
+        return self._write(lambda db: self.add(db, kind, payload))
+
+    def claim(self, worker_id: str):
+        """Next due job, marked running under a lease. Returns {"id", "kind", "payload", "attempts"} or None."""
+        jobs = models.Job.__table__
+        now = datetime.utcnow()
+        candidate = (
+            select(jobs.c.id)
+            .where(jobs.c.status == QUEUED, jobs.c.available_at <= now)
+            .order_by(jobs.c.priority, jobs.c.id)
+            .limit(1)
+            .with_for_update(skip_locked=True) # PostgreSQL: concurrent claims skip each other's row
+            .scalar_subquery()
+        )
+        statement = (
+            update(jobs)
+            .where(jobs.c.id == candidate, jobs.c.status == QUEUED)
+            .values(status=RUNNING, locked_by=worker_id, locked_until=now + timedelta(seconds=LEASE_SECONDS), attempts=jobs.c.attempts + 1)
+            .returning(jobs.c.id, jobs.c.kind, jobs.c.payload, jobs.c.attempts)
+        )
+        row = self._write(lambda db: db.execute(statement).first())
+        return dict(row._mapping) if row else None
+
+    def _update_own(self, job_id: int, worker_id: str, **values) -> bool:
+        jobs = models.Job.__table__
+        statement = update(jobs).where(jobs.c.id == job_id, jobs.c.locked_by == worker_id, jobs.c.status == RUNNING).values(**values)
+        return self._write(lambda db: db.execute(statement).rowcount) > 0
+
+    def heartbeat(self, job_id: int, worker_id: str) -> bool:
+        """Extends the lease. False if the job was taken away (lease expired and requeued)."""
+        return self._update_own(job_id, worker_id, locked_until=datetime.utcnow() + timedelta(seconds=LEASE_SECONDS))
+
+    def complete(self, job_id: int, worker_id: str):
+        # locked_by stays: which worker ran the job
+        self._update_own(job_id, worker_id, status=DONE, locked_until=None, finished_at=datetime.utcnow())
+
+    def fail(self, job_id: int, worker_id: str, attempts: int, error: str) -> bool:
+        """Requeues the job for a retry. Returns True if it was marked failed instead (MAX_ATTEMPTS)."""
+        if attempts < MAX_ATTEMPTS:
+            self._update_own(job_id, worker_id, status=QUEUED, locked_by=None, locked_until=None, error=error,
+                             available_at=datetime.utcnow() + timedelta(seconds=RETRY_SECONDS * attempts))
+            return False
+        return self._update_own(job_id, worker_id, status=FAILED, locked_by=None, locked_until=None, error=error, finished_at=datetime.utcnow())
+
+    def recover(self, on_failed=None) -> int:
+        """
+        Requeues jobs with an expired lease (or fails them after MAX_ATTEMPTS), purges old finished jobs.
+        on_failed(kind, payload, error) is called for each job marked failed. Returns the number requeued.
+        """
+        jobs = models.Job.__table__
+        now = datetime.utcnow()
+        expired = and_(jobs.c.status == RUNNING, jobs.c.locked_until < now)
+
+        def run(db):
+            requeued = db.execute(
+                update(jobs).where(expired, jobs.c.attempts < MAX_ATTEMPTS)
+                .values(status=QUEUED, locked_by=None, locked_until=None, available_at=now, error="Lease expired")
+            ).rowcount
+            failed = db.execute(
+                update(jobs).where(expired, jobs.c.attempts >= MAX_ATTEMPTS)
+                .values(status=FAILED, locked_by=None, locked_until=None, finished_at=now, error="Lease expired")
+                .returning(jobs.c.kind, jobs.c.payload)
+            ).all()
+            db.execute(delete(jobs).where(jobs.c.status.in_((DONE, FAILED)), jobs.c.finished_at < now - timedelta(days=KEEP_DAYS)))
+            return requeued, [tuple(row) for row in failed]
+
+        requeued, failed = self._write(run)
+        for kind, payload in failed:
+            if on_failed:
+                on_failed(kind, payload, "Lease expired")
+        return requeued
+
+    def stats(self) -> dict:
+        jobs = models.Job.__table__
+        db = (self.session_factory or database.SessionLocal)()
+        try:
+            counts = dict(db.execute(select(jobs.c.status, func.count()).group_by(jobs.c.status)).all())
+        finally:
+            db.close()
+        return {status: counts.get(status, 0) for status in (QUEUED, RUNNING, DONE, FAILED)}
+
+class RedisQueue:
+    """
+    Reliable-queue pattern: one list per priority, RPOPLPUSH into a running list, leases in a
+    sorted set (job id -> expiry), delayed retries in another. Job fields live in a hash.
+    """
+    PREFIX = "vocalcoach:jobs"
+
+    def __init__(self, client):
+        self.r = client
+        self.running_key = f"{self.PREFIX}:running"
+        self.leases_key = f"{self.PREFIX}:leases"
+        self.delayed_key = f"{self.PREFIX}:delayed"
+
+    def _queue_key(self, priority: int) -> str:
+        return f"{self.PREFIX}:queue:{priority}"
+
+    def _job_key(self, job_id) -> str:
+        return f"{self.PREFIX}:{job_id}"
+
+    def enqueue(self, kind: str, payload: dict, key: str = None) -> int:
+        """
+        With a key, a job enqueued under the same key that still exists is returned instead
+        (requeue_orphaned_refinements re-enqueues sessions whose enqueue may have been lost).
+        """
+        if key:
+            existing = self.r.get(f"{self.PREFIX}:key:{key}")
+            if existing is not None and self.r.exists(self._job_key(existing)):
+                return int(existing)
+        job_id = self.r.incr(f"{self.PREFIX}:next_id")
+        priority = _priority(kind)
+        self.r.hset(self._job_key(job_id), mapping={
+            "kind": kind, "payload": json.dumps(payload), "priority": priority, "status": QUEUED,
+            "attempts": 0, "created_at": datetime.utcnow().isoformat()
+        })
+        self.r.lpush(self._queue_key(priority), job_id)
+        if key:
+            self.r.set(f"{self.PREFIX}:key:{key}", job_id, ex=int(KEEP_DAYS * 86400))
+        return job_id
+
+    def claim(self, worker_id: str):
+        for priority in range(len(scheduler.PRIORITIES)):
+            job_id = self.r.rpoplpush(self._queue_key(priority), self.running_key)
+            if job_id is not None:
+                break
+        else:
+            return None
+        self.r.zadd(self.leases_key, {job_id: time.time() + LEASE_SECONDS})
+        attempts = self.r.hincrby(self._job_key(job_id), "attempts", 1)
+        self.r.hset(self._job_key(job_id), mapping={"status": RUNNING, "locked_by": worker_id})
+        fields = self.r.hgetall(self._job_key(job_id))
+        return {"id": int(job_id), "kind": fields["kind"], "payload": json.loads(fields["payload"]), "attempts": attempts}
+
+    def _owns(self, job_id, worker_id: str) -> bool:
+        return self.r.hget(self._job_key(job_id), "locked_by") == worker_id
+
+    def _release(self, job_id, worker_id: str) -> bool:
+        # Removed from the running list by exactly one party (this worker or recover())
+        if not self._owns(job_id, worker_id) or not self.r.lrem(self.running_key, 0, job_id):
+            return False
+        self.r.zrem(self.leases_key, job_id)
+        return True
+
+    def heartbeat(self, job_id: int, worker_id: str) -> bool:
+        if not self._owns(job_id, worker_id):
+            return False
+        self.r.zadd(self.leases_key, {job_id: time.time() + LEASE_SECONDS})
+        return True
+
+    def complete(self, job_id: int, worker_id: str):
+        if self._release(job_id, worker_id):
+            self.r.hset(self._job_key(job_id), mapping={"status": DONE, "finished_at": datetime.utcnow().isoformat()})
+            self.r.expire(self._job_key(job_id), int(KEEP_DAYS * 86400))
+
+    def fail(self, job_id: int, worker_id: str, attempts: int, error: str) -> bool:
+        if not self._release(job_id, worker_id):
+            return False
+        return self._retry_or_fail(job_id, attempts, error, delay=RETRY_SECONDS * attempts)
+
+    def _retry_or_fail(self, job_id, attempts: int, error: str, delay: float) -> bool:
+        """True if the job was marked failed."""
+        key = self._job_key(job_id)
+        if attempts < MAX_ATTEMPTS:
+            self.r.hset(key, mapping={"status": QUEUED, "locked_by": "", "error": error})
+            self.r.zadd(self.delayed_key, {job_id: time.time() + delay})
+            return False
+        self.r.hset(key, mapping={"status": FAILED, "locked_by": "", "error": error, "finished_at": datetime.utcnow().isoformat()})
+        self.r.expire(key, int(KEEP_DAYS * 86400))
+        return True
+
+    def recover(self, on_failed=None) -> int:
+        now = time.time()
+        # A worker that died between RPOPLPUSH and ZADD left a running id without a lease
+        for job_id in self.r.lrange(self.running_key, 0, -1):
+            self.r.zadd(self.leases_key, {job_id: now + LEASE_SECONDS}, nx=True)
+        requeued = 0
+        for job_id in self.r.zrangebyscore(self.leases_key, "-inf", now):
+            self.r.zrem(self.leases_key, job_id)
+            if self.r.lrem(self.running_key, 0, job_id):
+                attempts = int(self.r.hget(self._job_key(job_id), "attempts") or 0)
+                if not self._retry_or_fail(job_id, attempts, "Lease expired", delay=0):
+                    requeued += 1
+                elif on_failed:
+                    fields = self.r.hgetall(self._job_key(job_id))
+                    on_failed(fields["kind"], json.loads(fields["payload"]), "Lease expired")
+        for job_id in self.r.zrangebyscore(self.delayed_key, "-inf", now):
+            if self.r.zrem(self.delayed_key, job_id):
+                self.r.lpush(self._queue_key(int(self.r.hget(self._job_key(job_id), "priority") or 0)), job_id)
+        return requeued
+
+    def stats(self) -> dict:
+        queued = sum(self.r.llen(self._queue_key(p)) for p in range(len(scheduler.PRIORITIES))) + self.r.zcard(self.delayed_key)
+        return {QUEUED: queued, RUNNING: self.r.llen(self.running_key)}
+
+def redis_client(url: str = REDIS_URL):
+    if url.startswith("fake://"):
+        from .fake_redis import FakeRedis
+        return FakeRedis.shared()
+    try:
+        import redis
+    except ImportError:
+        raise RuntimeError("JOB_QUEUE=redis needs the redis package (pip install redis), or REDIS_URL=fake:// for the in-process stand-in")
+    return redis.Redis.from_url(url, decode_responses=True)
+
+_queue = None
+
+def get_queue():
+    """The configured queue (created on first use)."""
+    global _queue
+    if _queue is None:
+        if BACKEND == "db":
+            _queue = DatabaseQueue()
+        elif BACKEND == "redis":
+            _queue = RedisQueue(redis_client())
+        else:
+            raise RuntimeError(f"No job queue configured (JOB_QUEUE={BACKEND}). Use 'db' or 'redis'.")
+    return _queue
+
+def enqueue(kind: str, payload: dict, key: str = None) -> int:
+    return get_queue().enqueue(kind, payload, key)
+
+def enqueue_in(db, kind: str, payload: dict) -> bool:
+    """
+    Outbox: with JOB_QUEUE=db the job row is added in the caller's transaction (db), so it
+    is committed together with the row it is for. Returns False for the other backends: the
+    caller enqueues after its commit.
+    """
+    if BACKEND != "db":
+        return False
+    get_queue().add(db, kind, payload)
+    return True
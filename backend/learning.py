@@ -0,0 +1,245 @@
+"""
+The Learning Brain: running per-user / per-exercise aggregates.
+
+Every full-tier session is folded into
+- UserExerciseStats (one row per user and exercise): count, running mean/variance of score
+  and jitter (Welford), EWMA trend of both and the derived efficacy_rating
+- User.sessions_count / User.score_ewma: the user-wide recent form used as AI history context
+
+inside the same transaction as the session write, so reads are O(1) instead of scanning
+sessions. Callers flush the session first: that takes the write lock (SQLite) before the
+aggregates are read; on PostgreSQL the stats row is created if missing (INSERT ... ON
+CONFLICT DO NOTHING) and then locked with SELECT ... FOR UPDATE.
+
+Preview sessions are folded in once they are refined (their quick values are estimates, see
+analysis/preview.py); previews whose refinement failed stay out. A session is normally the
+user's latest when it is folded (an O(1) update); if newer sessions were stored in the
+meantime, the user's aggregates are recomputed from the raw sessions instead.
+`python -m backend.learning --check` rebuilds everything from the raw sessions and reports
+(or with --repair fixes) drift.
+"""
+import argparse
+import math
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import models, database
+
+EXERCISE_ALPHA = 0.3 # EWMA weight of the newest session per exercise
+HISTORY_ALPHA = 1 / 3 # User-wide EWMA, span of ~5 sessions (replaces "average of the last 5")
+MIN_SESSIONS_FOR_EFFICACY = 3
+SCORE_STD_FLOOR = 5.0 # Score points; keeps efficacy calm for very consistent singers
+JITTER_STD_FLOOR = 0.1 # Percent
+
+# --- Running statistics ---
+
+def welford_add(n: int, mean: float, m2: float, x: float):
+    n += 1
+    delta = x - mean
+    mean += delta / n
+    m2 += delta * (x - mean)
+    return n, mean, m2
+
+def std(n: int, m2: float) -> float:
+    return math.sqrt(m2 / (n - 1)) if n > 1 else 0.0
+
+def ewma_add(ewma: float, x: float, alpha: float, first: bool) -> float:
+    return x if first or ewma is None else ewma + alpha * (x - ewma)
+
+def efficacy(stats: models.UserExerciseStats) -> float:
+    """
+    -1.0 .. +1.0: is the singer currently doing better on this exercise than their long-run
+    average? Recent score above the mean and recent jitter below the mean count as positive.
+    """
+    if (stats.times_performed or 0) < MIN_SESSIONS_FOR_EFFICACY:
+        return 0.0
+    score_z = (stats.score_ewma - stats.avg_score) / max(std(stats.times_performed, stats.score_m2), SCORE_STD_FLOOR)
+    z = score_z
+    if (stats.jitter_count or 0) >= MIN_SESSIONS_FOR_EFFICACY:
+        jitter_z = (stats.jitter_mean - stats.jitter_ewma) / max(std(stats.jitter_count, stats.jitter_m2), JITTER_STD_FLOOR)
+        z = 0.5 * score_z + 0.5 * jitter_z
+    return round(math.tanh(z), 3)
+
+# --- Folding sessions in ---
+
+# INSERT ... ON CONFLICT DO NOTHING per dialect
+_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+def _stats_row(db: Session, user_id: int, exercise_id: int) -> models.UserExerciseStats:
+    # The row is created first if missing: SELECT ... FOR UPDATE locks nothing when there is
+    # no row, so two first sessions of the same exercise would both insert (unique index)
+    values = dict(
+        user_id=user_id, exercise_id=exercise_id, times_performed=0, avg_score=0.0, score_m2=0.0,
+        jitter_count=0, jitter_mean=0.0, jitter_m2=0.0, efficacy_rating=0.0
+    )
+    insert = _INSERTS.get(db.get_bind().dialect.name)
+    if insert is not None:
+        db.execute(insert(models.UserExerciseStats).values(**values).on_conflict_do_nothing(index_elements=["user_id", "exercise_id"]))
+    query = db.query(models.UserExerciseStats).filter(
+        models.UserExerciseStats.user_id == user_id, models.UserExerciseStats.exercise_id == exercise_id
+    ).with_for_update()
+    stats = query.first()
+    if stats is None:
+        # Other dialects: insert, and if a concurrent transaction won, use its row
+        try:
+            with db.begin_nested():
+                stats = models.UserExerciseStats(**values)
+                db.add(stats)
+                db.flush()
+        except IntegrityError:
+            stats = query.one()
+    return stats
+
+def _fold(stats: models.UserExerciseStats, user: models.User, score, jitter):
+    """Adds one session's values."""
+    if score is not None:
+        first = stats.times_performed == 0
+        stats.times_performed, stats.avg_score, stats.score_m2 = welford_add(stats.times_performed, stats.avg_score, stats.score_m2, score)
+        stats.score_ewma = ewma_add(stats.score_ewma, score, EXERCISE_ALPHA, first)
+        user.score_ewma = ewma_add(user.score_ewma, score, HISTORY_ALPHA, (user.sessions_count or 0) == 0)
+        user.sessions_count = (user.sessions_count or 0) + 1
+    if jitter is not None:
+        first = stats.jitter_count == 0
+        stats.jitter_count, stats.jitter_mean, stats.jitter_m2 = welford_add(stats.jitter_count, stats.jitter_mean, stats.jitter_m2, jitter)
+        stats.jitter_ewma = ewma_add(stats.jitter_ewma, jitter, EXERCISE_ALPHA, first)
+
+def _is_latest(db: Session, db_session: models.Session) -> bool:
+    later = (
+        db.query(models.Session.id)
+        .filter(
+            models.Session.user_id == db_session.user_id,
+            or_(
+                models.Session.created_at > db_session.created_at,
+                and_(models.Session.created_at == db_session.created_at, models.Session.id > db_session.id)
+            )
+        )
+        .first()
+    )
+    return later is None
+
+def record_session(db: Session, db_session: models.Session):
+    """
+    Folds a flushed full-tier session into the aggregates (no commit; the caller's
+    transaction covers the session write and the rollups together).
+    """
+    user = db_session.user
+    stats = _stats_row(db, db_session.user_id, db_session.exercise_id)
+
+    if not _is_latest(db, db_session):
+        # A refined preview with newer sessions after it: the EWMAs fold in session order
+        expected, expected_user = rebuild(db, db_session.user_id)
+        for field in STAT_FIELDS:
+            setattr(stats, field, getattr(expected[db_session.exercise_id], field))
+        user.sessions_count, user.score_ewma = expected_user.sessions_count, expected_user.score_ewma
+        return stats
+
+    _fold(stats, user, db_session.score, db_session.jitter_percent)
+    stats.efficacy_rating = efficacy(stats)
+    practiced_at = db_session.created_at or datetime.utcnow()
+    stats.last_practiced_at = max(stats.last_practiced_at, practiced_at) if stats.last_practiced_at else practiced_at
+    return stats
+
+# --- Consistency checker ---
+
+def rebuild(db: Session, user_id: int):
+    """
+    Recomputes a user's aggregates from raw sessions (full tier only). Returns
+    ({exercise_id: values}, user_values).
+    """
+    sessions = (
+        db.query(models.Session.exercise_id, models.Session.score, models.Session.jitter_percent, models.Session.created_at,
+                 models.Session.metrics_json)
+        .filter(models.Session.user_id == user_id)
+        .order_by(models.Session.created_at.asc(), models.Session.id.asc())
+        .all()
+    )
+    per_exercise = {}
+    user = models.User(sessions_count=0, score_ewma=None)
+    for exercise_id, score, jitter, created_at, metrics in sessions:
+        if (metrics or {}).get("tier") == "preview":
+            continue # Folded once refined
+        stats = per_exercise.get(exercise_id)
+        if stats is None:
+            stats = per_exercise[exercise_id] = models.UserExerciseStats(
+                user_id=user_id, exercise_id=exercise_id, times_performed=0, avg_score=0.0, score_m2=0.0,
+                jitter_count=0, jitter_mean=0.0, jitter_m2=0.0
+            )
+        _fold(stats, user, score, jitter)
+        stats.last_practiced_at = created_at
+    for stats in per_exercise.values():
+        stats.efficacy_rating = efficacy(stats)
+    return per_exercise, user
+
+STAT_FIELDS = ("times_performed", "avg_score", "score_m2", "score_ewma", "jitter_count", "jitter_mean",
+               "jitter_m2", "jitter_ewma", "efficacy_rating", "last_practiced_at")
+
+def _differs(a, b, tolerance: float) -> bool:
+    if a is None or b is None:
+        return a is not b
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return abs(a - b) > tolerance * max(1.0, abs(a), abs(b))
+    return a != b
+
+def check_user(db: Session, user: models.User, repair: bool = False, tolerance: float = 1e-6) -> list:
+    """Compares stored aggregates with a rebuild. Returns a list of mismatch descriptions."""
+    expected, expected_user = rebuild(db, user.id)
+    stored = {s.exercise_id: s for s in db.query(models.UserExerciseStats).filter(models.UserExerciseStats.user_id == user.id)}
+    problems = []
+
+    for exercise_id in sorted(set(expected) | set(stored), key=lambda e: (e is None, e)):
+        want, have = expected.get(exercise_id), stored.get(exercise_id)
+        if have is None:
+            problems.append(f"user {user.id} exercise {exercise_id}: missing stats row")
+            if repair:
+                db.add(want)
+            continue
+        if want is None:
+            problems.append(f"user {user.id} exercise {exercise_id}: stats row without sessions")
+            if repair:
+                db.delete(have)
+            continue
+        for field in STAT_FIELDS:
+            if _differs(getattr(have, field), getattr(want, field), tolerance):
+                problems.append(f"user {user.id} exercise {exercise_id}: {field} {getattr(have, field)} != {getattr(want, field)}")
+                if repair:
+                    setattr(have, field, getattr(want, field))
+
+    for field in ("sessions_count", "score_ewma"):
+        if _differs(getattr(user, field), getattr(expected_user, field), tolerance):
+            problems.append(f"user {user.id}: {field} {getattr(user, field)} != {getattr(expected_user, field)}")
+            if repair:
+                setattr(user, field, getattr(expected_user, field))
+    return problems
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verify (or rebuild) the learning aggregates from raw sessions.")
+    parser.add_argument("--check", action="store_true", help="Report mismatches (default)")
+    parser.add_argument("--repair", action="store_true", help="Rewrite mismatching aggregates")
+    parser.add_argument("--user-id", type=int, help="Only this user")
+    parser.add_argument("--tolerance", type=float, default=1e-6, help="Relative tolerance for float fields")
+    args = parser.parse_args()
+
+    from . import migrations
+    migrations.upgrade(database.engine)
+
+    db = database.SessionLocal()
+    try:
+        query = db.query(models.User)
+        if args.user_id:
+            query = query.filter(models.User.id == args.user_id)
+        total = 0
+        for user in query.order_by(models.User.id).all():
+            problems = check_user(db, user, repair=args.repair, tolerance=args.tolerance)
+            for problem in problems:
+                print(problem)
+            total += len(problems)
+            if args.repair:
+                db.commit()
+        print(f"{total} mismatches{' repaired' if args.repair and total else ''}.")
+        raise SystemExit(1 if total and not args.repair else 0)
+    finally:
+        db.close()
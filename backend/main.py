@@ -1,26 +1,67 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form
-from fastapi.responses import FileResponse
+from . import warmup # Must come first: configures the numba cache before librosa is imported
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Form, BackgroundTasks, Request, Response, Query
+from fastapi.responses import FileResponse, StreamingResponse, JSONResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
 from fastapi.middleware.cors import CORSMiddleware
 from typing import List
 import shutil
 import os
 import tempfile
+import json
+import time
 from datetime import datetime
+from contextlib import asynccontextmanager
+import anyio
+import asyncio
 
-from . import models, database, schemas, gamification
-from .analysis.breath import analyze_breath_stability
-from .analysis.quality import analyze_health
-from .analysis.pitch import analyze_pitch, analyze_pitch_accuracy
-from .intelligence.ai_wrapper import generate_feedback, generate_performance_review
+from . import models, database, schemas, catalog, features, storage, admission, scheduler, jobs, pipeline, batch, analyzers, roles, instrumentation, migrations, trends, learning, recommend
+from .instrumentation import span
 from .intelligence.knowledge import KNOWLEDGE_BASE
 from .audio.synth import generate_scale_audio
 import math
 
-models.Base.metadata.create_all(bind=database.engine)
-
-app = FastAPI(title="VocalCoach AI API")
+# Analysis workers pay the DSP/AI import cost at startup instead of on the first request
+if roles.ROLE == roles.ROLE_ANALYSIS:
+    analyzers.preload()
+
+# Size of the threadpool that runs sync endpoints and background tasks (0 = AnyIO default, 40)
+THREADPOOL_SIZE = int(os.getenv("VOCALCOACH_THREADPOOL", "0"))
+# Apply pending schema migrations on startup. With a shared database, deployments can set 0
+# and run `python -m backend.migrations` once before rolling out the API nodes.
+AUTO_MIGRATE = os.getenv("VOCALCOACH_AUTO_MIGRATE", "1") == "1"
+# Set by serve.py: the pre-forking parent already migrated, loaded the catalog and warmed up
+PRELOADED = False
+
+async def refresh_catalog():
+    """Picks up exercise changes made by other processes (seed.py, other workers/nodes)."""
+    while True:
+        await asyncio.sleep(catalog.REFRESH_SECONDS)
+        try:
+            await anyio.to_thread.run_sync(catalog.refresh_if_changed)
+        except Exception as e:
+            print(f"Catalog refresh failed: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if AUTO_MIGRATE and not PRELOADED:
+        migrations.upgrade(database.engine)
+    if THREADPOOL_SIZE > 0:
+        anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+    if not PRELOADED:
+        catalog.reload() # Pre-forked workers share the parent's snapshot until it changes
+    catalog_refresher = asyncio.create_task(refresh_catalog())
+    # Compile numba kernels / init Praat before we report ready (see GET /ready)
+    warmup.start_background_warm_up()
+    yield
+    catalog_refresher.cancel()
+
+app = FastAPI(title="VocalCoach AI API", lifespan=lifespan)
+
+# Upload byte / duration limits, checked while the body streams in (inside CORS: 413s keep their headers)
+app.add_middleware(admission.AdmissionMiddleware)
 
 # CORS Setup
 origins = [
@@ -34,8 +75,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"], # Trend pagination, catalog revalidation
 )
 
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    """Request latency histogram + opt-in per-stage breakdown (X-Debug-Timings: 1)."""
+    debug = request.headers.get(instrumentation.DEBUG_HEADER) == "1"
+    if not instrumentation.ENABLED and not debug:
+        return await call_next(request)
+
+    trace = instrumentation.start_trace() if debug else None
+    started = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - started
+
+    if instrumentation.ENABLED:
+        route = request.scope.get("route")
+        instrumentation.REQUEST_SECONDS.observe(
+            elapsed, method=request.method, route=route.path if route else "unmatched", status=response.status_code
+        )
+    if debug:
+        response.headers["Server-Timing"] = instrumentation.server_timing(trace, elapsed)
+    return response
+
 # Mount Static Files (for exercise audio)
 app.mount("/static", StaticFiles(directory="backend/static"), name="static")
 
@@ -47,6 +110,24 @@ def read_root():
 def health_check():
     return {"status": "ok"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus scrape endpoint (per worker process)."""
+    return PlainTextResponse(instrumentation.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/ready")
+def readiness_check():
+    """
+    Readiness probe: 503 until this worker has warmed up its analyzers.
+    (/health stays a pure liveness check.) Reports per-worker startup timings.
+    A worker whose warm-up calls failed still serves (status "degraded", see "failed").
+    """
+    status = ("degraded" if warmup.STATE["error"] else "ready") if warmup.STATE["ready"] else "warming_up"
+    state = dict(warmup.STATE, status=status)
+    if not state["ready"]:
+        return JSONResponse(status_code=503, content=state)
+    return state
+
 # --- Users ---
 
 @app.post("/users/", response_model=schemas.User)
@@ -62,13 +143,18 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(database.get_db)
         settings_genre=user.settings_genre
     )
     db.add(db_user)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # Concurrent sign-up with the same nickname won the unique index -> log in as that user
+        db.rollback()
+        return db.query(models.User).filter(models.User.nickname == user.nickname).first()
     db.refresh(db_user)
     return db_user
 
 # --- Analysis Endpoints ---
 
-@app.post("/analyze/breath")
+@app.post("/analyze/breath", dependencies=[Depends(roles.require_analysis), Depends(admission.admit("/analyze/breath", "breath"), scope="function")])
 def analyze_breath_endpoint(difficulty: int = 1, file: UploadFile = File(...)):
     # Save temp file
     temp_filename = f"temp_{file.filename}"
@@ -77,14 +163,14 @@ def analyze_breath_endpoint(difficulty: int = 1, file: UploadFile = File(...)):
         
     try:
         # Run analysis
-        result = analyze_breath_stability(temp_filename, difficulty)
+        result = analyzers.analyze_breath_stability(temp_filename, difficulty)
         return result
     finally:
         # Cleanup
         if os.path.exists(temp_filename):
             os.remove(temp_filename)
 
-@app.post("/analyze/health")
+@app.post("/analyze/health", dependencies=[Depends(roles.require_analysis), Depends(admission.admit("/analyze/health", "health"), scope="function")])
 def analyze_health_endpoint(
     level: int = 1,
     voice_type: str = "Unknown",
@@ -97,7 +183,7 @@ def analyze_health_endpoint(
         
     try:
         # Run analysis
-        result = analyze_health(temp_filename)
+        result = analyzers.analyze_health(temp_filename)
         
         # Generate AI Feedback if successful
         if result.get("success"):
@@ -106,7 +192,7 @@ def analyze_health_endpoint(
             
             # Assuming this is a general health check or a specific exercise
             # We can pass "Vocal Health Check" as the exercise name
-            feedback = generate_feedback("Vocal Health Check", metrics, user_context)
+            feedback = analyzers.generate_feedback("Vocal Health Check", metrics, user_context)
             result["ai_feedback"] = feedback
             
         return result
@@ -118,16 +204,11 @@ def analyze_health_endpoint(
 from fastapi import Form, File, UploadFile
 
 @app.get("/user-uploads")
-def get_user_uploads():
-    """Lists audio files in the user_uploads directory."""
-    upload_dir = "backend/user_uploads"
-    if not os.path.exists(upload_dir):
-        return []
-    
-    files = [f for f in os.listdir(upload_dir) if f.endswith(('.mp3', '.wav', '.m4a'))]
-    return files
+def get_user_uploads(db: Session = Depends(database.get_db)):
+    """Lists stored recordings that still have audio (from the upload index, see storage.py)."""
+    return storage.list_names(db)
 
-@app.post("/analyze/performance")
+@app.post("/analyze/performance", dependencies=[Depends(roles.require_analysis), Depends(admission.admit("/analyze/performance", "performance"), scope="function")])
 def analyze_performance_endpoint(
     file: UploadFile = File(None),
     use_demo: bool = Form(False),
@@ -137,6 +218,7 @@ def analyze_performance_endpoint(
     voice_type: str = "Unknown"
 ):
     temp_filename = ""
+    analysis_path = ""
     
     # Handle Input (File vs Demo vs Local Upload)
     if use_demo:
@@ -148,26 +230,27 @@ def analyze_performance_endpoint(
             shutil.copy(demo_source, tmp.name)
             temp_filename = tmp.name
     elif local_filename:
-        # Use a file from user_uploads
-        source_path = os.path.join("backend/user_uploads", local_filename)
-        if not os.path.exists(source_path):
+        # Use a stored upload. Analyzers only read, so no temp copy needed.
+        source_path = storage.find_local(local_filename)
+        if source_path is None:
             return {"success": False, "error": f"File '{local_filename}' not found in user_uploads."}
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
-             shutil.copy(source_path, tmp.name)
-             temp_filename = tmp.name
+        analysis_path = source_path
     elif file:
         with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
             shutil.copyfileobj(file.file, tmp)
             temp_filename = tmp.name
     else:
         return {"success": False, "error": "No file provided."}
+
+    analysis_path = analysis_path or temp_filename
         
     try:
-        # 1. Pitch Analysis
-        pitch_result = analyze_pitch(temp_filename)
-        
-        # 2. Vocal Health Analysis
-        health_result = analyze_health(temp_filename)
+        with instrumentation.track_processing("performance", analysis_path):
+            # 1. Pitch Analysis
+            pitch_result = analyzers.analyze_pitch(analysis_path)
+            
+            # 2. Vocal Health Analysis
+            health_result = analyzers.analyze_health(analysis_path)
         
         # Combine Metrics
         combined_metrics = {}
@@ -180,7 +263,7 @@ def analyze_performance_endpoint(
             
         # 3. AI Coach Review
         user_context = {"level": level, "voice_type": voice_type}
-        feedback = generate_performance_review(combined_metrics, user_context)
+        feedback = analyzers.generate_performance_review(combined_metrics, user_context)
         
         return {
             "success": True,
@@ -193,10 +276,39 @@ def analyze_performance_endpoint(
     except Exception as e:
         return {"success": False, "error": str(e)}
     finally:
-        if os.path.exists(temp_filename):
+        if temp_filename and os.path.exists(temp_filename):
             os.remove(temp_filename)
 
-@app.post("/analyze/range")
+@app.post("/analyze/batch", dependencies=[Depends(roles.require_analysis)])
+def analyze_batch_endpoint(request: schemas.BatchRequest):
+    """
+    Batch-analyzes files in user_uploads (directory or glob relative to it) across a
+    process pool. Streams one JSON object per line (NDJSON) as files finish.
+    With resume=True, content already recorded in the progress manifest is skipped.
+    """
+    upload_dir = os.path.normpath(batch.UPLOAD_DIR)
+    target = os.path.normpath(os.path.join(upload_dir, request.target or ""))
+    if target != upload_dir and not target.startswith(upload_dir + os.sep):
+        raise HTTPException(status_code=400, detail="Target must be inside user_uploads.")
+
+    files = batch.collect_files(target)
+    manifest_path = batch.DEFAULT_MANIFEST if request.resume else None
+    # One analysis process per CPU at most: more only adds memory and contention
+    workers = min(request.workers or os.cpu_count() or 1, os.cpu_count() or 1)
+
+    def acquire_slot(path):
+        # Each file waits for a batch-class worker slot (runs on the stream's worker thread)
+        cost = admission.estimate_cost("batch", instrumentation.audio_duration(path))
+        job = anyio.from_thread.run(scheduler.scheduler.acquire, "batch", "batch", cost)
+        return lambda: scheduler.scheduler.release_threadsafe(job)
+
+    def stream():
+        for record in batch.run_batch(files, workers, manifest_path, acquire_slot):
+            yield json.dumps(record) + "\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.post("/analyze/range", dependencies=[Depends(roles.require_analysis), Depends(admission.admit("/analyze/range", "range"), scope="function")])
 def analyze_range_endpoint(file: UploadFile = File(...)):
     """
     Endpoint for the Range Finder.
@@ -207,7 +319,7 @@ def analyze_range_endpoint(file: UploadFile = File(...)):
         temp_filename = tmp.name
         
     try:
-        result = analyze_pitch(temp_filename)
+        result = analyzers.analyze_pitch(temp_filename)
         
         if result.get("success"):
             metrics = result.get("metrics", {})
@@ -248,13 +360,25 @@ def analyze_range_endpoint(file: UploadFile = File(...)):
         if os.path.exists(temp_filename):
             os.remove(temp_filename)
 
+# The hot read-only endpoints (this one, /exercises/{id}/pattern, /stats/trends)
+# use the async session: they run on the event loop instead of waiting for (and occupying)
+# a threadpool slot next to running analyses.
+
 @app.get("/users/{user_id}", response_model=schemas.User)
-def read_user(user_id: int, db: Session = Depends(database.get_db)):
-    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+async def read_user(user_id: int, db: AsyncSession = Depends(database.get_async_db)):
+    db_user = await db.get(models.User, user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return db_user
 
+@app.get("/users/{user_id}/recommendations")
+def get_recommendations(user_id: int, limit: int = Query(3, ge=1, le=20), db: Session = Depends(database.get_db)):
+    """Next exercises for the user, ranked from the cohort efficacy table and their own progress."""
+    db_user = db.query(models.User).filter(models.User.id == user_id).first()
+    if db_user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return recommend.recommend(db, db_user, limit)
+
 @app.put("/users/{user_id}", response_model=schemas.User)
 def update_user(user_id: int, user_update: schemas.UserUpdate, db: Session = Depends(database.get_db)):
     db_user = db.query(models.User).filter(models.User.id == user_id).first()
@@ -269,85 +393,109 @@ def update_user(user_id: int, user_update: schemas.UserUpdate, db: Session = Dep
     if user_update.settings_genre is not None:
         db_user.settings_genre = user_update.settings_genre
         
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Nickname already taken")
     db.refresh(db_user)
     return db_user
 
 @app.get("/stats/trends")
-def get_stats_trends(user_id: int, db: Session = Depends(database.get_db)):
+async def get_stats_trends(
+    response: Response,
+    user_id: int,
+    start: datetime = None,
+    end: datetime = None,
+    bucket: str = None,
+    limit: int = Query(trends.DEFAULT_LIMIT, ge=1, le=trends.MAX_LIMIT),
+    cursor: str = None,
+    format: str = "rows",
+    db: AsyncSession = Depends(database.get_async_db)
+):
     """
     Returns time-series data for the user's sessions.
+    - start / end: optional time range (ISO datetimes, end exclusive)
+    - bucket: day | week | month -> per-period count and avg/min/max of score and jitter
+    - limit / cursor: the newest `limit` points come first; pass the X-Next-Cursor response
+      header as `cursor` to fetch the next older page (header absent = no more data)
+    - format: rows (list of objects) | columnar (one array per field)
     """
-    sessions = db.query(models.Session).filter(models.Session.user_id == user_id).order_by(models.Session.created_at.asc()).all()
-    
-    data = []
-    for s in sessions:
-        jitter = 0.0
-        if s.metrics_json and isinstance(s.metrics_json, dict):
-            jitter = s.metrics_json.get("health", {}).get("jitter_percent", 0.0)
-            
-        data.append({
-            "date": s.created_at.isoformat(),
-            "score": s.score,
-            "exercise_id": s.exercise_id,
-            "jitter": jitter
-        })
+    if format not in trends.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(trends.FORMATS)}")
+    try:
+        # The trends queries are shared with sync callers; run_sync executes them on the async connection
+        if bucket:
+            data, next_cursor = await db.run_sync(trends.bucket_rows, user_id, bucket, start, end, limit, cursor)
+            fields = trends.BUCKET_FIELDS
+        else:
+            data, next_cursor = await db.run_sync(trends.session_rows, user_id, start, end, limit, cursor)
+            fields = trends.ROW_FIELDS
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    if format == "columnar":
+        return trends.to_columnar(data, fields)
     return data
 
+@app.get("/stats/summary", response_model=List[schemas.ExerciseStats])
+def get_stats_summary(user_id: int, db: Session = Depends(database.get_db)):
+    """
+    Per-exercise summary (count, mean/std and trend of score and jitter, efficacy) read
+    straight from the learning rollups.
+    """
+    rows = db.query(models.UserExerciseStats).filter(models.UserExerciseStats.user_id == user_id).order_by(models.UserExerciseStats.exercise_id).all()
+    return [
+        {
+            "exercise_id": r.exercise_id,
+            "times_performed": r.times_performed,
+            "avg_score": round(r.avg_score, 1),
+            "score_std": round(learning.std(r.times_performed, r.score_m2), 2),
+            "score_trend": round(r.score_ewma, 1) if r.score_ewma is not None else None,
+            "jitter_avg": round(r.jitter_mean, 3) if r.jitter_count else None,
+            "jitter_trend": round(r.jitter_ewma, 3) if r.jitter_ewma is not None else None,
+            "efficacy_rating": r.efficacy_rating,
+            "last_practiced_at": r.last_practiced_at
+        }
+        for r in rows
+    ]
+
 # --- Exercises ---
 
+def catalog_response(request: Request, payload: catalog.Payload) -> Response:
+    """Pre-serialized catalog JSON with its ETag; 304 if the client already has this version."""
+    # no-cache = "revalidate every time": browsers send If-None-Match and mostly get a 304
+    headers = {"ETag": payload.etag, "Cache-Control": "no-cache"}
+    if catalog.etag_matches(request.headers.get("if-none-match"), payload.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=payload.body, media_type="application/json", headers=headers)
+
 @app.get("/exercises/", response_model=List[schemas.Exercise])
-def read_exercises(skip: int = 0, limit: int = 100, db: Session = Depends(database.get_db)):
-    exercises = db.query(models.Exercise).offset(skip).limit(limit).all()
-    
-    # Inject Audio URL if missing
-    for ex in exercises:
-        # If exercise has a pattern, the audio is generated on-demand or pre-generated via a specific endpoint
-        if ex.pattern:
-             ex.instructions_audio_url = f"http://localhost:8000/exercises/{ex.id}/audio"
-        elif not ex.instructions_audio_url:
-            filename = f"{ex.id}_{ex.name.replace(' ', '_').lower()}.mp3"
-            # Using absolute URL for localhost dev
-            ex.instructions_audio_url = f"http://localhost:8000/static/exercises/{filename}"
-            
-    return exercises
+async def read_exercises(request: Request, skip: int = 0, limit: int = 100):
+    """Served from the in-memory catalog (see catalog.py), no database access."""
+    return catalog_response(request, catalog.get().listing(skip, limit))
 
 @app.get("/exercises/{exercise_id}/pattern")
-def get_exercise_pattern(exercise_id: int, user_id: int = None, db: Session = Depends(database.get_db)):
+async def get_exercise_pattern(request: Request, exercise_id: int, user_id: int = None, db: AsyncSession = Depends(database.get_async_db)):
     """
     Returns the note sequence (metadata) for a generated exercise.
     This tells the frontend WHEN and WHICH notes to display on the Piano Roll.
+    Sequences are precomputed per root note in the catalog.
     """
-    exercise = db.query(models.Exercise).filter(models.Exercise.id == exercise_id).first()
-    if not exercise:
+    exercises = catalog.get()
+    if exercise_id not in exercises.by_id:
         raise HTTPException(status_code=404, detail="Exercise not found")
 
-    if not exercise.pattern:
-        return {"sequence": []} # Static files have no known pattern yet
-
     # Determine Root Note based on User Voice Type
-    root_note = "C4" # Default fallback
-    
+    root_note = catalog.DEFAULT_ROOT
     if user_id:
-        user = db.query(models.User).filter(models.User.id == user_id).first()
+        user = await db.get(models.User, user_id)
         if user and user.voice_type:
-             # Lookup default root for this voice type
-             fache = KNOWLEDGE_BASE["voice_classification"]["fache"]
-             if user.voice_type in fache:
-                 root_note = fache[user.voice_type].get("default_root", "C4")
-    
-    # Generate Metadata (Fast, no audio generation)
-    pattern_data = exercise.pattern
-    result = generate_scale_audio(
-        root_note=root_note,
-        pattern=pattern_data.get("intervals", []),
-        duration_per_note=pattern_data.get("duration", 0.8),
-        output_path=None,
-        with_drone=False,
-        generate_audio=False
-    )
-    
-    return result
+            root_note = catalog.root_for_voice_type(user.voice_type)
+
+    return catalog_response(request, exercises.pattern(exercise_id, root_note))
 
 @app.get("/exercises/{exercise_id}/audio")
 def get_exercise_audio(exercise_id: int, user_id: int = None, db: Session = Depends(database.get_db)):
@@ -397,13 +545,32 @@ def get_exercise_audio(exercise_id: int, user_id: int = None, db: Session = Depe
 
 # --- Sessions & Gamification ---
 
-@app.post("/sessions/", response_model=schemas.SessionResponse)
+def session_job(tier: str, session_id: int, upload_id: int) -> tuple:
+    """(kind, payload, dedupe key) of the queued work after a session is stored: refinement or transcode."""
+    if tier == pipeline.TIER_PREVIEW:
+        return "sessions.refine", {"session_id": session_id, "upload_id": upload_id}, f"sessions.refine:{session_id}"
+    return "storage.transcode", {"upload_id": upload_id}, None
+
+@app.post("/sessions/", response_model=schemas.SessionResponse, dependencies=[Depends(roles.require_analysis), Depends(admission.admit("/sessions/", "sessions"), scope="function")])
 def create_session(
+    request: Request,
+    background_tasks: BackgroundTasks,
     user_id: int = Form(...),
     exercise_id: int = Form(...),
     file: UploadFile = File(...),
+    tier: str = Form(pipeline.TIER_PREVIEW),
     db: Session = Depends(database.get_db)
 ):
+    """
+    Stores and scores an exercise recording.
+    tier="preview" (default) answers with a quick estimate and refines the same session
+    in the background, in this process or on a queue worker with JOB_QUEUE set
+    (poll GET /sessions/{id} until tier == "full").
+    tier="full" runs the complete analysis before answering.
+    """
+    if tier not in pipeline.TIERS:
+        raise HTTPException(status_code=400, detail=f"Unknown tier '{tier}'. Use one of: {', '.join(pipeline.TIERS)}")
+
     # 1. Get User and Exercise
     user = db.query(models.User).filter(models.User.id == user_id).first()
     exercise = db.query(models.Exercise).filter(models.Exercise.id == exercise_id).first()
@@ -411,118 +578,92 @@ def create_session(
     if not user or not exercise:
         raise HTTPException(status_code=404, detail="User or Exercise not found")
 
-    # 2. Save Uploaded File (Persistent storage for session history)
-    upload_dir = "backend/user_uploads"
-    os.makedirs(upload_dir, exist_ok=True)
-    
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"{timestamp}_{file.filename}"
-    file_path = os.path.join(upload_dir, filename)
-    
-    # We keep this file permanently, so open/write is correct here, no tempfile needed unless we want atomic write.
-    # But standard open is fine for this MVP.
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # Loaded attributes stay readable; the pooled connection is not held during the analysis
+    db.close()
+
+    # 2. Store the upload (content-addressed: the same recording is kept once, see storage.py)
+    with span("session.upload_write"):
+        upload = storage.store_upload(file.file, file.filename)
+    file_path = upload["path"]
 
     # 3. Run Analysis
     # Note: We analyze the PERMANENT file here, not a temp file, because we want to keep it.
-    health_result = analyze_health(file_path)
-    
-    # Pitch Analysis (Standard or Pattern-based)
-    pitch_result = {}
-    accuracy_result = {}
-    
-    if exercise.pattern:
-        # Pattern-based matching
-        accuracy_result = analyze_pitch_accuracy(file_path, exercise.pattern)
-        if accuracy_result.get("success"):
-             score = int(accuracy_result.get("accuracy_score", 0))
-             pitch_result = {"success": True, "metrics": accuracy_result} # Pack for AI context
+    # The preview tier skips the AI call, the refinement job adds the feedback later.
+    with instrumentation.track_processing(f"sessions.{tier}", file_path):
+        if tier == pipeline.TIER_PREVIEW:
+            analysis = pipeline.run_preview(file_path, exercise)
+            ai_feedback = None
         else:
-             score = 0
-             pitch_result = analyze_pitch(file_path) # Fallback to get some stats
+            analysis = pipeline.run_full(file_path, exercise)
+            user_context = pipeline.history_context(user)
+            ai_feedback = pipeline.ai_feedback_for(exercise, analysis, user_context)
+
+    # Keep the f0 track with the session (replay / re-scoring without decoding again)
+    contour = pipeline.encode_contour(analysis)
+
+    def save(write_db):
+        session_id = pipeline.persist_session(write_db, user_id, exercise, analysis, tier, file_path, ai_feedback, contour, upload["id"])
+        # JOB_QUEUE=db: the job row commits with the session (outbox), never one without the other
+        kind, payload, _ = session_job(tier, session_id, upload["id"])
+        return session_id, jobs.ENABLED and jobs.enqueue_in(write_db, kind, payload)
+
+    # 4. Save Session + Gamification (streak, XP) + learning rollups (+ the job) in one transaction
+    with span("session.db_commit"):
+        session_id, job_queued = database.run_write(save)
+    db_session = db.query(models.Session).filter(models.Session.id == session_id).one()
+
+    if jobs.ENABLED:
+        # Shared queue: an analysis worker (python -m backend.worker) refines, then transcodes
+        if not job_queued:
+            kind, payload, key = session_job(tier, session_id, upload["id"])
+            try:
+                jobs.enqueue(kind, payload, key)
+            except Exception as e:
+                # The session is stored: the workers' orphan pass enqueues the refinement again
+                # (worker.requeue_orphaned_refinements), a missed transcode waits for retention
+                print(f"Enqueueing {kind} for session {session_id} failed: {e}")
     else:
-        # Standard Pitch Analysis
-        pitch_result = analyze_pitch(file_path)
-        score = 70  # Start Score for standard exercises
-        
-        # Pitch Scoring Logic for standard exercises
-        if pitch_result.get("success"):
-            metrics = pitch_result["metrics"]
-            if metrics.get("pitch_stability_std", 10.0) < 2.0:
-                score += 10
-    
-    # Health Scoring Modifier
-    if health_result.get("success"):
-        overall_health = health_result["assessment"]["overall"]
-        if overall_health == "green":
-            if not exercise.pattern: score += 20 # Bonus only for non-accuracy exercises
-        elif overall_health == "red":
-            score -= 20 # Penalty always applies
-            
-    # Clamp Score
-    score = max(0, min(100, score))
-
-    # 5. AI Feedback
-    metrics_for_ai = {}
-    if health_result.get("success"):
-        metrics_for_ai.update(health_result["metrics"])
-    if pitch_result.get("success"):
-        metrics_for_ai.update(pitch_result["metrics"])
-    
-    metrics_for_ai["score"] = score
-    
-    # History Injection for AI
-    history = db.query(models.Session).filter(models.Session.user_id == user_id).order_by(models.Session.id.desc()).limit(5).all()
-    avg_score = 0
-    if history:
-        avg_score = sum([s.score for s in history]) / len(history)
-
-    user_context = {
-        "level": user.level,
-        "voice_type": user.voice_type or "Unknown",
-        "streak": user.current_streak,
-        "history_avg_score": round(avg_score, 1),
-        "history_count": len(history)
-    }
-    
-    ai_feedback = generate_feedback(exercise.name, metrics_for_ai, user_context)
-
-    # 6. Gamification Logic
-    gamification.update_streak(user, db)
-    
-    xp_earned = gamification.calculate_xp(
-        session_score=score,
-        difficulty=exercise.difficulty,
-        current_streak=user.current_streak
-    )
-    
-    # Update User Stats
-    user.xp += xp_earned
-    user.level = gamification.calculate_level(user.xp)
-    
-    # 7. Save Session
-    db_session = models.Session(
-        user_id=user_id,
-        exercise_id=exercise_id,
-        score=score,
-        audio_url=file_path,
-        metrics_json={
-            "health": health_result.get("metrics"),
-            "pitch": pitch_result.get("metrics"),
-            "assessment": health_result.get("assessment")
-        },
-        ai_feedback={"text": ai_feedback}
-    )
-    db.add(db_session)
-    db.commit()
-    db.refresh(user)
+        if tier == pipeline.TIER_PREVIEW:
+            # Queued as session-class work behind the live jobs (scheduler.py)
+            refine_cost = admission.estimate_cost("sessions.refine", request.state.audio_seconds)
+            background_tasks.add_task(scheduler.run, "sessions.refine", user_id, refine_cost, pipeline.refine_session, db_session.id)
+        # Runs after the refinement (background tasks run in order): FLAC at the analysis rate
+        background_tasks.add_task(storage.transcode_upload, upload["id"])
     
-    return {
-        "xp_earned": xp_earned,
-        "new_total_xp": user.xp,
-        "new_level": user.level,
-        "streak": user.current_streak,
-        "score": score,
-        "feedback": ai_feedback
-    }
+    return pipeline.session_response(db_session)
+
+@app.get("/sessions/{session_id}", response_model=schemas.SessionResponse)
+def read_session(session_id: int, db: Session = Depends(database.get_db)):
+    """Current state of a session. Preview sessions are upgraded in place to tier "full"."""
+    db_session = db.query(models.Session).filter(models.Session.id == session_id).first()
+    if db_session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return pipeline.session_response(db_session)
+
+@app.get("/sessions/{session_id}/contour")
+def get_session_contour(
+    session_id: int,
+    max_points: int = Query(None, ge=2, le=100_000),
+    format: str = "json",
+    db: Session = Depends(database.get_db)
+):
+    """
+    Pitch contour of a session for replay / take comparison.
+    - max_points: downsample to at most this many points (default: every analysis frame)
+    - format: json (columnar: f0_hz, voiced, rms_db; point i starts at i * frame_seconds)
+      | npz (the stored compressed file, see features.py)
+    """
+    if format not in ("json", "npz"):
+        raise HTTPException(status_code=400, detail="format must be one of json, npz")
+    db_session = db.query(models.Session).filter(models.Session.id == session_id).first()
+    if db_session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    if not db_session.contour_path or not os.path.exists(db_session.contour_path):
+        raise HTTPException(status_code=404, detail="No contour stored for this session")
+
+    if format == "npz":
+        return FileResponse(db_session.contour_path, media_type="application/octet-stream", filename=f"session_{session_id}{features.SUFFIX}")
+    contour = features.load(db_session.contour_path)
+    if max_points:
+        contour = features.downsample(contour, max_points)
+    return {"session_id": session_id, **features.to_json(contour)}
@@ -0,0 +1,202 @@
+"""
+Versioned schema migrations - the only place the schema is created or changed.
+
+Step 0 creates the tables of the current models that are missing (create_all never touches
+existing tables). Changes to existing tables (indexes, new columns) go here as numbered
+steps. Applied versions are recorded in `schema_migrations`, so each step runs once per
+database. Steps must be idempotent and work on SQLite and PostgreSQL. With several workers
+or API nodes starting at the same time: on PostgreSQL an advisory lock lets one process
+migrate while the others wait; on SQLite two processes may race on the same step (the
+loser's version insert fails and is ignored once the winner's record is seen; any other
+IntegrityError is raised).
+
+    python -m backend.migrations          # apply pending steps
+    python -m backend.migrations --status # list applied / pending steps
+"""
+import argparse
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import JSON, Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.exc import IntegrityError
+
+from . import database
+
+MIGRATION_LOCK_KEY = 7_362_410 # pg_advisory_lock key, any constant shared by all nodes
+
+_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations", _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String),
+    Column("applied_at", DateTime)
+)
+
+def _index_names(conn, table: str) -> dict:
+    return {ix["name"]: ix for ix in inspect(conn).get_indexes(table)}
+
+def _add_missing_columns(conn, table: str, columns):
+    existing = {column["name"] for column in inspect(conn).get_columns(table)}
+    for name, ddl in columns:
+        if name not in existing:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+
+def _000_initial_schema(conn):
+    from . import models
+    models.Base.metadata.create_all(bind=conn)
+
+def _001_history_indexes(conn):
+    # History (pipeline.history_context): WHERE user_id = ? ORDER BY id DESC LIMIT 5, reads score only
+    # -> (user_id, id, score) answers it from the index alone.
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_sessions_user_history ON sessions (user_id, id, score)"))
+    # Trends (/stats/trends): WHERE user_id = ? ORDER BY created_at
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_sessions_user_created_at ON sessions (user_id, created_at)"))
+
+    # Nicknames are the login key (create_user looks them up on every login) -> unique.
+    # Older databases may contain duplicates from concurrent sign-ups: the oldest account
+    # keeps the nickname, later ones get their id appended.
+    existing = _index_names(conn, "users").get("ix_users_nickname")
+    if existing and existing["unique"]:
+        return
+    duplicates = conn.execute(text(
+        "SELECT nickname, MIN(id) FROM users WHERE nickname IS NOT NULL GROUP BY nickname HAVING COUNT(*) > 1"
+    )).all()
+    for nickname, keep_id in duplicates:
+        print(f"Migration: renaming duplicate users with nickname '{nickname}' (keeping id {keep_id})")
+        conn.execute(
+            text("UPDATE users SET nickname = nickname || '-' || CAST(id AS VARCHAR) WHERE nickname = :nickname AND id != :keep_id"),
+            {"nickname": nickname, "keep_id": keep_id}
+        )
+    if existing:
+        conn.execute(text("DROP INDEX ix_users_nickname"))
+    conn.execute(text("CREATE UNIQUE INDEX ix_users_nickname ON users (nickname)"))
+
+def _002_metric_columns(conn):
+    # Hot metrics as typed columns; existing rows are filled by `python -m backend.backfill`
+    _add_missing_columns(conn, "sessions", (
+        ("jitter_percent", "FLOAT"), ("shimmer_percent", "FLOAT"), ("hnr_db", "FLOAT"),
+        ("pitch_accuracy", "FLOAT"), ("health_status", "VARCHAR")
+    ))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_sessions_user_trends ON sessions (user_id, created_at, id, score, exercise_id, jitter_percent)"
+    ))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_sessions_user_health ON sessions (user_id, health_status)"))
+    # Superseded by ix_sessions_user_trends (same leading columns)
+    conn.execute(text("DROP INDEX IF EXISTS ix_sessions_user_created_at"))
+
+def _003_learning_rollups(conn):
+    # Aggregates start empty: fill them once with `python -m backend.learning --repair`
+    _add_missing_columns(conn, "user_exercise_stats", (
+        ("score_m2", "FLOAT DEFAULT 0.0"), ("score_ewma", "FLOAT"), ("jitter_count", "INTEGER DEFAULT 0"),
+        ("jitter_mean", "FLOAT DEFAULT 0.0"), ("jitter_m2", "FLOAT DEFAULT 0.0"), ("jitter_ewma", "FLOAT"),
+        ("last_practiced_at", "TIMESTAMP")
+    ))
+    _add_missing_columns(conn, "users", (("sessions_count", "INTEGER DEFAULT 0"), ("score_ewma", "FLOAT")))
+    conn.execute(text(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_user_exercise_stats_user_exercise ON user_exercise_stats (user_id, exercise_id)"
+    ))
+
+def _004_jsonb_columns(conn):
+    # PostgreSQL databases created before models.JSONType hold plain json columns
+    if conn.dialect.name != "postgresql":
+        return
+    from . import models
+    for table in models.Base.metadata.sorted_tables:
+        for column in table.columns:
+            if not isinstance(column.type, JSON):
+                continue
+            data_type = conn.execute(
+                text("SELECT data_type FROM information_schema.columns WHERE table_name = :table AND column_name = :column"),
+                {"table": table.name, "column": column.name}
+            ).scalar()
+            if data_type == "json":
+                conn.execute(text(f"ALTER TABLE {table.name} ALTER COLUMN {column.name} TYPE JSONB USING {column.name}::jsonb"))
+
+def _005_catalog_version(conn):
+    from . import models
+    models.CatalogVersion.__table__.create(bind=conn, checkfirst=True)
+
+def _006_session_contours(conn):
+    _add_missing_columns(conn, "sessions", (("contour_path", "VARCHAR"),))
+
+def _007_scoring_version(conn):
+    # NULL = scored before versioning; `python -m backend.rescore` brings those up to date
+    _add_missing_columns(conn, "sessions", (("scoring_version", "INTEGER"),))
+
+def _008_upload_index(conn):
+    from . import models
+    models.Upload.__table__.create(bind=conn, checkfirst=True)
+    _add_missing_columns(conn, "sessions", (("upload_id", "INTEGER REFERENCES uploads (id)"),))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_sessions_upload_id ON sessions (upload_id)"))
+
+def _009_job_queue(conn):
+    from . import models
+    models.Job.__table__.create(bind=conn, checkfirst=True)
+
+# (version, description, step) - append only, never renumber
+MIGRATIONS = [
+    (0, "Initial schema (missing tables)", _000_initial_schema),
+    (1, "Session history/trends indexes, unique user nickname", _001_history_indexes),
+    (2, "Typed session metric columns, covering trends index", _002_metric_columns),
+    (3, "Learning rollups in user_exercise_stats / users", _003_learning_rollups),
+    (4, "JSON columns as JSONB on PostgreSQL", _004_jsonb_columns),
+    (5, "Exercise catalog version marker", _005_catalog_version),
+    (6, "Session contour files", _006_session_contours),
+    (7, "Session scoring version", _007_scoring_version),
+    (8, "Upload index (content-addressed storage)", _008_upload_index),
+    (9, "Background job queue", _009_job_queue),
+]
+
+def applied_versions(engine) -> set:
+    _metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        return set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+@contextmanager
+def _migration_lock(engine):
+    if engine.dialect.name != "postgresql":
+        yield
+        return
+    with engine.connect() as conn:
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        conn.commit()
+        try:
+            yield
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            conn.commit()
+
+def upgrade(engine=None):
+    """Applies all pending migrations, each in its own transaction. Returns the applied versions."""
+    engine = engine or database.engine
+    newly_applied = []
+    with _migration_lock(engine):
+        done = applied_versions(engine)
+        for version, description, step in MIGRATIONS:
+            if version in done:
+                continue
+            try:
+                with engine.begin() as conn:
+                    step(conn)
+                    conn.execute(schema_migrations.insert().values(
+                        version=version, description=description, applied_at=datetime.utcnow()
+                    ))
+                print(f"Applied migration {version}: {description}")
+                newly_applied.append(version)
+            except IntegrityError:
+                # Only ignorable if another process recorded this version first; the step's own
+                # constraint violations (e.g. a unique index over duplicate rows) are real failures
+                if version not in applied_versions(engine):
+                    raise
+    return newly_applied
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply database schema migrations.")
+    parser.add_argument("--status", action="store_true", help="Only list applied and pending migrations")
+    args = parser.parse_args()
+
+    if not args.status:
+        upgrade()
+    done = applied_versions(database.engine)
+    for version, description, _ in MIGRATIONS:
+        print(f"{version:>4}  {'applied' if version in done else 'pending':<8} {description}")
@@ -1,21 +1,28 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, JSON, Float
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, JSON, Float, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from .database import Base
 from datetime import datetime
 
+# JSON on SQLite, binary JSONB on PostgreSQL (indexable, no re-parsing on read)
+JSONType = JSON().with_variant(JSONB(), "postgresql")
+
 class User(Base):
     __tablename__ = "users"
 
     id = Column(Integer, primary_key=True, index=True)
-    nickname = Column(String, index=True)
+    nickname = Column(String, unique=True, index=True) # Login key
     email = Column(String, nullable=True)
     voice_type = Column(String, nullable=True) # e.g. "Baritone", "Soprano"
     xp = Column(Integer, default=0)
     level = Column(Integer, default=1)
     current_streak = Column(Integer, default=0)
     last_practice_at = Column(DateTime, nullable=True)
-    badges = Column(JSON, default=list)
+    badges = Column(JSONType, default=list)
     settings_genre = Column(String, default="Pop") # Pop, Klassik, Rock
+    # Running aggregates maintained by learning.record_session
+    sessions_count = Column(Integer, default=0)
+    score_ewma = Column(Float, nullable=True) # Recent form (span ~5 sessions)
 
     sessions = relationship("Session", back_populates="user")
     exercise_stats = relationship("UserExerciseStats", back_populates="user")
@@ -29,11 +36,11 @@ class Exercise(Base):
     difficulty = Column(Integer, default=1) # 1-5
     is_scored = Column(Boolean, default=True)
     physiological_target = Column(String, nullable=True) # e.g. "SOVT / PTP Reduction"
-    metaphors = Column(JSON, default=dict) # {"nasal": "Denk an ein inneres Gähnen"}
+    metaphors = Column(JSONType, default=dict) # {"nasal": "Denk an ein inneres Gähnen"}
     instructions_audio_url = Column(String, nullable=True)
     
     # New fields for Multi-Layer / Scales
-    pattern = Column(JSON, nullable=True) # e.g. {"intervals": [0, 2, 4], "duration": 0.5, "sequence": ["C4", "D4"]}
+    pattern = Column(JSONType, nullable=True) # e.g. {"intervals": [0, 2, 4], "duration": 0.5, "sequence": ["C4", "D4"]}
 
     sessions = relationship("Session", back_populates="exercise")
     user_stats = relationship("UserExerciseStats", back_populates="exercise")
@@ -41,6 +48,9 @@ class Exercise(Base):
 class UserExerciseStats(Base):
     """The Learning Brain: Tracks efficacy of exercises for specific users."""
     __tablename__ = "user_exercise_stats"
+    __table_args__ = (
+        Index("ix_user_exercise_stats_user_exercise", "user_id", "exercise_id", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -49,19 +59,103 @@ class UserExerciseStats(Base):
     avg_score = Column(Float, default=0.0)
     efficacy_rating = Column(Float, default=0.0) # -1.0 to +1.0
 
+    # Running aggregates (see learning.py): Welford mean/M2 and EWMA trends
+    score_m2 = Column(Float, default=0.0)
+    score_ewma = Column(Float, nullable=True)
+    jitter_count = Column(Integer, default=0)
+    jitter_mean = Column(Float, default=0.0)
+    jitter_m2 = Column(Float, default=0.0)
+    jitter_ewma = Column(Float, nullable=True)
+    last_practiced_at = Column(DateTime, nullable=True)
+
     user = relationship("User", back_populates="exercise_stats")
     exercise = relationship("Exercise", back_populates="user_stats")
 
+class ExerciseEfficacy(Base):
+    """Cohort-level efficacy per voice type, rebuilt offline by `python -m backend.recommend --build`."""
+    __tablename__ = "exercise_efficacy"
+
+    id = Column(Integer, primary_key=True, index=True)
+    voice_type = Column(String, index=True) # "*" = all voice types
+    exercise_id = Column(Integer, ForeignKey("exercises.id"))
+    samples = Column(Integer, default=0) # Session -> next session pairs observed
+    jitter_delta = Column(Float, nullable=True) # Mean change of jitter % in the following session
+    hnr_delta = Column(Float, nullable=True) # Mean change of HNR dB in the following session
+    efficacy = Column(Float, default=0.0) # -1.0 to +1.0, shrunk towards 0 for few samples
+    built_at = Column(DateTime)
+
+class CatalogVersion(Base):
+    """Single row; bumped on every exercise change so all API processes reload their catalog (catalog.py)."""
+    __tablename__ = "catalog_version"
+
+    id = Column(Integer, primary_key=True) # Always 1
+    version = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class Upload(Base):
+    """Index of stored recordings (storage.py): one row per distinct content."""
+    __tablename__ = "uploads"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String, unique=True, index=True) # Content hash of the original upload
+    name = Column(String, unique=True, index=True) # Listed by /user-uploads, accepted as local_filename
+    path = Column(String, nullable=True) # Current file (NULL once deleted)
+    format = Column(String) # File extension of the current file: wav / mp3 / ... / flac / ogg
+    tier = Column(String, index=True) # hot (as uploaded) / warm (FLAC) / cold (Opus) / deleted
+    size_bytes = Column(Integer, default=0)
+    original_size_bytes = Column(Integer, default=0)
+    sample_rate = Column(Integer, nullable=True) # Of the transcoded file
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, default=datetime.utcnow) # Last upload of the same content
+
+class Job(Base):
+    """Durable queue of background analysis jobs (jobs.py, database backend)."""
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # Claim query: next queued job by priority, then age
+        Index("ix_jobs_claim", "status", "priority", "id"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String) # Handler name, see worker.HANDLERS
+    payload = Column(JSONType)
+    priority = Column(Integer, default=0) # Index into scheduler.PRIORITIES (0 = live)
+    status = Column(String, default="queued") # queued / running / done / failed
+    attempts = Column(Integer, default=0)
+    available_at = Column(DateTime, default=datetime.utcnow) # Retries are delayed
+    locked_by = Column(String, nullable=True) # Worker id while running
+    locked_until = Column(DateTime, nullable=True) # Lease; an expired lease is requeued
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
 class Session(Base):
     __tablename__ = "sessions"
+    __table_args__ = (
+        # Covering index for the "last 5 sessions" history lookup (see migrations.py)
+        Index("ix_sessions_user_history", "user_id", "id", "score"),
+        # Covers /stats/trends (rows and buckets) without reading the table
+        Index("ix_sessions_user_trends", "user_id", "created_at", "id", "score", "exercise_id", "jitter_percent"),
+        Index("ix_sessions_user_health", "user_id", "health_status"),
+        Index("ix_sessions_upload_id", "upload_id"), # Sessions of an upload (storage retention)
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
     exercise_id = Column(Integer, ForeignKey("exercises.id"))
     score = Column(Integer, nullable=True)
-    audio_url = Column(String, nullable=True)
-    metrics_json = Column(JSON, nullable=True) # Raw data: Jitter, Shimmer, Cents
-    ai_feedback = Column(JSON, nullable=True)
+    scoring_version = Column(Integer, nullable=True) # scoring.SCORING_VERSION the score was computed with (NULL: before versioning)
+    audio_url = Column(String, nullable=True) # Current audio file of the upload (NULL once retention deleted it)
+    upload_id = Column(Integer, ForeignKey("uploads.id"), nullable=True) # storage.py index entry
+    contour_path = Column(String, nullable=True) # features.py: compact f0/voicing/loudness track
+    metrics_json = Column(JSONType, nullable=True) # Raw data: Jitter, Shimmer, Cents
+    # Hot metrics promoted out of metrics_json for analytics (pipeline.metric_columns)
+    jitter_percent = Column(Float, nullable=True)
+    shimmer_percent = Column(Float, nullable=True)
+    hnr_db = Column(Float, nullable=True)
+    pitch_accuracy = Column(Float, nullable=True) # Pattern exercises only
+    health_status = Column(String, nullable=True) # green / yellow / red
+    ai_feedback = Column(JSONType, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User", back_populates="sessions")
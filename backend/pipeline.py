@@ -0,0 +1,367 @@
+"""
+Session analysis pipeline.
+
+Two tiers share one result schema:
+- "preview": fast YIN/RMS based estimate, returned to the user immediately.
+- "full": pYIN + DTW + Praat (+ AI feedback), refines the same session record afterwards.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+from . import models, database, gamification, analyzers, instrumentation, learning, features, scoring, storage
+from .instrumentation import span
+
+TIER_PREVIEW = "preview"
+TIER_FULL = "full"
+TIERS = (TIER_PREVIEW, TIER_FULL)
+REFINE_ERROR = "refine_error" # metrics_json key: the refinement failed for good, the preview values stay
+
+def run_full(file_path: str, exercise: models.Exercise) -> dict:
+    """Runs the full pYIN/DTW/Praat analysis and scores it. analysis["contour"]: the pYIN track."""
+    health_result = analyzers.analyze_health(file_path)
+
+    # Pitch Analysis (Standard or Pattern-based)
+    accuracy_result = None
+    contour = None
+    if exercise.pattern:
+        accuracy_result = analyzers.analyze_pitch_accuracy(file_path, exercise.pattern, with_contour=True)
+        contour = accuracy_result.pop("contour", None)
+        pitch_result = None if accuracy_result.get("success") else analyzers.analyze_pitch(file_path, with_contour=contour is None) # Fallback to get some stats
+    else:
+        pitch_result = analyzers.analyze_pitch(file_path, with_contour=True)
+    if pitch_result and contour is None:
+        contour = pitch_result.pop("contour", None)
+
+    analysis = score_analysis(exercise, health_result, pitch_result, accuracy_result)
+    analysis["contour"] = contour
+    return analysis
+
+def run_preview(file_path: str, exercise: models.Exercise) -> dict:
+    """Runs the quick preview analysis and scores it with the same rules as the full tier."""
+    preview = analyzers.analyze_preview(file_path, exercise.pattern, with_contour=True)
+    if not preview.get("success"):
+        failed = {"success": False, "error": preview.get("error")}
+        return score_analysis(exercise, failed, failed, failed if exercise.pattern else None)
+
+    analysis = score_analysis(exercise, preview["health"], preview["pitch"], preview.get("accuracy"))
+    analysis["contour"] = preview.get("contour")
+    return analysis
+
+def encode_contour(analysis: dict):
+    """Takes the analysis' f0/voicing/loudness track out and encodes it (features.py). Returns bytes or None."""
+    contour = analysis.pop("contour", None)
+    if contour is None:
+        return None
+    try:
+        with span("session.contour_encode"):
+            return features.encode(contour)
+    except Exception as e:
+        print(f"Contour encoding failed: {e}")
+        return None
+
+def write_contour(session_id: int, data: bytes):
+    """Stores an encoded track as the session's contour. Returns its path or None."""
+    if data is None:
+        return None
+    path = storage.contour_path(session_id)
+    try:
+        with span("session.contour_write"):
+            features.write(path, data)
+        return path
+    except Exception as e:
+        print(f"Contour storage failed (session {session_id}): {e}")
+        return None
+
+def score_analysis(exercise: models.Exercise, health_result: dict, pitch_result: dict, accuracy_result: dict = None) -> dict:
+    """
+    Turns raw analyzer results into a session score (weights: scoring.py).
+    Returns {"score", "health_result", "pitch_result"} where pitch_result carries the
+    accuracy metrics for pattern exercises (packed for AI context).
+    """
+    if exercise.pattern:
+        # Pattern-based matching
+        if accuracy_result and accuracy_result.get("success"):
+            score = int(accuracy_result.get("accuracy_score", 0))
+            pitch_result = {"success": True, "metrics": accuracy_result} # Pack for AI context
+        else:
+            score = 0
+    else:
+        score = scoring.STANDARD_BASE_SCORE  # Start Score for standard exercises
+
+        # Pitch Scoring Logic for standard exercises
+        if pitch_result.get("success"):
+            metrics = pitch_result["metrics"]
+            if metrics.get("pitch_stability_std", 10.0) < scoring.STABILITY_MAX_STD:
+                score += scoring.STABILITY_BONUS
+
+    # Health Scoring Modifier
+    if health_result.get("success"):
+        overall_health = health_result["assessment"]["overall"]
+        if overall_health == "green":
+            if not exercise.pattern: score += scoring.HEALTH_GREEN_BONUS # Bonus only for non-accuracy exercises
+        elif overall_health == "red":
+            score -= scoring.HEALTH_RED_PENALTY # Penalty always applies
+
+    # Clamp Score
+    score = max(0, min(100, score))
+
+    return {
+        "score": score,
+        "health_result": health_result,
+        "pitch_result": pitch_result or {}
+    }
+
+def build_metrics_json(analysis: dict, tier: str, xp_earned: int) -> dict:
+    """The Session.metrics_json layout shared by both tiers."""
+    return {
+        "tier": tier,
+        "xp_earned": xp_earned,
+        "health": analysis["health_result"].get("metrics"),
+        "pitch": analysis["pitch_result"].get("metrics"),
+        "assessment": analysis["health_result"].get("assessment")
+    }
+
+def metric_columns(metrics_json: dict) -> dict:
+    """
+    Values for the typed Session metric columns, taken from a metrics_json layout.
+    Preview sessions get no health values (NULL): the preview's perturbation estimate is
+    not Praat's, trends / recommendations / rollups must not read it as one.
+    """
+    metrics_json = metrics_json or {}
+    preview = metrics_json.get("tier") == TIER_PREVIEW
+    health = {} if preview else metrics_json.get("health") or {}
+    pitch = metrics_json.get("pitch") or {}
+    assessment = {} if preview else metrics_json.get("assessment") or {}
+    return {
+        "jitter_percent": _as_float(health.get("jitter_percent")),
+        "shimmer_percent": _as_float(health.get("shimmer_percent")),
+        "hnr_db": _as_float(health.get("hnr_db")),
+        "pitch_accuracy": _as_float(pitch.get("accuracy_score")),
+        "health_status": assessment.get("overall")
+    }
+
+def store_metrics(db_session: models.Session, metrics_json: dict):
+    """Sets metrics_json and keeps the promoted metric columns in sync with it."""
+    db_session.metrics_json = metrics_json
+    for column, value in metric_columns(metrics_json).items():
+        setattr(db_session, column, value)
+
+def _as_float(value):
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def history_context(user: models.User) -> dict:
+    """
+    User context for the AI prompt. history_avg_score is the user's recent form (EWMA with a
+    span of ~5 sessions) read from the learning rollups, no session query needed.
+    """
+    avg_score = user.score_ewma
+    count = user.sessions_count or 0
+
+    return {
+        "level": user.level,
+        "voice_type": user.voice_type or "Unknown",
+        "streak": user.current_streak,
+        "history_avg_score": round(avg_score, 1) if avg_score is not None and count else 0,
+        "history_count": min(count, 5)
+    }
+
+def ai_feedback_for(exercise: models.Exercise, analysis: dict, user_context: dict) -> str:
+    metrics_for_ai = {}
+    if analysis["health_result"].get("success"):
+        metrics_for_ai.update(analysis["health_result"]["metrics"])
+    if analysis["pitch_result"].get("success"):
+        metrics_for_ai.update(analysis["pitch_result"]["metrics"])
+
+    metrics_for_ai["score"] = analysis["score"]
+
+    return analyzers.generate_feedback(exercise.name, metrics_for_ai, user_context)
+
+def session_response(db_session: models.Session) -> dict:
+    """Serializes a session in the SessionResponse shape (used for both tiers)."""
+    metrics = db_session.metrics_json or {}
+    user = db_session.user
+    feedback = (db_session.ai_feedback or {}).get("text")
+    return {
+        "session_id": db_session.id,
+        "tier": metrics.get("tier", TIER_FULL),
+        "xp_earned": metrics.get("xp_earned", 0),
+        "new_total_xp": user.xp,
+        "new_level": user.level,
+        "streak": user.current_streak,
+        "score": db_session.score,
+        "feedback": feedback,
+        "metrics": metrics,
+        "refine_error": metrics.get(REFINE_ERROR)
+    }
+
+def persist_session(db: Session, user_id: int, exercise: models.Exercise, analysis: dict, tier: str,
+                    audio_url: str, ai_feedback: str = None, contour: bytes = None, upload_id: int = None) -> int:
+    """
+    Write step of a new session: session row, streak, XP and (tier "full") learning rollups (no commit).
+    Runs via database.run_write, possibly batched with other writes in one transaction,
+    so the user is re-read here instead of trusting the copy loaded before the analysis.
+    With an upload, audio_url is its current path (read under the write lock: the file
+    analyzed may have been transcoded meanwhile, see storage.py). contour: encode_contour's
+    bytes, written under the new session id (idempotent if the batch is retried).
+    Returns the session id.
+    """
+    if upload_id is not None:
+        audio_url = db.query(models.Upload.path).filter(models.Upload.id == upload_id).with_for_update().scalar()
+    db_session = models.Session(
+        user_id=user_id,
+        exercise_id=exercise.id,
+        score=analysis["score"],
+        scoring_version=scoring.SCORING_VERSION,
+        audio_url=audio_url,
+        upload_id=upload_id,
+        ai_feedback={"text": ai_feedback} if ai_feedback is not None else None
+    )
+    db.add(db_session)
+    db.flush() # Takes the write lock before the user totals and rollups are read
+    db_session.contour_path = write_contour(db_session.id, contour)
+    user = _locked_user(db, user_id)
+    # Stamped under the lock: the EWMA rollups fold sessions in this order, and
+    # learning.rebuild replays them by created_at (the insert default is taken before waiting)
+    db_session.created_at = datetime.utcnow()
+
+    gamification.update_streak(user, db)
+    xp_earned = gamification.calculate_xp(
+        session_score=analysis["score"],
+        difficulty=exercise.difficulty,
+        current_streak=user.current_streak
+    )
+    user.xp += xp_earned
+    user.level = gamification.calculate_level(user.xp)
+
+    store_metrics(db_session, build_metrics_json(analysis, tier, xp_earned))
+    db.flush()
+    if tier == TIER_FULL:
+        # A preview is folded into the rollups once it is refined (apply_refinement)
+        learning.record_session(db, db_session)
+    db.flush() # Later jobs of a write batch read these rows (autoflush is off)
+    return db_session.id
+
+def apply_refinement(db: Session, session_id: int, difficulty: int, analysis: dict, ai_feedback: str, contour_path: str = None):
+    """
+    Write step of refine_session: upgrades the stored preview in place and folds it into
+    the learning rollups (no commit). Returns None if the session is gone or was refined
+    meanwhile (a redelivered job: it must not be folded twice).
+    """
+    db_session = db.query(models.Session).filter(models.Session.id == session_id).first()
+    if db_session is None:
+        return None
+    db_session.ai_feedback = {"text": ai_feedback}
+    if contour_path:
+        db_session.contour_path = contour_path
+    db.flush() # Takes the write lock before the user totals and rollups are read
+    db.refresh(db_session)
+    if (db_session.metrics_json or {}).get("tier") == TIER_FULL:
+        # Refined by another delivery meanwhile: its XP and rollups stand (the feedback and
+        # contour written above come from the same full analysis)
+        return None
+    user = _locked_user(db, db_session.user_id)
+
+    # Re-award XP for the refined score (the preview XP is replaced, not added)
+    old_xp = (db_session.metrics_json or {}).get("xp_earned", 0)
+    xp_earned = gamification.calculate_xp(
+        session_score=analysis["score"],
+        difficulty=difficulty,
+        current_streak=user.current_streak
+    )
+    user.xp += xp_earned - old_xp
+    user.level = gamification.calculate_level(user.xp)
+
+    db_session.score = analysis["score"]
+    db_session.scoring_version = scoring.SCORING_VERSION
+    store_metrics(db_session, build_metrics_json(analysis, TIER_FULL, xp_earned))
+    db.flush()
+    learning.record_session(db, db_session)
+    db.flush()
+    return session_id
+
+def _locked_user(db: Session, user_id: int) -> models.User:
+    # populate_existing: a write batch may already hold this user from an earlier job.
+    # FOR NO KEY UPDATE (PostgreSQL): the session insert already holds FOR KEY SHARE on the
+    # user (foreign key), which FOR UPDATE would wait on in every concurrent writer: deadlock
+    return (
+        db.query(models.User)
+        .filter(models.User.id == user_id)
+        .with_for_update(key_share=True)
+        .populate_existing()
+        .one()
+    )
+
+def run_refinement(session_id: int) -> bool:
+    """
+    Runs the full tier on a session stored by the preview tier and upgrades the record in
+    place (score, metrics, AI feedback and the XP difference). Raises on failure.
+    Returns False if there was nothing to do (session gone or already refined: queue
+    workers may deliver a job twice).
+    """
+    db = database.SessionLocal()
+    try:
+        db_session = db.query(models.Session).filter(models.Session.id == session_id).first()
+        if not db_session or (db_session.metrics_json or {}).get("tier") == TIER_FULL:
+            return False
+        exercise = db_session.exercise
+        user = db_session.user
+        # Loaded attributes stay readable; the pooled connection is not held during the analysis
+        db.close()
+
+        with instrumentation.track_processing("sessions.refine", db_session.audio_url):
+            analysis = run_full(db_session.audio_url, exercise)
+            user_context = history_context(user) # The preview is not in the rollups yet
+            ai_feedback = ai_feedback_for(exercise, analysis, user_context)
+        # The pYIN track replaces the preview's YIN track (same file)
+        contour_path = write_contour(session_id, encode_contour(analysis))
+
+        with span("refine.db_commit"):
+            database.run_write(lambda write_db: apply_refinement(write_db, session_id, exercise.difficulty, analysis, ai_feedback, contour_path))
+        return True
+    finally:
+        db.close()
+
+def _record_refine_error(db: Session, session_id: int, error: str):
+    db_session = db.query(models.Session).filter(models.Session.id == session_id).first()
+    if db_session is None or (db_session.metrics_json or {}).get("tier") != TIER_PREVIEW:
+        return
+    # Reassigned, not mutated: the JSON column does not track changes inside the dict
+    db_session.metrics_json = dict(db_session.metrics_json, **{REFINE_ERROR: error})
+    db.flush()
+
+def mark_refinement_failed(session_id: int, error: str):
+    """
+    Records that a preview session will not be refined (metrics_json["refine_error"]), so
+    clients stop waiting for tier "full" and retention stops keeping its audio for it.
+    A later successful run_refinement replaces the metrics and with them the error.
+    """
+    database.run_write(lambda write_db: _record_refine_error(write_db, session_id, error))
+
+def pending_refinements(db: Session, older_than: timedelta, within: timedelta) -> list:
+    """
+    Preview sessions stored between `within` and `older_than` ago that are neither refined
+    nor failed: (session id, upload id) pairs. The tier is in metrics_json, filtered here.
+    """
+    now = datetime.utcnow()
+    rows = (
+        db.query(models.Session.id, models.Session.upload_id, models.Session.metrics_json)
+        .filter(models.Session.created_at < now - older_than, models.Session.created_at >= now - within)
+        .all()
+    )
+    return [(session_id, upload_id) for session_id, upload_id, metrics in rows
+            if (metrics or {}).get("tier") == TIER_PREVIEW and REFINE_ERROR not in metrics]
+
+def refine_session(session_id: int):
+    """Background task (in-process, JOB_QUEUE=inline): run_refinement, a failure is recorded on the session."""
+    try:
+        run_refinement(session_id)
+    except Exception as e:
+        print(f"Session refinement failed ({session_id}): {e}")
+        try:
+            mark_refinement_failed(session_id, str(e)[:500])
+        except Exception as e:
+            print(f"Recording the refinement failure failed ({session_id}): {e}")
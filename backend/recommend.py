@@ -0,0 +1,272 @@
+"""
+Exercise recommendations.
+
+Two parts:
+- Offline (`python -m backend.recommend --build`): a vectorized pass over all sessions
+  measures, per voice type and exercise, how jitter and HNR change from a session with that
+  exercise to the singer's next session. The result is a small table (voice types x
+  exercises) in `exercise_efficacy`.
+- Online (GET /users/{id}/recommendations): the table is held in memory (reloaded every
+  RECOMMEND_TABLE_TTL seconds) and combined with the user's UserExerciseStats rollups and
+  recent health traffic lights. Ranking is a handful of numpy operations over the exercise
+  list, no session scan.
+"""
+import argparse
+import math
+import os
+import threading
+import time
+import warnings
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from . import models, database
+
+TABLE_TTL = float(os.getenv("RECOMMEND_TABLE_TTL", "300"))
+ALL_COHORT = "*"
+
+# Offline efficacy: a jitter drop of 0.2 % or an HNR gain of 2 dB counts as a clear effect
+JITTER_SCALE = 0.2
+HNR_SCALE = 2.0
+PRIOR_SAMPLES = 20 # Shrinks efficacy towards 0 until an exercise has this many observations
+
+# Online ranking weights
+W_COHORT = 1.0
+W_PERSONAL = 1.0
+PERSONAL_PRIOR = 3 # Personal efficacy counts fully after a few sessions
+NOVELTY_BONUS = 0.15 # Never tried yet
+REPEAT_PENALTY = 0.3 # Already practiced within REPEAT_WINDOW_HOURS
+REPEAT_WINDOW_HOURS = 12
+RECOVERY_BONUS = 0.5 # SOVT / relaxation while the voice shows strain
+STRAIN_PENALTY = 0.6 # Demanding exercises while the voice shows strain
+RECOVERY_CATEGORIES = ("SOVT/Warmup", "SOVT/Reset", "Entspannung")
+STRAIN_DIFFICULTY = 3
+HEALTH_WINDOW = 3 # Recent sessions considered for the traffic-light trend
+
+# --- Offline job ---
+
+def build_efficacy_table(db: Session) -> int:
+    """Recomputes exercise_efficacy from all sessions. Returns the number of rows written."""
+    rows = (
+        db.query(models.Session.user_id, models.Session.exercise_id, models.Session.jitter_percent,
+                 models.Session.hnr_db, models.User.voice_type)
+        .join(models.User, models.User.id == models.Session.user_id)
+        # Sessions without Praat values (unrefined previews) would break the pairs below
+        .filter(or_(models.Session.jitter_percent.isnot(None), models.Session.hnr_db.isnot(None)))
+        .order_by(models.Session.user_id, models.Session.created_at, models.Session.id)
+        .all()
+    )
+    built_at = datetime.utcnow()
+    db.query(models.ExerciseEfficacy).delete()
+    if len(rows) < 2:
+        db.commit()
+        return 0
+
+    user_ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    exercise_ids = np.fromiter((r[1] for r in rows), dtype=np.int64, count=len(rows))
+    jitter = np.array([r[2] for r in rows], dtype=float) # None -> nan
+    hnr = np.array([r[3] for r in rows], dtype=float)
+    cohorts, cohort_codes = np.unique(np.array([r[4] or "Unknown" for r in rows], dtype=object).astype(str), return_inverse=True)
+    exercises, exercise_codes = np.unique(exercise_ids, return_inverse=True)
+
+    # Pair every session with the same user's next session: the exercise gets the change
+    same_user = user_ids[1:] == user_ids[:-1]
+    d_jitter = np.where(same_user, jitter[1:] - jitter[:-1], np.nan)
+    d_hnr = np.where(same_user, hnr[1:] - hnr[:-1], np.nan)
+    pair_exercise = exercise_codes[:-1]
+    pair_cohort = cohort_codes[:-1]
+
+    n_ex = len(exercises)
+    table = []
+    groups = [(ALL_COHORT, pair_exercise)] + [
+        (cohort, pair_exercise + n_ex * (pair_cohort != code)) for code, cohort in enumerate(cohorts)
+    ]
+    for cohort, keys in groups:
+        # Keys >= n_ex belong to other cohorts and fall out of the first n_ex bins
+        jitter_mean, jitter_n = _grouped_mean(keys, d_jitter, 2 * n_ex)
+        hnr_mean, hnr_n = _grouped_mean(keys, d_hnr, 2 * n_ex)
+        jitter_mean, jitter_n, hnr_mean, hnr_n = jitter_mean[:n_ex], jitter_n[:n_ex], hnr_mean[:n_ex], hnr_n[:n_ex]
+
+        gains = np.vstack([-jitter_mean / JITTER_SCALE, hnr_mean / HNR_SCALE])
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning) # All-nan columns
+            raw = np.nanmean(gains, axis=0) # nan where neither metric was observed
+        samples = np.maximum(jitter_n, hnr_n)
+        efficacy = np.tanh(np.nan_to_num(raw)) * samples / (samples + PRIOR_SAMPLES)
+
+        for i in np.flatnonzero(samples > 0):
+            table.append(models.ExerciseEfficacy(
+                voice_type=cohort, exercise_id=int(exercises[i]), samples=int(samples[i]),
+                jitter_delta=_nan_to_none(jitter_mean[i]), hnr_delta=_nan_to_none(hnr_mean[i]),
+                efficacy=round(float(efficacy[i]), 4), built_at=built_at
+            ))
+
+    db.add_all(table)
+    db.commit()
+    return len(table)
+
+def _grouped_mean(keys: np.ndarray, values: np.ndarray, bins: int):
+    valid = ~np.isnan(values)
+    counts = np.bincount(keys[valid], minlength=bins)
+    sums = np.bincount(keys[valid], weights=values[valid], minlength=bins)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan), counts
+
+def _nan_to_none(value):
+    return None if math.isnan(value) else round(float(value), 4)
+
+# --- In-memory lookup table ---
+
+_table = None
+_table_lock = threading.Lock()
+
+def lookup_table(db: Session) -> dict:
+    """Exercise list + cohort efficacy vectors, cached for TABLE_TTL seconds."""
+    global _table
+    table = _table
+    if table is not None and time.monotonic() - table["loaded_at"] < TABLE_TTL:
+        return table
+    with _table_lock:
+        if _table is None or time.monotonic() - _table["loaded_at"] >= TABLE_TTL:
+            _table = _load_table(db)
+        return _table
+
+def _load_table(db: Session) -> dict:
+    exercises = db.query(models.Exercise).order_by(models.Exercise.id).all()
+    ids = np.array([e.id for e in exercises], dtype=np.int64)
+    position = {exercise_id: i for i, exercise_id in enumerate(ids.tolist())}
+
+    cohorts = {}
+    built_at = None
+    for row in db.query(models.ExerciseEfficacy).all():
+        if row.exercise_id not in position:
+            continue
+        vector = cohorts.setdefault(row.voice_type, np.zeros(len(ids)))
+        vector[position[row.exercise_id]] = row.efficacy
+        built_at = row.built_at
+
+    return {
+        "loaded_at": time.monotonic(),
+        "built_at": built_at,
+        "exercise_ids": ids,
+        "position": position,
+        "names": [e.name for e in exercises],
+        "categories": [e.category for e in exercises],
+        "difficulty": np.array([e.difficulty or 1 for e in exercises]),
+        "recovery": np.array([e.category in RECOVERY_CATEGORIES for e in exercises]),
+        "cohorts": cohorts
+    }
+
+# --- Online ranking ---
+
+def health_trend(statuses: list) -> str:
+    """Newest-first traffic lights -> "red" (strained), "yellow" (watch) or "green"."""
+    statuses = [s for s in statuses if s]
+    if not statuses:
+        return "unknown"
+    if statuses[0] == "red" or statuses.count("red") >= 2:
+        return "red"
+    if statuses[0] == "yellow" or "red" in statuses:
+        return "yellow"
+    return "green"
+
+def recommend(db: Session, user: models.User, limit: int = 3) -> dict:
+    table = lookup_table(db)
+    n = len(table["exercise_ids"])
+    cohort = table["cohorts"].get(user.voice_type)
+    if cohort is None:
+        cohort = table["cohorts"].get(ALL_COHORT, np.zeros(n))
+
+    # Personal rollups (one small indexed read)
+    personal = np.zeros(n)
+    performed = np.zeros(n)
+    recent = np.zeros(n, dtype=bool)
+    cutoff = datetime.utcnow().timestamp() - REPEAT_WINDOW_HOURS * 3600
+    for stats in db.query(models.UserExerciseStats).filter(models.UserExerciseStats.user_id == user.id):
+        i = table["position"].get(stats.exercise_id)
+        if i is None:
+            continue
+        personal[i] = stats.efficacy_rating or 0.0
+        performed[i] = stats.times_performed or 0
+        recent[i] = stats.last_practiced_at is not None and stats.last_practiced_at.timestamp() >= cutoff
+
+    statuses = [
+        s for (s,) in db.query(models.Session.health_status)
+        .filter(models.Session.user_id == user.id, models.Session.health_status.isnot(None)) # Previews: not graded
+        .order_by(models.Session.id.desc())
+        .limit(HEALTH_WINDOW)
+    ]
+    trend = health_trend(statuses)
+    strain = {"red": 1.0, "yellow": 0.5}.get(trend, 0.0)
+
+    personal_weight = performed / (performed + PERSONAL_PRIOR)
+    score = (
+        W_COHORT * cohort
+        + W_PERSONAL * personal * personal_weight
+        + NOVELTY_BONUS * (performed == 0)
+        - REPEAT_PENALTY * recent
+        + strain * RECOVERY_BONUS * table["recovery"]
+        - strain * STRAIN_PENALTY * (table["difficulty"] >= STRAIN_DIFFICULTY)
+    )
+
+    recommendations = []
+    for i in np.argsort(-score, kind="stable")[:limit]:
+        reasons = []
+        if cohort[i] > 0.05:
+            reasons.append("cohort_efficacy")
+        if personal[i] * personal_weight[i] > 0.05:
+            reasons.append("personal_progress")
+        if performed[i] == 0:
+            reasons.append("new")
+        if strain and table["recovery"][i]:
+            reasons.append("recovery")
+        recommendations.append({
+            "exercise_id": int(table["exercise_ids"][i]),
+            "name": table["names"][i],
+            "category": table["categories"][i],
+            "difficulty": int(table["difficulty"][i]),
+            "score": round(float(score[i]), 3),
+            "cohort_efficacy": round(float(cohort[i]), 3),
+            "personal_efficacy": round(float(personal[i]), 3),
+            "times_performed": int(performed[i]),
+            "reasons": reasons
+        })
+
+    return {
+        "user_id": user.id,
+        "health_trend": trend,
+        "table_built_at": table["built_at"],
+        "recommendations": recommendations
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the exercise efficacy table / print recommendations.")
+    parser.add_argument("--build", action="store_true", help="Recompute exercise_efficacy from all sessions")
+    parser.add_argument("--user-id", type=int, help="Print recommendations for this user")
+    parser.add_argument("--limit", type=int, default=3)
+    args = parser.parse_args()
+
+    from . import migrations
+    migrations.upgrade(database.engine)
+
+    db = database.SessionLocal()
+    try:
+        if args.build:
+            started = time.perf_counter()
+            written = build_efficacy_table(db)
+            print(f"Efficacy table: {written} rows in {time.perf_counter() - started:.2f} s")
+        if args.user_id:
+            user = db.query(models.User).filter(models.User.id == args.user_id).first()
+            if user is None:
+                raise SystemExit(f"User {args.user_id} not found")
+            recommend(db, user, args.limit) # Loads the table
+            started = time.perf_counter()
+            result = recommend(db, user, args.limit)
+            print(f"Ranked in {(time.perf_counter() - started) * 1000:.2f} ms (trend: {result['health_trend']})")
+            for r in result["recommendations"]:
+                print(f"  {r['exercise_id']:>3} {r['name']:<24} {r['score']:>6.3f}  {', '.join(r['reasons'])}")
+    finally:
+        db.close()
@@ -0,0 +1,206 @@
+"""
+Re-scores stored sessions after the scoring rules changed (scoring.py, SCORING_VERSION).
+
+Works from the features each session already stores in metrics_json (pitch/rhythm scores,
+pitch stability, health traffic light), never from the audio, and scores a whole chunk at once
+with scoring.session_scores. Per chunk, in one transaction:
+
+- sessions: score, accuracy (metrics_json + pitch_accuracy column), xp_earned, scoring_version
+- users: XP / level adjusted by the XP difference of their sessions
+- learning rollups of users whose scores changed are rebuilt from the raw sessions
+
+XP is re-awarded with the streak bonus the session originally earned (recovered from its
+stored xp_earned, so the bonus does not depend on today's streak).
+
+Chunks walk the sessions in (user_id, id) order, so a user's sessions mostly share one chunk
+and their rollups are rebuilt once. Every committed chunk is a checkpoint: only sessions with
+an older (or no) scoring_version are selected, so the job can be stopped and restarted at any
+time, also next to the live app (new sessions are stored with the current version).
+--checkpoint additionally remembers the position in a file, so a restart skips the finished
+part of the table instead of scanning past it.
+
+    python -m backend.rescore --dry-run          # report what would change
+    python -m backend.rescore --batch-size 5000 --checkpoint rescore.json
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+from sqlalchemy import and_, bindparam, or_, select, update
+
+from . import database, gamification, learning, migrations, models, scoring
+
+def _stale(sessions, version: int):
+    return or_(sessions.c.scoring_version.is_(None), sessions.c.scoring_version < version)
+
+def _lock_for_write(db):
+    """Takes the write lock before the chunk is read (the refinement job may update the same rows)."""
+    if db.get_bind().dialect.name == "sqlite":
+        db.connection().exec_driver_sql("BEGIN IMMEDIATE")
+
+def _features(rows, exercises: dict) -> dict:
+    """Column arrays of the stored features (NaN / None where a session has none)."""
+    n = len(rows)
+    columns = {
+        "is_pattern": np.zeros(n, dtype=bool), "difficulty": np.ones(n),
+        "pitch_score": np.full(n, np.nan), "rhythm_score": np.full(n, np.nan), "stability_std": np.full(n, np.nan),
+        "health": np.full(n, None, dtype=object), "old_score": np.zeros(n), "old_xp": np.zeros(n)
+    }
+    for i, row in enumerate(rows):
+        metrics = row.metrics_json or {}
+        pitch = metrics.get("pitch") or {}
+        columns["is_pattern"][i], columns["difficulty"][i] = exercises.get(row.exercise_id, (False, 1))
+        columns["pitch_score"][i] = pitch.get("pitch_score", np.nan)
+        columns["rhythm_score"][i] = pitch.get("rhythm_score", np.nan)
+        columns["stability_std"][i] = pitch.get("pitch_stability_std", np.nan)
+        columns["health"][i] = (metrics.get("assessment") or {}).get("overall")
+        columns["old_score"][i] = row.score or 0
+        columns["old_xp"][i] = metrics.get("xp_earned", 0)
+    return columns
+
+def _xp(scores: np.ndarray, difficulty: np.ndarray, streak_bonus: np.ndarray) -> np.ndarray:
+    # Same float operations as gamification.calculate_xp
+    return np.trunc(gamification.BASE_XP * (scores / 100.0) * difficulty + streak_bonus).astype(int)
+
+def rescore_chunk(rows, exercises: dict):
+    """Vectorized scoring of one chunk. Returns (scores, accuracy, xp) arrays."""
+    f = _features(rows, exercises)
+    scores, accuracy = scoring.session_scores(f["is_pattern"], f["pitch_score"], f["rhythm_score"], f["stability_std"], f["health"])
+    # The streak bonus is whatever the old XP holds beyond the score part
+    streak_bonus = np.clip(f["old_xp"] - _xp(f["old_score"], f["difficulty"], 0), 0, gamification.STREAK_BONUS_MAX)
+    xp = _xp(scores, f["difficulty"], streak_bonus)
+    has_metrics = np.array([bool(row.metrics_json) for row in rows], dtype=bool)
+    # Sessions without stored features (failed analyses) keep their score
+    scores = np.where(has_metrics, scores, f["old_score"]).astype(int)
+    xp = np.where(has_metrics, xp, f["old_xp"]).astype(int)
+    return scores, accuracy, xp
+
+def _session_update(row, score: int, accuracy: float, xp: int, version: int) -> dict:
+    metrics_json = dict(row.metrics_json) if row.metrics_json else row.metrics_json
+    pitch_accuracy = row.pitch_accuracy
+    if metrics_json:
+        metrics_json["xp_earned"] = xp
+        if not np.isnan(accuracy) and metrics_json.get("pitch"):
+            metrics_json["pitch"] = dict(metrics_json["pitch"], accuracy_score=float(accuracy))
+            pitch_accuracy = float(accuracy)
+    return {"session_id": row.id, "score": score, "metrics_json": metrics_json, "pitch_accuracy": pitch_accuracy, "scoring_version": version}
+
+def _apply_user_changes(db, xp_delta: dict, changed_users: set):
+    users = (
+        db.query(models.User)
+        .filter(models.User.id.in_(set(xp_delta) | changed_users))
+        .with_for_update()
+        .populate_existing()
+        .all()
+    )
+    for user in users:
+        if xp_delta.get(user.id):
+            user.xp = (user.xp or 0) + xp_delta[user.id]
+            user.level = gamification.calculate_level(user.xp)
+        if user.id in changed_users:
+            learning.check_user(db, user, repair=True)
+
+def _read_checkpoint(path: str, version: int):
+    if not path or not os.path.exists(path):
+        return (0, 0)
+    with open(path) as f:
+        checkpoint = json.load(f)
+    # A checkpoint of an earlier rescore run (older version) does not apply
+    return tuple(checkpoint["cursor"]) if checkpoint.get("scoring_version") == version else (0, 0)
+
+def _write_checkpoint(path: str, version: int, cursor: tuple):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"scoring_version": version, "cursor": list(cursor)}, f)
+    os.replace(tmp_path, path)
+
+def rescore(session_factory=None, batch_size: int = 5000, version: int = scoring.SCORING_VERSION,
+            checkpoint: str = None, dry_run: bool = False, user_id: int = None) -> dict:
+    """Re-scores all sessions older than `version`. Returns counters."""
+    session_factory = session_factory or database.SessionLocal
+    sessions = models.Session.__table__
+    query = (
+        select(sessions.c.id, sessions.c.user_id, sessions.c.exercise_id, sessions.c.score,
+               sessions.c.metrics_json, sessions.c.pitch_accuracy)
+        .where(_stale(sessions, version), sessions.c.user_id.isnot(None))
+        .order_by(sessions.c.user_id, sessions.c.id)
+        .limit(batch_size)
+    )
+    if user_id is not None:
+        query = query.where(sessions.c.user_id == user_id)
+    statement = (
+        update(sessions)
+        .where(sessions.c.id == bindparam("session_id"))
+        .values(score=bindparam("score"), metrics_json=bindparam("metrics_json"),
+                pitch_accuracy=bindparam("pitch_accuracy"), scoring_version=bindparam("scoring_version"))
+    )
+
+    db = session_factory()
+    try:
+        exercises = {e.id: (bool(e.pattern), e.difficulty or 1) for e in db.query(models.Exercise)}
+    finally:
+        db.close()
+
+    counters = {"sessions": 0, "scores_changed": 0, "xp_delta": 0, "users_rebuilt": 0}
+    cursor = _read_checkpoint(checkpoint, version)
+    started = time.perf_counter()
+    while True:
+        db = session_factory()
+        try:
+            _lock_for_write(db)
+            last_user_id, last_id = cursor
+            rows = db.execute(
+                query.where(or_(sessions.c.user_id > last_user_id, and_(sessions.c.user_id == last_user_id, sessions.c.id > last_id)))
+                .with_for_update()
+            ).all()
+            if not rows:
+                break
+
+            scores, accuracy, xp = rescore_chunk(rows, exercises)
+            user_ids = np.array([row.user_id for row in rows])
+            old_scores = np.array([row.score for row in rows], dtype=object)
+            changed = scores != old_scores
+            xp_change = xp - np.array([(row.metrics_json or {}).get("xp_earned", 0) for row in rows])
+
+            db.execute(statement, [_session_update(row, int(s), float(a), int(x), version) for row, s, a, x in zip(rows, scores, accuracy, xp)])
+            xp_delta = {}
+            for uid, delta in zip(user_ids[xp_change != 0].tolist(), xp_change[xp_change != 0].tolist()):
+                xp_delta[uid] = xp_delta.get(uid, 0) + delta
+            changed_users = set(user_ids[changed].tolist())
+            db.flush()
+            _apply_user_changes(db, xp_delta, changed_users)
+
+            if dry_run:
+                db.rollback()
+            else:
+                db.commit()
+            cursor = (rows[-1].user_id, rows[-1].id)
+            counters["sessions"] += len(rows)
+            counters["scores_changed"] += int(changed.sum())
+            counters["xp_delta"] += int(xp_change.sum())
+            counters["users_rebuilt"] += len(changed_users)
+        finally:
+            db.close()
+        if checkpoint and not dry_run:
+            _write_checkpoint(checkpoint, version, cursor)
+        elapsed = time.perf_counter() - started
+        print(f"  {counters['sessions']:,} sessions re-scored, {counters['scores_changed']:,} changed "
+              f"(up to user {cursor[0]}, {counters['sessions'] / elapsed:,.0f}/s)", end="\r", flush=True)
+    print()
+    return counters
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-score stored sessions with the current scoring rules (scoring.py).")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Sessions per chunk / transaction")
+    parser.add_argument("--checkpoint", help="File remembering the position between runs")
+    parser.add_argument("--user-id", type=int, help="Only this user")
+    parser.add_argument("--dry-run", action="store_true", help="Compute and report, write nothing")
+    args = parser.parse_args()
+
+    migrations.upgrade(database.engine)
+    counters = rescore(batch_size=args.batch_size, checkpoint=args.checkpoint, dry_run=args.dry_run, user_id=args.user_id)
+    print(f"{'Dry run' if args.dry_run else 'Done'} (scoring version {scoring.SCORING_VERSION}): "
+          f"{counters['sessions']:,} sessions, {counters['scores_changed']:,} scores changed, "
+          f"XP {counters['xp_delta']:+,}, {counters['users_rebuilt']:,} users' rollups rebuilt.")
@@ -0,0 +1,31 @@
+"""
+Worker roles (VOCALCOACH_ROLE):
+
+- "all" (default): serves every endpoint; heavy modules load lazily, warm-up runs in background.
+- "api": serves users/exercises/stats only. Never loads the DSP/AI stack and skips warm-up;
+  analysis endpoints answer 503 so a router/proxy can send them to analysis workers.
+- "analysis": imports the DSP/AI stack at startup and warms it up before reporting ready.
+"""
+import os
+
+from fastapi import HTTPException
+
+ROLE_ALL = "all"
+ROLE_API = "api"
+ROLE_ANALYSIS = "analysis"
+ROLES = (ROLE_ALL, ROLE_API, ROLE_ANALYSIS)
+
+ROLE = os.getenv("VOCALCOACH_ROLE", ROLE_ALL).lower()
+if ROLE not in ROLES:
+    raise RuntimeError(f"Unknown VOCALCOACH_ROLE '{ROLE}'. Use one of: {', '.join(ROLES)}")
+
+def serves_analysis() -> bool:
+    return ROLE != ROLE_API
+
+def require_analysis():
+    """Dependency for analysis endpoints: refuses the request on "api" workers."""
+    if not serves_analysis():
+        raise HTTPException(
+            status_code=503,
+            detail="This worker runs in 'api' role and does not analyze audio. Route /analyze/* and POST /sessions/ to an analysis worker."
+        )
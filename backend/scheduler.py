@@ -0,0 +1,184 @@
+"""
+Scheduler in front of the analysis workers.
+
+Every analysis (the upload endpoints, the preview refinement, /analyze/batch files) takes a
+worker slot before it runs. WORKERS slots exist per process (default: one per CPU, the
+analyses are CPU-bound); waiting jobs wait on the event loop, not in a threadpool thread.
+When a slot frees up, the next job is picked by:
+
+1. Priority class: live > session > performance > batch (PRIORITY_OF maps the job names used
+   by admission.py / track_processing to a class). A class only gets a worker while no higher
+   class is waiting. Running jobs are never preempted.
+2. Per-user fairness inside a class (self-clocked fair queuing): each user has a virtual finish
+   time that grows by the cost of every job they are given, and the user whose next job would
+   finish first goes next. A user with ten queued songs gets one turn per turn of everyone
+   else, weighted by cost.
+3. Shortest job first within a user's queue (cost = admission.estimate_cost, worker seconds).
+
+Jobs estimated at LONG_JOB_SECONDS or more hold at most MAX_LONG_JOBS slots, so short jobs
+always find a worker while long ones queue. Queue depth, running jobs and the wait per class
+are on GET /metrics.
+
+    async with scheduler.slot("sessions.full", user_id, cost):
+        ...
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+
+import anyio
+
+from . import instrumentation
+
+LIVE, SESSION, PERFORMANCE, BATCH = "live", "session", "performance", "batch"
+PRIORITIES = (LIVE, SESSION, PERFORMANCE, BATCH) # Highest first
+
+PRIORITY_OF = {
+    # Exercise feedback the singer is waiting for
+    "sessions.preview": LIVE, "breath": LIVE, "health": LIVE, "range": LIVE,
+    "sessions.full": SESSION, "sessions.refine": SESSION,
+    "performance": PERFORMANCE,
+    "batch": BATCH,
+}
+
+WORKERS = int(os.getenv("SCHEDULER_WORKERS", "0")) or os.cpu_count() or 1
+LONG_JOB_SECONDS = float(os.getenv("SCHEDULER_LONG_JOB_SECONDS", "10"))
+MAX_LONG_JOBS = int(os.getenv("SCHEDULER_MAX_LONG_JOBS", "0")) or max(1, WORKERS // 2)
+
+class Job:
+    __slots__ = ("priority", "user", "cost", "long", "queued_at", "loop", "future", "running")
+
+class Scheduler:
+    """Worker slots handed out by priority, user fairness and cost. Used from the event loop only."""
+
+    def __init__(self, workers: int = WORKERS, max_long_jobs: int = MAX_LONG_JOBS, long_job_seconds: float = LONG_JOB_SECONDS):
+        self.workers = workers
+        self.max_long_jobs = max_long_jobs
+        self.long_job_seconds = long_job_seconds
+        self.running = 0
+        self.running_long = 0
+        self._waiting = {p: {} for p in PRIORITIES} # priority -> user -> heap of (cost, seq, job)
+        self._finish = {p: {} for p in PRIORITIES} # priority -> user -> virtual finish time
+        self._virtual_time = dict.fromkeys(PRIORITIES, 0.0)
+        self._seq = itertools.count()
+
+    def queued(self, priority: str) -> int:
+        return sum(len(heap) for heap in self._waiting[priority].values())
+
+    async def acquire(self, job_name: str, user, cost: float) -> Job:
+        """Waits for a worker slot. Pair with release() (or use slot())."""
+        job = Job()
+        job.priority = PRIORITY_OF.get(job_name, BATCH)
+        job.user = user
+        job.cost = max(cost or 0.0, 0.0)
+        job.long = job.cost >= self.long_job_seconds
+        job.queued_at = time.perf_counter()
+        job.loop = asyncio.get_running_loop()
+        job.future = job.loop.create_future()
+        job.running = False
+        heapq.heappush(self._waiting[job.priority].setdefault(user, []), (job.cost, next(self._seq), job))
+        if instrumentation.ENABLED:
+            instrumentation.SCHEDULER_QUEUED.inc(priority=job.priority)
+        self._dispatch()
+
+        try:
+            await job.future
+        except BaseException:
+            # Client went away: leave the queue, or give back a slot granted in the meantime
+            if job.running:
+                self.release(job)
+            else:
+                self._remove(job)
+            raise
+        return job
+
+    def release(self, job: Job):
+        if not job.running:
+            return
+        job.running = False
+        self.running -= 1
+        if job.long:
+            self.running_long -= 1
+        if instrumentation.ENABLED:
+            instrumentation.SCHEDULER_RUNNING.dec(priority=job.priority)
+        self._dispatch()
+
+    def release_threadsafe(self, job: Job):
+        """release() from a worker thread or an executor callback."""
+        job.loop.call_soon_threadsafe(self.release, job)
+
+    def _dispatch(self):
+        while self.running < self.workers:
+            job = self._next_job()
+            if job is None:
+                return
+            self.running += 1
+            if job.long:
+                self.running_long += 1
+            job.running = True
+            if instrumentation.ENABLED:
+                instrumentation.SCHEDULER_QUEUED.dec(priority=job.priority)
+                instrumentation.SCHEDULER_RUNNING.inc(priority=job.priority)
+                instrumentation.SCHEDULER_WAIT.observe(time.perf_counter() - job.queued_at, priority=job.priority)
+            job.future.set_result(None)
+
+    def _next_job(self):
+        long_allowed = self.running_long < self.max_long_jobs
+        for priority in PRIORITIES:
+            waiting = self._waiting[priority]
+            finish = self._finish[priority]
+            virtual_time = self._virtual_time[priority]
+            # Few users wait at a time (one entry per queued request), a scan is cheap
+            best_tag, best_user = None, None
+            for user, heap in waiting.items():
+                cost, _, job = heap[0] # The user's shortest job
+                if job.long and not long_allowed:
+                    continue # All of this user's jobs are long
+                tag = max(virtual_time, finish.get(user, 0.0)) + cost
+                if best_tag is None or tag < best_tag:
+                    best_tag, best_user = tag, user
+            if best_user is None:
+                continue # Nothing here may start now, a lower class can use the slot
+
+            heap = waiting[best_user]
+            _, _, job = heapq.heappop(heap)
+            if not heap:
+                del waiting[best_user]
+            finish[best_user] = best_tag
+            self._virtual_time[priority] = best_tag - job.cost
+            if len(finish) > 2 * len(waiting) + 64:
+                # Users at or behind the virtual time start there anyway
+                for user in [u for u, t in finish.items() if t <= self._virtual_time[priority] and u not in waiting]:
+                    del finish[user]
+            return job
+        return None
+
+    def _remove(self, job: Job):
+        heap = self._waiting[job.priority].get(job.user)
+        if not heap:
+            return
+        heap[:] = [entry for entry in heap if entry[2] is not job]
+        heapq.heapify(heap)
+        if not heap:
+            del self._waiting[job.priority][job.user]
+        if instrumentation.ENABLED:
+            instrumentation.SCHEDULER_QUEUED.dec(priority=job.priority)
+
+scheduler = Scheduler()
+
+@asynccontextmanager
+async def slot(job_name: str, user, cost: float):
+    """Holds a worker slot for the enclosed analysis."""
+    job = await scheduler.acquire(job_name, user, cost)
+    try:
+        yield job
+    finally:
+        scheduler.release(job)
+
+async def run(job_name: str, user, cost: float, fn, *args):
+    """Runs a sync analysis job in the threadpool once it gets a slot (background tasks)."""
+    async with slot(job_name, user, cost):
+        return await anyio.to_thread.run_sync(fn, *args)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
@@ -48,9 +48,29 @@ class SessionCreate(BaseModel):
     # For phase 1 we simulate audio upload/analysis by just sending score
     
 class SessionResponse(BaseModel):
+    session_id: Optional[int] = None
+    tier: str = "full" # "preview" results are refined in place to "full"
     xp_earned: int
     new_total_xp: int
     new_level: int
     streak: int
     score: int
     feedback: Optional[str] = None
+    metrics: Optional[Dict[str, Any]] = None
+    refine_error: Optional[str] = None # The refinement failed for good: the preview is final
+
+class ExerciseStats(BaseModel):
+    exercise_id: int
+    times_performed: int
+    avg_score: float
+    score_std: float
+    score_trend: Optional[float] = None # EWMA of recent scores
+    jitter_avg: Optional[float] = None
+    jitter_trend: Optional[float] = None
+    efficacy_rating: float
+    last_practiced_at: Optional[datetime] = None
+
+class BatchRequest(BaseModel):
+    target: Optional[str] = "" # Directory or glob relative to user_uploads, e.g. "2024*.wav"
+    workers: Optional[int] = Field(None, ge=1) # Process pool size (default and maximum: CPU count)
+    resume: bool = True # Skip files already recorded in the progress manifest
@@ -0,0 +1,48 @@
+"""
+Session scoring rules in one place.
+
+The analyzers (analysis/pitch.py) combine intonation and timing into the accuracy score,
+pipeline.score_analysis turns analyzer results into the session score. Both read the weights
+below, and rescore.py applies the same rules to stored sessions in bulk (session_scores is
+the vectorized twin of pipeline.score_analysis).
+
+Bump SCORING_VERSION whenever a rule or weight changes: every session records the version
+it was scored with, and `python -m backend.rescore` re-scores the older ones.
+"""
+import numpy as np
+
+SCORING_VERSION = 1
+
+# Pattern exercises: accuracy = weighted intonation + timing (0..100 each)
+PITCH_WEIGHT = 0.7
+RHYTHM_WEIGHT = 0.3
+
+# Standard exercises: base score, bonus for a steady pitch
+STANDARD_BASE_SCORE = 70
+STABILITY_BONUS = 10
+STABILITY_MAX_STD = 2.0 # pitch_stability_std below this earns the bonus
+
+# Health modifiers (traffic light of analyze_health)
+HEALTH_GREEN_BONUS = 20 # Only for standard exercises (accuracy exercises are scored on accuracy alone)
+HEALTH_RED_PENALTY = 20 # Always applies
+
+def accuracy_score(pitch_score, rhythm_score):
+    """Works on scalars and numpy arrays."""
+    return pitch_score * PITCH_WEIGHT + rhythm_score * RHYTHM_WEIGHT
+
+def session_scores(is_pattern: np.ndarray, pitch_score: np.ndarray, rhythm_score: np.ndarray,
+                   stability_std: np.ndarray, health: np.ndarray):
+    """
+    Scores many sessions at once from their stored features (NaN = not available).
+    health: "green" / "yellow" / "red" / None per session.
+    Returns (scores as int array, accuracy as float array, NaN where not a scored pattern session).
+    """
+    # Python's round (as in analysis/pitch.py), np.round differs on ties like 63.15
+    accuracy = np.array([round(value, 1) for value in accuracy_score(pitch_score, rhythm_score).tolist()], dtype=float)
+    pattern_scores = np.where(np.isnan(accuracy), 0, np.trunc(np.nan_to_num(accuracy)))
+    standard_scores = STANDARD_BASE_SCORE + np.where(stability_std < STABILITY_MAX_STD, STABILITY_BONUS, 0) # NaN compares False
+
+    scores = np.where(is_pattern, pattern_scores, standard_scores)
+    scores = scores + np.where((health == "green") & ~is_pattern, HEALTH_GREEN_BONUS, 0)
+    scores = scores - np.where(health == "red", HEALTH_RED_PENALTY, 0)
+    return np.clip(scores, 0, 100).astype(int), np.where(is_pattern, accuracy, np.nan)
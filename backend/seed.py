@@ -1,10 +1,10 @@
 from sqlalchemy.orm import Session
 from backend.database import SessionLocal, engine
-from backend import models
+from backend import models, migrations, catalog
 from backend.intelligence.knowledge import KNOWLEDGE_BASE
 
-# Ensure tables exist
-models.Base.metadata.create_all(bind=engine)
+# Ensure the schema exists and is up to date
+migrations.upgrade(engine)
 
 def seed_exercises(db: Session):
     print("Seeding exercises...")
@@ -36,6 +36,7 @@ def seed_exercises(db: Session):
         db.add(exercise)
     
     db.commit()
+    catalog.bump_version(db) # Running API processes reload their exercise catalog
     print(f"Seeded {len(all_exercises)} exercises.")
 
 def seed_users(db: Session):
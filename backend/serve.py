@@ -0,0 +1,153 @@
+"""
+Pre-forking production server: load and warm up once, then fork the uvicorn workers.
+
+`uvicorn --workers N` starts every worker as a fresh interpreter, so each one imports
+librosa/numba/Praat, compiles the analyzers' numba kernels (warm-up), and builds its own
+exercise catalog (pattern sequences per root note) next to its own KNOWLEDGE_BASE. Here the
+parent does all of that once, then forks. The workers share those pages copy-on-write, and
+only what a worker changes later becomes private to it.
+
+Before forking, the parent:
+- applies the migrations (VOCALCOACH_AUTO_MIGRATE) and loads the catalog snapshot
+- imports the DSP/AI stack and runs the warm-up (analysis roles, VOCALCOACH_WARMUP)
+- closes its pooled database connections (a forked socket must not be shared)
+- moves every object into the GC's permanent generation (gc.freeze). Otherwise the first
+  collection in each worker would write to the headers of all preloaded objects and copy
+  their pages.
+
+It then binds the listening socket and forks --workers children, which serve it with
+uvicorn. The CPUs are split between them: each child's analysis scheduler gets
+cpu_count // --workers slots (and half of those for long jobs), unless SCHEDULER_WORKERS /
+SCHEDULER_MAX_LONG_JOBS set the per-process values explicitly. The parent only supervises: it restarts workers that die, and SIGTERM / Ctrl-C
+shuts all of them down gracefully. Memory per worker: benchmarks/prefork_rss.py.
+
+    python -m backend.serve --workers 4 --port 8000
+"""
+import gc
+
+# Nothing is collected while the parent preloads: objects stay densely packed, and gc.freeze
+# then covers everything (see the gc.freeze documentation)
+gc.disable()
+
+import argparse
+import os
+import random
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+from . import warmup # Must come first: configures the numba cache before librosa is imported
+from . import analyzers, catalog, database, main, migrations, roles, scheduler
+
+WORKERS = int(os.getenv("VOCALCOACH_WORKERS", "0")) or os.cpu_count() or 1
+RESTART_DELAY_SECONDS = 1.0 # Between a worker's death and its replacement (no fork storm on crash loops)
+
+def preload():
+    """Everything the workers would otherwise each do at startup."""
+    if main.AUTO_MIGRATE:
+        migrations.upgrade(database.engine)
+    catalog.reload()
+    if roles.serves_analysis():
+        analyzers.preload()
+    if warmup.WARMUP_ENABLED and roles.serves_analysis():
+        warmup.warm_up()
+    else:
+        warmup.skip_warm_up()
+    # The workers' lifespan skips what is done here
+    main.PRELOADED = True
+    database.engine.dispose()
+
+def bind(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+def share_cpus(workers: int):
+    """Scheduler slots of one of `workers` processes: the CPUs divided between them (env overrides kept)."""
+    if not int(os.getenv("SCHEDULER_WORKERS", "0")):
+        scheduler.scheduler.workers = max(1, (os.cpu_count() or 1) // workers)
+    if not int(os.getenv("SCHEDULER_MAX_LONG_JOBS", "0")):
+        scheduler.scheduler.max_long_jobs = max(1, scheduler.scheduler.workers // 2)
+
+def run_worker(sock: socket.socket, args):
+    """Child process: serves the inherited socket until uvicorn shuts down."""
+    gc.enable()
+    random.seed() # Distinct random streams per worker
+    signal.signal(signal.SIGTERM, signal.SIG_DFL) # uvicorn installs its own handlers
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    if database.write_batcher is not None:
+        # The parent's writer thread did not survive the fork
+        database.write_batcher = database.WriteBatcher(database.SessionLocal)
+    share_cpus(args.workers)
+    config = uvicorn.Config(main.app, log_level=args.log_level, timeout_keep_alive=args.timeout_keep_alive)
+    uvicorn.Server(config).run(sockets=[sock])
+
+def supervise(sock: socket.socket, args):
+    children = {} # pid -> worker index
+    stopping = False
+
+    def spawn(index: int):
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                run_worker(sock, args)
+            except BaseException:
+                code = 1
+                import traceback
+                traceback.print_exc()
+            finally:
+                os._exit(code) # Never return into the parent's loop
+        children[pid] = index
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    gc.freeze()
+    for index in range(args.workers):
+        spawn(index)
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} pre-forked workers (parent pid {os.getpid()})")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = children.pop(pid, None)
+        if index is None or stopping:
+            continue
+        print(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}, starting a new one")
+        time.sleep(RESTART_DELAY_SECONDS)
+        if not stopping:
+            spawn(index)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pre-forking server: preload once, fork uvicorn workers.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Worker processes (default: VOCALCOACH_WORKERS or CPU count)")
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--timeout-keep-alive", type=int, default=5)
+    args = parser.parse_args()
+
+    if sys.platform == "win32":
+        raise SystemExit("Pre-forking needs os.fork (Linux / macOS). Use `uvicorn backend.main:app --workers N`.")
+    started = time.perf_counter()
+    preload()
+    print(f"Preloaded in {time.perf_counter() - started:.1f}s (role {roles.ROLE}, warm-up {'done' if warmup.STATE['ready'] else 'skipped'})")
+    supervise(bind(args.host, args.port), args)
@@ -0,0 +1,390 @@
+"""
+Upload storage: content-addressed, deduplicated, transcoded, with retention tiers.
+
+Recordings are stored once per content as STORAGE_DIR/objects/<2 hex>/<sha256>.<ext> and
+indexed in the uploads table (models.Upload). Sessions point at their upload (upload_id) and
+at its current file (audio_url); a second upload of the same bytes reuses the stored file.
+
+Tiers:
+    hot      the file as uploaded; the analyses (and the preview refinement) read it
+    warm     FLAC, mono, at most STORAGE_SAMPLE_RATE: lossless for re-analysis. Transcoded in
+             the background once no session of the upload waits for its refinement
+    cold     Opus (playback only), after STORAGE_COLD_AFTER_DAYS without a new upload of it
+    deleted  audio removed after STORAGE_DELETE_AFTER_DAYS; sessions keep their scores,
+             metrics and pitch contours (features.py)
+Uploads only go cold / get deleted once every session using them has its full-tier features
+stored (metrics + contour), so nothing that still needs the audio loses it.
+
+File swaps (transcode, delete) commit only if the upload was not uploaded again meanwhile
+(last_used_at unchanged, checked under the write lock). The superseded file is not removed by
+the swap: a request that got its path from the index just before may still be analyzing it.
+Retention removes files no upload points at once they are HOT_GRACE_MINUTES old (the swap
+stamps the old file's mtime). Deleting audio or moving it to cold also waits out the grace
+period after the last upload of it. Sessions store the upload's current path at insert time
+(read under the write lock, pipeline.persist_session), never the one they were analyzed from.
+
+Pitch contours are stored per session (STORAGE_DIR/contours/<session id>.contour.npz): sessions
+of the same upload have their own tracks.
+
+    python -m backend.storage --status
+    python -m backend.storage --retention          # e.g. from cron
+    python -m backend.storage --import-legacy      # index flat files stored before the index
+"""
+import argparse
+import hashlib
+import os
+import shutil
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+
+from . import database, features, models
+
+STORAGE_DIR = os.getenv("STORAGE_DIR", "backend/user_uploads")
+OBJECTS_DIR = os.path.join(STORAGE_DIR, "objects")
+CONTOURS_DIR = os.path.join(STORAGE_DIR, "contours")
+TRANSCODE = os.getenv("STORAGE_TRANSCODE", "1") != "0"
+SAMPLE_RATE = int(os.getenv("STORAGE_SAMPLE_RATE", "22050")) # librosa's analysis rate; higher rates are downsampled
+COLD_AFTER_DAYS = float(os.getenv("STORAGE_COLD_AFTER_DAYS", "30")) # 0 = never
+DELETE_AFTER_DAYS = float(os.getenv("STORAGE_DELETE_AFTER_DAYS", "0")) # 0 = keep audio forever
+HOT_GRACE_MINUTES = 60 # Longer than any analysis: retention leaves fresh uploads and superseded files alone
+OPUS_SAMPLE_RATE = 24000 # Opus encodes 8/12/16/24/48 kHz only; 24 kHz covers the voice spectrum
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".m4a", ".webm", ".ogg", ".flac")
+
+TIER_HOT = "hot"
+TIER_WARM = "warm"
+TIER_COLD = "cold"
+TIER_DELETED = "deleted"
+TIER_FORMATS = {TIER_WARM: ("flac", "FLAC", "PCM_16"), TIER_COLD: ("ogg", "OGG", "OPUS")}
+
+def object_path(sha256: str, extension: str) -> str:
+    return os.path.join(OBJECTS_DIR, sha256[:2], f"{sha256}.{extension}")
+
+def contour_path(session_id: int) -> str:
+    return os.path.join(CONTOURS_DIR, f"{session_id}{features.SUFFIX}")
+
+def _extension(filename: str) -> str:
+    extension = os.path.splitext(filename or "")[1].lower()
+    return extension[1:] if extension in AUDIO_EXTENSIONS else "wav"
+
+# --- Storing uploads ---
+
+def _touch(db, sha256: str):
+    """The stored upload with this content (write-locked), or None."""
+    # UPDATE first: takes the write lock before the row is read (see module docstring)
+    touched = db.execute(
+        update(models.Upload).where(models.Upload.sha256 == sha256).values(last_used_at=datetime.utcnow())
+    ).rowcount
+    if not touched:
+        return None
+    return db.query(models.Upload).filter(models.Upload.sha256 == sha256).with_for_update().populate_existing().one()
+
+def _find_stored(db, sha256: str):
+    upload = _touch(db, sha256)
+    if upload is None or upload.tier == TIER_DELETED or not upload.path or not os.path.exists(upload.path):
+        return None
+    return {"id": upload.id, "path": upload.path, "name": upload.name, "duplicate": True}
+
+def _index_new(db, sha256: str, name: str, path: str, size: int):
+    """Indexes a file just moved into place (or restores a deleted / lost upload of the same content)."""
+    upload = _touch(db, sha256)
+    if upload is None:
+        upload = models.Upload(sha256=sha256, name=name, original_size_bytes=size, created_at=datetime.utcnow())
+        try:
+            with db.begin_nested():
+                db.add(upload)
+                db.flush()
+        except IntegrityError:
+            # Same content indexed concurrently: use that row
+            upload = db.query(models.Upload).filter(models.Upload.sha256 == sha256).one()
+    upload.path, upload.format, upload.tier = path, _extension(path), TIER_HOT
+    upload.size_bytes, upload.sample_rate = size, None
+    db.flush()
+    return {"id": upload.id, "path": upload.path, "name": upload.name, "duplicate": False}
+
+def store_upload(fileobj, filename: str) -> dict:
+    """
+    Streams an upload into storage. Returns {"id", "path", "name", "duplicate"}: the upload's
+    index entry and its current file (for a duplicate possibly already transcoded).
+    """
+    os.makedirs(OBJECTS_DIR, exist_ok=True)
+    tmp_path = os.path.join(OBJECTS_DIR, f".{uuid.uuid4().hex}.tmp")
+    h = hashlib.sha256()
+    size = 0
+    with open(tmp_path, "wb") as f:
+        for chunk in iter(lambda: fileobj.read(1024 * 1024), b""):
+            h.update(chunk)
+            f.write(chunk)
+            size += len(chunk)
+    sha256 = h.hexdigest()
+
+    stored = database.run_write(lambda db: _find_stored(db, sha256))
+    if stored:
+        os.remove(tmp_path)
+        return stored
+
+    path = object_path(sha256, _extension(filename))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(tmp_path, path)
+    name = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{sha256[:8]}_{os.path.basename(filename or 'recording.wav')}"
+    return database.run_write(lambda db: _index_new(db, sha256, name, path, size))
+
+# --- Listing ---
+
+def list_names(db) -> list:
+    """Names of the uploads that still have audio (for /user-uploads and local_filename)."""
+    rows = db.query(models.Upload.name).filter(models.Upload.tier != TIER_DELETED).order_by(models.Upload.id)
+    return [name for (name,) in rows]
+
+def find_local(name: str):
+    """Current file of an upload by its listed name (flat legacy files as fallback), or None."""
+    db = database.SessionLocal()
+    try:
+        path = db.query(models.Upload.path).filter(models.Upload.name == name, models.Upload.tier != TIER_DELETED).scalar()
+    finally:
+        db.close()
+    if path is None:
+        path = os.path.join(STORAGE_DIR, os.path.basename(name))
+    return path if os.path.isfile(path) else None
+
+# --- Transcoding ---
+
+def _encode(source: str, target: str, tier: str) -> int:
+    """Writes source as the tier's format. Returns the sample rate written."""
+    _, file_format, subtype = TIER_FORMATS[tier]
+    # Imported here: API-only processes (VOCALCOACH_ROLE=api) import this module but never transcode
+    import librosa
+    import soundfile as sf
+    y, sr = librosa.load(source, sr=None, mono=True)
+    target_sr = min(sr, SAMPLE_RATE) if tier == TIER_WARM else OPUS_SAMPLE_RATE
+    if target_sr != sr:
+        y = librosa.resample(y, orig_sr=sr, target_sr=target_sr)
+    sf.write(target, np.clip(y, -1.0, 1.0), target_sr, format=file_format, subtype=subtype)
+    return target_sr
+
+def _swap_file(db, upload_id: int, expected_path: str, expected_last_used: datetime, values: dict) -> bool:
+    """Points the upload and its sessions at the new file, unless the upload changed meanwhile."""
+    swapped = db.execute(
+        update(models.Upload)
+        .where(models.Upload.id == upload_id, models.Upload.path == expected_path, models.Upload.last_used_at == expected_last_used)
+        .values(**values)
+    ).rowcount
+    if swapped:
+        db.execute(update(models.Session).where(models.Session.upload_id == upload_id).values(audio_url=values["path"]))
+    return bool(swapped)
+
+def _refined(session) -> bool:
+    """Full tier, or a preview whose refinement failed for good (pipeline.mark_refinement_failed)."""
+    metrics = session.metrics_json or {}
+    return metrics.get("tier") == "full" or bool(metrics.get("refine_error"))
+
+def _pending_refinement(sessions) -> bool:
+    return any((s.metrics_json or {}).get("tier") == "preview" and not _refined(s) for s in sessions)
+
+def _features_extracted(sessions) -> bool:
+    return bool(sessions) and all(s.contour_path and os.path.exists(s.contour_path) and _refined(s) for s in sessions)
+
+def _in_grace(upload, now: datetime = None) -> bool:
+    """Uploaded again recently: a request may still be analyzing the current file."""
+    return upload.last_used_at > (now or datetime.utcnow()) - timedelta(minutes=HOT_GRACE_MINUTES)
+
+def _supersede(path: str):
+    """Marks a swapped-out file for the retention sweep (remove_superseded) instead of removing it."""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+def _load(upload_id: int):
+    db = database.SessionLocal()
+    try:
+        upload = db.get(models.Upload, upload_id)
+        sessions = db.query(models.Session).filter(models.Session.upload_id == upload_id).all() if upload else []
+        return upload, sessions
+    finally:
+        db.close()
+
+def transcode_upload(upload_id: int, tier: str = TIER_WARM) -> bool:
+    """Moves an upload to the warm (FLAC) or cold (Opus) tier. Returns True if it did."""
+    if not TRANSCODE:
+        return False
+    upload, sessions = _load(upload_id)
+    order = (TIER_HOT, TIER_WARM, TIER_COLD)
+    if upload is None or upload.tier not in order or order.index(upload.tier) >= order.index(tier):
+        return False
+    if _pending_refinement(sessions) or not upload.path or not os.path.exists(upload.path):
+        return False
+    if tier == TIER_COLD and _in_grace(upload):
+        return False # Opus is for playback only: not while a new upload of it may be analyzed
+
+    extension = TIER_FORMATS[tier][0]
+    target = object_path(upload.sha256, extension)
+    tmp_path = f"{target}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        sample_rate = _encode(upload.path, tmp_path, tier)
+        os.replace(tmp_path, target)
+    except Exception as e:
+        print(f"Transcoding upload {upload_id} failed: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+    values = {"path": target, "format": extension, "tier": tier, "size_bytes": os.path.getsize(target), "sample_rate": sample_rate}
+    if not database.run_write(lambda db: _swap_file(db, upload_id, upload.path, upload.last_used_at, values)):
+        os.remove(target) # Uploaded again meanwhile: the next retention run retries
+        return False
+    if upload.path != target:
+        _supersede(upload.path)
+    return True
+
+def delete_audio(upload_id: int) -> bool:
+    """Removes an upload's audio (the sessions keep their features). Returns True if it did."""
+    upload, sessions = _load(upload_id)
+    if upload is None or upload.tier == TIER_DELETED or not _features_extracted(sessions) or _in_grace(upload):
+        return False
+    values = {"path": None, "tier": TIER_DELETED, "size_bytes": 0}
+    if not database.run_write(lambda db: _swap_file(db, upload_id, upload.path, upload.last_used_at, values)):
+        return False
+    if upload.path:
+        _supersede(upload.path)
+    return True
+
+# --- Retention ---
+
+def remove_superseded(now: datetime = None, dry_run: bool = False) -> list:
+    """
+    Removes object files no upload points at (swapped out by a transcode or delete, leftover
+    .tmp files) once they are HOT_GRACE_MINUTES old. Returns their paths.
+    """
+    now = now or datetime.utcnow()
+    db = database.SessionLocal()
+    try:
+        referenced = {path for (path,) in db.query(models.Upload.path).filter(models.Upload.path.isnot(None))}
+    finally:
+        db.close()
+
+    removed = []
+    cutoff = (now - timedelta(minutes=HOT_GRACE_MINUTES) - datetime(1970, 1, 1)).total_seconds()
+    for directory, _, filenames in os.walk(OBJECTS_DIR):
+        for filename in filenames:
+            path = os.path.join(directory, filename)
+            if path in referenced or filename.endswith(features.SUFFIX): # Contours of sessions stored before CONTOURS_DIR
+                continue
+            try:
+                # mtime checked last: a file just (re)indexed under the same name is fresh
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+                if not dry_run:
+                    os.remove(path)
+            except OSError:
+                continue
+            removed.append(path)
+    return removed
+
+def apply_retention(now: datetime = None, dry_run: bool = False) -> dict:
+    """
+    One retention pass: transcodes leftover hot uploads (e.g. a failed background task),
+    ages uploads out to cold / deleted, then removes the superseded files.
+    Returns {action: [upload ids]} ("removed": [paths]).
+    """
+    now = now or datetime.utcnow()
+    plan = {"warm": [], "cold": [], "delete": []}
+    db = database.SessionLocal()
+    try:
+        uploads = db.query(models.Upload).filter(
+            models.Upload.tier != TIER_DELETED, models.Upload.last_used_at < now - timedelta(minutes=HOT_GRACE_MINUTES)
+        ).all()
+        for upload in uploads:
+            age_days = (now - upload.last_used_at).total_seconds() / 86400
+            sessions = db.query(models.Session).filter(models.Session.upload_id == upload.id).all()
+            if DELETE_AFTER_DAYS and age_days >= DELETE_AFTER_DAYS and _features_extracted(sessions):
+                plan["delete"].append(upload.id)
+            elif COLD_AFTER_DAYS and age_days >= COLD_AFTER_DAYS and upload.tier != TIER_COLD and _features_extracted(sessions):
+                plan["cold"].append(upload.id)
+            elif upload.tier == TIER_HOT and not _pending_refinement(sessions):
+                plan["warm"].append(upload.id)
+    finally:
+        db.close()
+
+    if dry_run:
+        return dict(plan, removed=remove_superseded(now, dry_run=True))
+    done = {
+        "warm": [i for i in plan["warm"] if transcode_upload(i, TIER_WARM)],
+        "cold": [i for i in plan["cold"] if transcode_upload(i, TIER_COLD)],
+        "delete": [i for i in plan["delete"] if delete_audio(i)],
+    }
+    done["removed"] = remove_superseded(now)
+    return done
+
+def status(db) -> dict:
+    rows = db.query(
+        models.Upload.tier, func.count(models.Upload.id), func.sum(models.Upload.size_bytes), func.sum(models.Upload.original_size_bytes)
+    ).group_by(models.Upload.tier).all()
+    return {tier: {"uploads": count, "bytes": int(size or 0), "original_bytes": int(original or 0)} for tier, count, size, original in rows}
+
+def import_legacy() -> int:
+    """Moves flat files of STORAGE_DIR (stored before the index) into the object store."""
+    imported = 0
+    for filename in sorted(os.listdir(STORAGE_DIR)) if os.path.isdir(STORAGE_DIR) else []:
+        legacy_path = os.path.join(STORAGE_DIR, filename)
+        if not os.path.isfile(legacy_path) or not filename.lower().endswith(AUDIO_EXTENSIONS):
+            continue
+        with open(legacy_path, "rb") as f:
+            stored = store_upload(f, filename)
+        legacy_contour = features.contour_path_for(legacy_path)
+        contour_paths = {}
+        if os.path.exists(legacy_contour):
+            # One copy per session (they used to share the file)
+            db = database.SessionLocal()
+            try:
+                session_ids = [i for (i,) in db.query(models.Session.id).filter(models.Session.contour_path == legacy_contour)]
+            finally:
+                db.close()
+            os.makedirs(CONTOURS_DIR, exist_ok=True)
+            for session_id in session_ids:
+                contour_paths[session_id] = contour_path(session_id)
+                shutil.copyfile(legacy_contour, contour_paths[session_id])
+
+        def relink(db):
+            db.execute(
+                update(models.Session).where(models.Session.audio_url == legacy_path)
+                .values(audio_url=stored["path"], upload_id=stored["id"])
+            )
+            for session_id, path in contour_paths.items():
+                db.execute(update(models.Session).where(models.Session.id == session_id).values(contour_path=path))
+            if not stored["duplicate"]:
+                # Keep the legacy filename as the listed name
+                db.execute(update(models.Upload).where(models.Upload.id == stored["id"]).values(name=filename))
+
+        database.write(relink)
+        os.remove(legacy_path)
+        if os.path.exists(legacy_contour):
+            os.remove(legacy_contour)
+        imported += 1
+    return imported
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upload storage maintenance.")
+    parser.add_argument("--status", action="store_true", help="Uploads and bytes per tier (default)")
+    parser.add_argument("--retention", action="store_true", help="Transcode / age out / delete per the STORAGE_* settings")
+    parser.add_argument("--import-legacy", action="store_true", help="Index flat files stored before the upload index")
+    parser.add_argument("--dry-run", action="store_true", help="With --retention: only list what would happen")
+    args = parser.parse_args()
+
+    from . import migrations
+    migrations.upgrade(database.engine)
+
+    if args.import_legacy:
+        print(f"Imported {import_legacy()} legacy files.")
+    if args.retention:
+        result = apply_retention(dry_run=args.dry_run)
+        print(f"{'Would move' if args.dry_run else 'Moved'}: " + ", ".join(f"{len(ids)} {action}" for action, ids in result.items()))
+    db = database.SessionLocal()
+    try:
+        for tier, row in sorted(status(db).items()):
+            print(f"  {tier:<8} {row['uploads']:>7} uploads {row['bytes'] / 1e6:>10.1f} MB (uploaded: {row['original_bytes'] / 1e6:.1f} MB)")
+    finally:
+        db.close()
@@ -0,0 +1,149 @@
+"""
+Session time series for the dashboard charts (/stats/trends).
+
+Rows are returned newest page first: a page holds the `limit` most recent sessions before
+the cursor (in ascending order, ready to chart) and yields a cursor for the next older page.
+Keyset pagination on (created_at, id) follows ix_sessions_user_trends, so every page
+costs the same no matter how deep the user scrolls. Only typed columns are read, never
+metrics_json (the index covers the whole query).
+
+Bucketed series (day / week / month) are aggregated in SQL; a bucket is identified by the
+date its period starts on ("2025-03-03" is the week of Monday, March 3rd).
+"""
+import base64
+from datetime import datetime
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from . import models
+
+BUCKETS = ("day", "week", "month")
+FORMATS = ("rows", "columnar")
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 5000
+
+ROW_FIELDS = ("date", "score", "exercise_id", "jitter")
+BUCKET_FIELDS = ("bucket", "sessions", "score_avg", "score_min", "score_max", "jitter_avg", "jitter_min", "jitter_max")
+
+
+def encode_cursor(created_at: datetime, session_id: int = None) -> str:
+    raw = created_at.isoformat() if session_id is None else f"{created_at.isoformat()}|{session_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    """Returns (created_at, session_id or None). Raises ValueError for malformed cursors."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, _, session_id = raw.partition("|")
+        return datetime.fromisoformat(timestamp), int(session_id) if session_id else None
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def bucket_expression(bucket: str, dialect: str):
+    """SQL expression giving the bucket start as 'YYYY-MM-DD' text."""
+    created_at = models.Session.created_at
+    if dialect == "postgresql":
+        return func.to_char(func.date_trunc(bucket, created_at), "YYYY-MM-DD")
+    # SQLite: weeks start on Monday ('weekday 0' = next Sunday, or today if Sunday)
+    if bucket == "day":
+        return func.date(created_at)
+    if bucket == "week":
+        return func.date(created_at, "weekday 0", "-6 days")
+    return func.strftime("%Y-%m-01", created_at)
+
+def _in_range(query, user_id: int, start: datetime = None, end: datetime = None):
+    query = query.filter(models.Session.user_id == user_id)
+    if start is not None:
+        query = query.filter(models.Session.created_at >= start)
+    if end is not None:
+        query = query.filter(models.Session.created_at < end)
+    return query
+
+def session_rows(db: Session, user_id: int, start: datetime = None, end: datetime = None,
+                 limit: int = DEFAULT_LIMIT, cursor: str = None):
+    """
+    One page of per-session points.
+    Returns (rows, next_cursor) with rows as dicts {date, score, exercise_id, jitter}
+    (jitter None: no Praat value, e.g. a preview that is not refined yet).
+    """
+    query = _in_range(
+        db.query(models.Session.id, models.Session.created_at, models.Session.score, models.Session.exercise_id, models.Session.jitter_percent),
+        user_id, start, end
+    )
+    if cursor:
+        before_at, before_id = decode_cursor(cursor)
+        if before_id is None:
+            raise ValueError("Invalid cursor")
+        query = query.filter(or_(
+            models.Session.created_at < before_at,
+            (models.Session.created_at == before_at) & (models.Session.id < before_id)
+        ))
+    page = query.order_by(models.Session.created_at.desc(), models.Session.id.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_cursor(page[-1].created_at, page[-1].id)
+
+    rows = []
+    for _, created_at, score, exercise_id, jitter in reversed(page):
+        rows.append({
+            "date": created_at.isoformat(),
+            "score": score,
+            "exercise_id": exercise_id,
+            "jitter": jitter
+        })
+    return rows, next_cursor
+
+def bucket_rows(db: Session, user_id: int, bucket: str, start: datetime = None, end: datetime = None,
+                limit: int = DEFAULT_LIMIT, cursor: str = None):
+    """
+    One page of aggregated buckets (newest first, returned ascending).
+    Returns (rows, next_cursor) with rows as dicts
+    {bucket, sessions, score_avg, score_min, score_max, jitter_avg, jitter_min, jitter_max}.
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f"bucket must be one of {', '.join(BUCKETS)}")
+    key = bucket_expression(bucket, db.get_bind().dialect.name).label("bucket")
+    jitter = models.Session.jitter_percent
+    query = _in_range(
+        db.query(
+            key,
+            func.count(models.Session.id),
+            func.avg(models.Session.score), func.min(models.Session.score), func.max(models.Session.score),
+            func.avg(jitter), func.min(jitter), func.max(jitter)
+        ),
+        user_id, start, end
+    )
+    if cursor:
+        # Bucket cursors hold the start of the last returned bucket: everything older is earlier
+        before_at, _ = decode_cursor(cursor)
+        query = query.filter(models.Session.created_at < before_at)
+    page = query.group_by(key).order_by(key.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_cursor(datetime.fromisoformat(page[-1][0]))
+
+    rows = []
+    for key_value, count, score_avg, score_min, score_max, jitter_avg, jitter_min, jitter_max in reversed(page):
+        rows.append({
+            "bucket": key_value,
+            "sessions": count,
+            "score_avg": _round(score_avg),
+            "score_min": score_min,
+            "score_max": score_max,
+            "jitter_avg": _round(jitter_avg, 3),
+            "jitter_min": _round(jitter_min, 3),
+            "jitter_max": _round(jitter_max, 3)
+        })
+    return rows, next_cursor
+
+def to_columnar(rows: list, fields) -> dict:
+    """[{a: 1, b: 2}, {a: 3, b: 4}] -> {a: [1, 3], b: [2, 4]} (smaller payload for charts)."""
+    return {field: [row[field] for row in rows] for field in fields}
+
+def _round(value, digits: int = 1):
+    return round(value, digits) if value is not None else None
@@ -0,0 +1,120 @@
+"""
+Startup warm-up for analysis workers.
+
+The first pYIN call pays for numba JIT compilation of librosa's kernels and the first
+Praat call for Parselmouth initialization. We run every analyzer once on a short
+synthetic tone at startup and only report "ready" afterwards (GET /ready).
+The analyzers catch their own errors and return {"success": False, "error": ...}: such a
+result counts as a failed warm-up and is reported (STATE["failed"], STATE["error"]).
+
+Import this module before anything that imports librosa/numba: it sets NUMBA_CACHE_DIR
+so compiled kernels are persisted on disk and reused by the next worker / restart.
+"""
+import os
+import time
+import tempfile
+import threading
+
+from . import roles
+
+PROCESS_STARTED_AT = time.time()
+
+os.environ.setdefault("NUMBA_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".numba_cache"))
+
+WARMUP_ENABLED = os.getenv("VOCALCOACH_WARMUP", "1") != "0"
+
+# Per-worker readiness state, reported by GET /ready
+STATE = {
+    "ready": False,
+    "pid": os.getpid(),
+    "startup_seconds": None, # Process start -> ready
+    "warmup_seconds": None,
+    "analyzers": {}, # analyzer name -> seconds for its warm-up call
+    "failed": {}, # analyzer name -> error of its warm-up call
+    "error": None
+}
+
+_lock = threading.Lock()
+
+def _failure(result):
+    """Error of an analyzer result, or None if it succeeded (sub-results included: preview's accuracy)."""
+    if not isinstance(result, dict):
+        return None
+    if not result.get("success"):
+        return result.get("error") or "returned success=False"
+    accuracy = result.get("accuracy")
+    if isinstance(accuracy, dict) and not accuracy.get("success"):
+        return f"accuracy: {accuracy.get('error') or 'returned success=False'}"
+    return None
+
+def warm_up():
+    """Runs each analyzer once on a 1s synthetic tone. Safe to call more than once."""
+    with _lock:
+        if STATE["ready"]:
+            return STATE
+
+        started = time.time()
+        try:
+            # Imported here so the warm-up itself is what triggers the heavy imports
+            import numpy as np
+            from scipy.io.wavfile import write
+            from .audio.synth import generate_tone
+            from .analysis.pitch import analyze_pitch, analyze_pitch_accuracy
+            from .analysis.quality import analyze_health
+            from .analysis.breath import analyze_breath_stability
+            from .analysis.preview import analyze_preview
+
+            sample_rate = 22050
+            tone = generate_tone(220.0, 1.0, sample_rate)
+            with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
+                write(tmp.name, sample_rate, np.int16(tone * 32767))
+                tone_path = tmp.name
+
+            pattern = {"intervals": [0], "duration": 0.5, "root": "A3"}
+            analyzers = [
+                ("analyze_pitch", lambda: analyze_pitch(tone_path)),
+                ("analyze_pitch_accuracy", lambda: analyze_pitch_accuracy(tone_path, pattern)),
+                ("analyze_health", lambda: analyze_health(tone_path)),
+                ("analyze_breath_stability", lambda: analyze_breath_stability(tone_path)),
+                ("analyze_preview", lambda: analyze_preview(tone_path, pattern)),
+            ]
+            try:
+                for name, run in analyzers:
+                    t0 = time.time()
+                    error = _failure(run())
+                    STATE["analyzers"][name] = round(time.time() - t0, 3)
+                    if error:
+                        STATE["failed"][name] = str(error)
+            finally:
+                os.remove(tone_path)
+            if STATE["failed"]:
+                STATE["error"] = "; ".join(f"{name}: {error}" for name, error in STATE["failed"].items())
+                print(f"Warm-up failed: {STATE['error']}")
+
+        except Exception as e:
+            # A broken analyzer must not keep the worker out of rotation forever
+            print(f"Warm-up failed: {e}")
+            STATE["error"] = str(e)
+
+        now = time.time()
+        STATE["warmup_seconds"] = round(now - started, 3)
+        _mark_ready(now)
+        return STATE
+
+def skip_warm_up():
+    """Marks the worker ready without warming up (VOCALCOACH_WARMUP=0 or "api" role)."""
+    with _lock:
+        _mark_ready(time.time())
+
+def start_background_warm_up():
+    """Warms up in a daemon thread so /health answers while the analyzers compile."""
+    if not WARMUP_ENABLED or not roles.serves_analysis():
+        skip_warm_up()
+        return None
+    thread = threading.Thread(target=warm_up, name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+def _mark_ready(now: float):
+    STATE["startup_seconds"] = round(now - PROCESS_STARTED_AT, 3)
+    STATE["ready"] = True
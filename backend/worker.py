@@ -0,0 +1,156 @@
+"""
+Analysis worker: runs background jobs from the shared queue (jobs.py, JOB_QUEUE=db or redis).
+
+API nodes store the upload and the preview session and enqueue the refinement; workers run
+the full analysis and write the result back to the session record (tier "full"). Start as
+many workers as the analysis load needs, on any host that reaches the database (and Redis)
+and the upload storage (STORAGE_DIR); API nodes and workers scale independently.
+
+Each worker process runs one job at a time (the analyses are CPU-bound: one process per
+core). SIGTERM / Ctrl-C lets the running job finish before the worker exits.
+
+    JOB_QUEUE=db python -m backend.worker
+    JOB_QUEUE=db python -m backend.worker --drain   # exit once the queue is empty
+    JOB_QUEUE=db python -m backend.worker --status
+"""
+import argparse
+import os
+import signal
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from . import warmup # Must come first: configures the numba cache before librosa is imported
+from . import analyzers, database, jobs, migrations, pipeline, storage
+
+POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+RECOVER_SECONDS = min(30.0, jobs.LEASE_SECONDS / 2) # How often a worker requeues jobs of dead workers
+ORPHAN_MINUTES = float(os.getenv("REFINE_ORPHAN_MINUTES", "5")) # Preview sessions older than this get their refine job back
+
+def _refine(payload: dict):
+    pipeline.run_refinement(payload["session_id"])
+    # After the analysis, which reads the upload as stored
+    if payload.get("upload_id"):
+        storage.transcode_upload(payload["upload_id"])
+
+def _transcode(payload: dict):
+    storage.transcode_upload(payload["upload_id"])
+
+# Job kind -> handler(payload). Handlers raise on failure (the job is retried).
+HANDLERS = {
+    "sessions.refine": _refine,
+    "storage.transcode": _transcode,
+}
+
+# Job kind -> handler(payload, error), once the job has failed for good (MAX_ATTEMPTS)
+FAILURE_HANDLERS = {
+    "sessions.refine": lambda payload, error: pipeline.mark_refinement_failed(payload["session_id"], error),
+}
+
+def job_failed(kind: str, payload: dict, error: str):
+    handler = FAILURE_HANDLERS.get(kind)
+    if handler is None:
+        return
+    try:
+        handler(payload, error)
+    except Exception as e:
+        print(f"Recording the failure of a {kind} job failed: {e}")
+
+def requeue_orphaned_refinements(queue) -> int:
+    """
+    JOB_QUEUE=redis: the API enqueues a preview's refinement after the session is committed,
+    so a failed enqueue (or a Redis that lost its data) leaves a session nobody refines.
+    Enqueues sessions.refine again for preview sessions older than ORPHAN_MINUTES; the
+    per-session key makes this a no-op while their job still exists. (JOB_QUEUE=db adds the
+    job in the session's transaction: jobs.enqueue_in.) Returns the number of pending sessions.
+    """
+    db = database.SessionLocal()
+    try:
+        pending = pipeline.pending_refinements(db, timedelta(minutes=ORPHAN_MINUTES), timedelta(days=jobs.KEEP_DAYS))
+    finally:
+        db.close()
+    for session_id, upload_id in pending:
+        queue.enqueue("sessions.refine", {"session_id": session_id, "upload_id": upload_id}, key=f"sessions.refine:{session_id}")
+    return len(pending)
+
+def run_job(queue, job: dict, worker_id: str) -> bool:
+    """Runs one claimed job, extending its lease meanwhile. Returns True on success."""
+    done = threading.Event()
+
+    def heartbeat():
+        while not done.wait(jobs.LEASE_SECONDS / 3):
+            if not queue.heartbeat(job["id"], worker_id):
+                return # Lease lost: another worker may run it again, the handlers are idempotent
+
+    beat = threading.Thread(target=heartbeat, name=f"job-{job['id']}-heartbeat", daemon=True)
+    beat.start()
+    started = time.perf_counter()
+    try:
+        handler = HANDLERS.get(job["kind"])
+        if handler is None:
+            raise ValueError(f"Unknown job kind '{job['kind']}'")
+        handler(job["payload"])
+    except Exception as e:
+        done.set()
+        print(f"Job {job['id']} ({job['kind']}) failed, attempt {job['attempts']}: {e}")
+        traceback.print_exc()
+        if queue.fail(job["id"], worker_id, job["attempts"], str(e)[:500]):
+            job_failed(job["kind"], job["payload"], str(e)[:500])
+        return False
+    done.set()
+    queue.complete(job["id"], worker_id)
+    print(f"Job {job['id']} ({job['kind']}) done in {time.perf_counter() - started:.1f}s")
+    return True
+
+def run(worker_id: str, drain: bool = False, stop: threading.Event = None) -> dict:
+    """Claims and runs jobs until stopped (or, with drain, until the queue is empty)."""
+    queue = jobs.get_queue()
+    stop = stop or threading.Event()
+    counters = {"done": 0, "failed": 0}
+    last_recover = 0.0
+    while not stop.is_set():
+        if time.monotonic() - last_recover > RECOVER_SECONDS:
+            requeued = queue.recover(on_failed=job_failed)
+            if requeued:
+                print(f"Requeued {requeued} job(s) of workers that stopped responding")
+            if jobs.BACKEND == "redis":
+                requeue_orphaned_refinements(queue)
+            last_recover = time.monotonic()
+
+        job = queue.claim(worker_id)
+        if job is None:
+            if drain:
+                stats = queue.stats()
+                if not stats.get(jobs.QUEUED) and not stats.get(jobs.RUNNING):
+                    break
+            stop.wait(POLL_SECONDS)
+            continue
+        counters["done" if run_job(queue, job, worker_id) else "failed"] += 1
+    return counters
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run analysis jobs from the shared queue.")
+    parser.add_argument("--id", default=f"{socket.gethostname()}:{os.getpid()}", help="Worker id (default: host:pid)")
+    parser.add_argument("--drain", action="store_true", help="Exit once no job is queued or running")
+    parser.add_argument("--status", action="store_true", help="Print the queue's job counts and exit")
+    args = parser.parse_args()
+
+    if not jobs.ENABLED:
+        raise SystemExit("JOB_QUEUE is 'inline' (background work runs in the API process). Set JOB_QUEUE=db or redis.")
+    migrations.upgrade(database.engine)
+    if args.status:
+        print(", ".join(f"{status}: {count}" for status, count in jobs.get_queue().stats().items()))
+        raise SystemExit(0)
+
+    # Pay the DSP/AI import and numba compile cost before the first job
+    analyzers.preload()
+    if warmup.WARMUP_ENABLED:
+        warmup.warm_up()
+    stop = threading.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, lambda *_: stop.set())
+    print(f"Worker {args.id} polling the {jobs.BACKEND} queue")
+    counters = run(args.id, drain=args.drain, stop=stop)
+    print(f"Worker {args.id} stopped: {counters['done']} done, {counters['failed']} failed.")
@@ -1,10 +1,15 @@
 import React, { useState } from 'react';
 import AudioRecorder from './AudioRecorder';
 
+const REFRESH_INTERVAL_MS = 1500;
+const MAX_REFRESH_ATTEMPTS = 80; // ~2 min: longer than any refinement (queued behind others included)
+
 const ExerciseModal = ({ exercise, onClose }) => {
     const [isUploading, setIsUploading] = useState(false);
     const [result, setResult] = useState(null);
     const [sequenceData, setSequenceData] = useState([]);
+    const [refreshAttempts, setRefreshAttempts] = useState(0);
+    const [refineFailed, setRefineFailed] = useState(false);
 
     // Fetch Pattern Sequence on Mount
     React.useEffect(() => {
@@ -25,9 +30,34 @@ const ExerciseModal = ({ exercise, onClose }) => {
         fetchPattern();
     }, [exercise.id, exercise.pattern]);
 
+    // Preview results are refined in the background -> poll until the full analysis is in
+    // (or the refinement failed / takes too long: the preview result stays)
+    React.useEffect(() => {
+        if (!result || result.tier !== 'preview' || !result.session_id || refineFailed) return;
+        if (result.refine_error || refreshAttempts >= MAX_REFRESH_ATTEMPTS) {
+            setRefineFailed(true);
+            return;
+        }
+        const timer = setTimeout(async () => {
+            try {
+                const response = await fetch(`http://localhost:8000/sessions/${result.session_id}`);
+                if (!response.ok) throw new Error(`HTTP ${response.status}`);
+                const data = await response.json();
+                setResult(data);
+            } catch (err) {
+                console.error("Failed to refresh session:", err);
+            }
+            // After the request (batched with setResult): schedules the next poll
+            setRefreshAttempts(attempts => attempts + 1);
+        }, REFRESH_INTERVAL_MS);
+        return () => clearTimeout(timer);
+    }, [result, refreshAttempts, refineFailed]);
+
     const handleUpload = async (audioBlob) => {
         setIsUploading(true);
         setResult(null);
+        setRefreshAttempts(0);
+        setRefineFailed(false);
 
         const formData = new FormData();
         const userId = localStorage.getItem('user_id') || 1;
@@ -137,7 +167,9 @@ const ExerciseModal = ({ exercise, onClose }) => {
                         
                         <div style={{ background: '#2a2a40', padding: '1rem', borderRadius: '8px', textAlign: 'left', marginBottom: '1.5rem', borderLeft: '4px solid #7c4dff' }}>
                             <h4 style={{ margin: '0 0 0.5rem 0', color: '#b388ff' }}>Coach Feedback</h4>
-                            <p>{result.feedback}</p>
+                            <p>{result.feedback || (refineFailed
+                                ? "Feinanalyse nicht verfügbar – dein Score basiert auf der Schnellanalyse."
+                                : "Feinanalyse läuft...")}</p>
                         </div>
 
                         <div style={{ display: 'flex', justifyContent: 'space-around', marginBottom: '1.5rem' }}>